@@ -16,8 +16,10 @@ const getArg = (name, fallback) => {
 
 const runId = getArg('run-id', `run-${new Date().toISOString().replace(/[:.]/g, '-')}`);
 const repoRoot = process.cwd();
+// Tree whose sources are checked (for example the orchestrator's merge worktree); artifacts stay in repoRoot.
+const sourceRoot = path.resolve(getArg('source-root', repoRoot));
 const packetDir = path.join(repoRoot, 'artifacts', 'pr-packets', runId);
-const contractExpected = path.join(repoRoot, 'contracts', 'app-schema.expected.json');
+const contractExpected = path.join(sourceRoot, 'contracts', 'app-schema.expected.json');
 const generatedRoot = path.join(repoRoot, 'artifacts', 'tmp-schema', runId);
 const command = ['cargo run -p codex-app-server-protocol --bin write_schema_fixtures -- --schema-root', generatedRoot];
 let diffText = '';
@@ -62,9 +64,13 @@ try {
     'cargo',
     ['run', '-p', 'codex-app-server-protocol', '--bin', 'write_schema_fixtures', '--', '--schema-root', generatedRoot],
     {
-      cwd: path.join(repoRoot, 'codex-rs'),
+      cwd: path.join(sourceRoot, 'codex-rs'),
       encoding: 'utf8',
       shell: false,
+      // Reuse the main checkout's build cache when checking another tree.
+      env: sourceRoot === repoRoot || process.env.CARGO_TARGET_DIR
+        ? process.env
+        : { ...process.env, CARGO_TARGET_DIR: path.join(repoRoot, 'codex-rs', 'target') },
     }
   );
 
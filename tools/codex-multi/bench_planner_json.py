@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Benchmark planner JSON extraction on large synthetic planner replies."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import runpy
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+
+ORCHESTRATOR = Path(__file__).resolve().parent / "orchestrator.py"
+
+PLAN = {
+    "raw_task": "add retry budgets to the exec crate",
+    "subtasks": [
+        {"name": "agent-exec", "scope": "codex-rs/exec", "objective": "thread the retry budget through exec"},
+        {"name": "agent-core", "scope": "codex-rs/core", "objective": "enforce the budget in the client"},
+        {"name": "agent-docs", "scope": "docs", "objective": "document the new flag"},
+    ],
+}
+
+# Bracket-heavy prose and code that is not JSON: every extractor has to look at it and move on.
+NOISE = (
+    "The exec crate wraps the client; see [client.rs] and [config.rs] for details.\n",
+    "fn retry(budget: u32) -> Result<()> {{ let mut left = budget; while left > 0 {{ left -= 1; }} Ok(()) }}\n",
+    "An example config is {{ retries: 3, backoff: [1s, 2s, 4s] }} but the real one lives in config.toml.\n",
+    "- step {0}: check `{{scope}}` against the map, then [verify] the \"quoted\" name.\n",
+)
+# Valid JSON that is not the plan, as planners echo examples and drafts before the final answer.
+DECOYS = (
+    'Earlier draft: {{"subtasks": []}} was rejected because it had no agents.\n',
+    "Backoff schedule: [1, 2, 4].\n",
+)
+
+
+def legacy_parse_embedded_json(text: str) -> Optional[object]:
+    """The previous extractor: raw_decode at every `{` and `[`, with and without code fences."""
+    stripped = re.sub(r"```.*?```", "", text, flags=re.DOTALL)
+    decoder = json.JSONDecoder()
+    for block in (stripped, text):
+        for prefix in ("{", "["):
+            idx = block.find(prefix)
+            while 0 <= idx < len(block):
+                try:
+                    value, _ = decoder.raw_decode(block[idx:])
+                    if isinstance(value, (dict, list)):
+                        return value
+                except json.JSONDecodeError:
+                    pass
+                idx = block.find(prefix, idx + 1)
+                if idx == -1:
+                    break
+    return None
+
+
+def synthetic_reply(size: int, seed: int, decoys: bool) -> str:
+    """Prose, code and bracket noise of about `size` characters, with the plan in a fence at the end."""
+    rng = random.Random(seed)
+    fillers = NOISE + DECOYS if decoys else NOISE
+    parts: List[str] = []
+    total = 0
+    step = 0
+    while total < size:
+        line = rng.choice(fillers).format(step)
+        parts.append(line)
+        total += len(line)
+        step += 1
+    parts.append("Final plan:\n```json\n" + json.dumps(PLAN, indent=2) + "\n```\n")
+    return "".join(parts)
+
+
+def best_ms(fn: Callable[[str], Optional[object]], text: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(text)
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def describe(value: Optional[object]) -> str:
+    if value == PLAN:
+        return "plan"
+    return "none" if value is None else "other"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,50000,200000", help="comma-separated reply sizes in characters")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best one is reported")
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the current extractor")
+    args = parser.parse_args()
+
+    parse_embedded_json = runpy.run_path(str(ORCHESTRATOR), run_name="bench_planner_json")["parse_embedded_json"]
+    print(f"{'reply':>7} {'chars':>9} {'brackets':>9} {'legacy ms':>10} {'linear ms':>10} {'speedup':>8}  result")
+    # The legacy extractor stops at the first value that decodes, so on replies that echo JSON
+    # before the plan it is fast because it returns the wrong value; no speedup is shown then.
+    sizes = [int(item) for item in args.sizes.split(",") if item.strip()]
+    cases = [(kind, size) for kind in ("noise", "decoys") for size in sizes]
+    for index, (kind, size) in enumerate(cases):
+        text = synthetic_reply(size, seed=index, decoys=kind == "decoys")
+        brackets = text.count("{") + text.count("[")
+        linear_ms = best_ms(parse_embedded_json, text, args.repeat)
+        results = [f"linear={describe(parse_embedded_json(text))}"]
+        legacy = speedup = "-"
+        if not args.skip_legacy:
+            legacy_ms = best_ms(legacy_parse_embedded_json, text, args.repeat)
+            legacy = f"{legacy_ms:.1f}"
+            legacy_result = describe(legacy_parse_embedded_json(text))
+            if legacy_result == "plan" and linear_ms:
+                speedup = f"{legacy_ms / linear_ms:.1f}x"
+            results.append(f"legacy={legacy_result}")
+        print(f"{kind:>7} {len(text):>9} {brackets:>9} {legacy:>10} {linear_ms:>10.1f} {speedup:>8}  {' '.join(results)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Measure planner retries and scope repairs with and without the repository map in the prompt."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import runpy
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+ORCHESTRATOR = Path(__file__).resolve().parent / "orchestrator.py"
+
+# Code-mode tasks that name features rather than paths, so the planner has to find the scopes itself.
+TASKS = (
+    "add a retry budget for stream disconnects in the exec client and surface it in the TUI status line",
+    "make the sandbox policy configurable per profile and document the new option",
+    "show token usage per turn in the TUI and include it in the exec JSON output",
+    "add a --max-turns flag to codex exec and stop the session when it is reached",
+)
+
+ARMS = (("map", "1"), ("no-map", "0"))
+
+
+def scope_repairs(intent: Dict[str, Any]) -> int:
+    """Subtasks whose scope normalize_disjoint_scopes had to change."""
+    raw = (intent.get("plannerResult") or {}).get("subtasks") or []
+    normalized = (intent.get("normalizedPlan") or {}).get("subtasks") or []
+    raw_scopes = [str(item.get("scope") or "").strip("/") for item in raw if isinstance(item, dict)]
+    kept = {str(item.get("scope") or "") for item in normalized}
+    return sum(1 for scope in raw_scopes if scope not in kept) + abs(len(raw_scopes) - len(normalized))
+
+
+def mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--task", action="append", help="planner task to measure; repeatable, replaces the built-in tasks")
+    parser.add_argument("--repeat", type=int, default=3, help="planner runs per task and arm")
+    parser.add_argument("--model", default=None, help="planner model (default: codex default)")
+    args = parser.parse_args()
+
+    orchestrator = runpy.run_path(str(ORCHESTRATOR), run_name="bench_repo_map")
+    codex_cmd = orchestrator["find_codex_command"]()
+    coord_base: Path = orchestrator["COORD_BASE"]
+    tasks = args.task or list(TASKS)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    previous = os.environ.get(orchestrator["_REPO_MAP_ENV"])
+
+    runs: List[Dict[str, Any]] = []
+    try:
+        for arm, flag in ARMS:
+            os.environ[orchestrator["_REPO_MAP_ENV"]] = flag
+            for task_index, task in enumerate(tasks):
+                for attempt in range(max(1, args.repeat)):
+                    run_id = f"bench-repo-map-{stamp}-{arm}-{task_index}-{attempt}"
+                    started = time.perf_counter()
+                    orchestrator["run_planner"](task, codex_cmd, run_id, task_mode="code", model=args.model)
+                    elapsed_ms = int((time.perf_counter() - started) * 1000)
+                    planner_dir = coord_base / run_id / "planner"
+                    intent = orchestrator["load_json_or_none"](planner_dir / "intent.json") or {}
+                    impact = orchestrator["load_json_or_none"](planner_dir / "impact-report.json") or {}
+                    runs.append(
+                        {
+                            "arm": arm,
+                            "task": task,
+                            "runId": run_id,
+                            "parseAttempts": int(intent.get("plannerParseAttempts") or 0),
+                            "fallbackUsed": bool(intent.get("fallbackUsed")),
+                            "scopeRepairs": scope_repairs(intent),
+                            "totalTokens": int((impact.get("usage") or {}).get("totalTokens") or 0),
+                            "promptChars": (intent.get("repoMap") or {}).get("promptChars", 0),
+                            "plannerMs": elapsed_ms,
+                        }
+                    )
+                    print(
+                        f"{arm:>7} task {task_index} run {attempt}: {runs[-1]['parseAttempts']} attempt(s), "
+                        f"{runs[-1]['scopeRepairs']} scope repair(s), {runs[-1]['totalTokens']} tokens"
+                    )
+    finally:
+        if previous is None:
+            os.environ.pop(orchestrator["_REPO_MAP_ENV"], None)
+        else:
+            os.environ[orchestrator["_REPO_MAP_ENV"]] = previous
+
+    summary: Dict[str, Dict[str, float]] = {}
+    print()
+    print(f"{'arm':>7} {'runs':>5} {'attempts':>9} {'retried':>8} {'fallback':>9} {'repairs':>8} {'tokens':>9} {'ms':>8}")
+    for arm, _ in ARMS:
+        rows = [run for run in runs if run["arm"] == arm]
+        summary[arm] = {
+            "runs": len(rows),
+            "meanParseAttempts": round(mean([r["parseAttempts"] for r in rows]), 2),
+            "retriedRuns": sum(1 for r in rows if r["parseAttempts"] > 1),
+            "fallbackRuns": sum(1 for r in rows if r["fallbackUsed"]),
+            "meanScopeRepairs": round(mean([r["scopeRepairs"] for r in rows]), 2),
+            "meanTokens": round(mean([r["totalTokens"] for r in rows])),
+            "meanPlannerMs": round(mean([r["plannerMs"] for r in rows])),
+        }
+        s = summary[arm]
+        print(
+            f"{arm:>7} {s['runs']:>5} {s['meanParseAttempts']:>9} {s['retriedRuns']:>8} {s['fallbackRuns']:>9} "
+            f"{s['meanScopeRepairs']:>8} {s['meanTokens']:>9} {s['meanPlannerMs']:>8}"
+        )
+
+    out_path = orchestrator["ARTIFACTS_ROOT"] / "bench" / f"repo-map-{stamp}.json"
+    orchestrator["dump_json"](out_path, {"codex": codex_cmd, "model": args.model, "summary": summary, "runs": runs})
+    print(f"\nWrote {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The orchestrator is a script directory, not a package; tests import it by module name.
+sys.path.insert(0, str(Path(__file__).resolve().parent))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Stand-in for `codex` in the end-to-end tests, set as CODEX_MULTI_CODEX_COMMAND.
+
+Speaks the `codex exec --json` event protocol. The planner replies with FAKE_CODEX_PLAN.
+An agent runs the comma-separated steps in FAKE_CODEX_<AGENT> (dashes as underscores),
+or FAKE_CODEX_RESUME for `codex exec resume`; the default is `write`:
+
+  write      append a line to <scope>/<agent>.txt
+  sleep:N    sleep N seconds
+  usage      report a completed turn now
+  transient  fail the turn with a retryable stream error
+  fail       fail the turn with an error that is not retried
+  hang       sleep until killed
+  noisy      write a warning to stderr every 0.2s until killed
+
+Like codex, every turn spends FAKE_CODEX_TURN_TOKENS input tokens plus a tenth of that in
+output, and `turn.completed` reports the thread's running total. Totals are kept per thread
+in FAKE_CODEX_STATE_DIR, so a resumed thread continues its earlier total.
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+
+def emit(event: dict) -> None:
+    print(json.dumps(event), flush=True)
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    prompt = args[-1]
+    state_dir = Path(os.environ.get("FAKE_CODEX_STATE_DIR") or tempfile.gettempdir()) / "fake-codex"
+    state_dir.mkdir(parents=True, exist_ok=True)
+    resumed = "resume" in args
+    thread_id = args[args.index("resume") + 1] if resumed else f"thread-{uuid.uuid4().hex[:12]}"
+    last_message = args[args.index("--output-last-message") + 1] if "--output-last-message" in args else None
+    (state_dir / f"{os.getpid()}.pid").write_text(thread_id, encoding="utf-8")
+
+    turn_tokens = int(os.environ.get("FAKE_CODEX_TURN_TOKENS", "1000"))
+    totals_path = state_dir / f"{thread_id}.json"
+
+    def complete_turn() -> None:
+        totals = json.loads(totals_path.read_text(encoding="utf-8")) if totals_path.exists() else {}
+        totals = {
+            "input_tokens": totals.get("input_tokens", 0) + turn_tokens,
+            "cached_input_tokens": totals.get("cached_input_tokens", 0) + turn_tokens // 2,
+            "output_tokens": totals.get("output_tokens", 0) + turn_tokens // 10,
+        }
+        totals_path.write_text(json.dumps(totals), encoding="utf-8")
+        emit({"type": "turn.completed", "usage": totals})
+
+    emit({"type": "thread.started", "thread_id": thread_id})
+    emit({"type": "turn.started"})
+    if "You are a planner" in prompt:
+        message = os.environ.get("FAKE_CODEX_PLAN", '{"subtasks": []}')
+    else:
+        name_match = re.search(r"sub-agent named (\S+)\.", prompt)
+        name = name_match.group(1) if name_match else Path.cwd().name
+        scope_match = re.search(r"scope: (\S+)\.", prompt) or re.search(r"scope \((\S+)\)", prompt)
+        scope = scope_match.group(1) if scope_match else "."
+        if resumed:
+            steps = os.environ.get("FAKE_CODEX_RESUME", "write")
+        else:
+            steps = os.environ.get("FAKE_CODEX_" + name.replace("-", "_").upper(), "write")
+        message = f"done {name}"
+        for step in steps.split(","):
+            if step == "write":
+                os.makedirs(scope, exist_ok=True)
+                with open(os.path.join(scope, f"{name}.txt"), "a", encoding="utf-8") as fp:
+                    fp.write("hello\n")
+            elif step.startswith("sleep:"):
+                time.sleep(float(step[len("sleep:"):]))
+            elif step == "usage":
+                complete_turn()
+            elif step == "transient":
+                emit({"type": "turn.failed", "error": {"message": "stream disconnected before completion"}})
+                return 1
+            elif step == "fail":
+                emit({"type": "turn.failed", "error": {"message": "model refused the request"}})
+                return 1
+            elif step == "hang":
+                time.sleep(3600)
+            elif step == "noisy":
+                while True:
+                    print("WARN retrying request", file=sys.stderr, flush=True)
+                    time.sleep(0.2)
+    details = {"type": "agent_message", "text": message}
+    emit({"type": "item.completed", "item": {"id": "1", "type": "agent_message", "text": message, "details": details}})
+    complete_turn()
+    if last_message:
+        Path(last_message).write_text(message, encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,30 +5,66 @@ from __future__ import annotations
 
 import argparse
 import json
+import sqlite3
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 
 ROOT = Path(__file__).resolve().parents[2]
 ARTIFACTS = ROOT / "artifacts"
+STORE = ARTIFACTS / "store"
+
+
+def read_artifact(path: Path) -> Optional[bytes]:
+    """An artifact from disk, or from artifacts/store/ for runs made with CODEX_MULTI_ARTIFACT_STORE=sqlite."""
+    try:
+        return path.read_bytes()
+    except OSError:
+        pass
+    try:
+        key = path.relative_to(ARTIFACTS).as_posix()
+    except ValueError:
+        return None
+    parts = key.split("/")
+    # Same layout as the orchestrator: one database per run, everything else in shared.sqlite.
+    name = parts[1] if len(parts) > 2 and parts[0] in ("coordination", "pr-packets") else "shared"
+    database = STORE / f"{name}.sqlite"
+    if not database.exists():
+        return None
+    try:
+        conn = sqlite3.connect(str(database))
+        try:
+            row = conn.execute("SELECT data FROM artifacts WHERE path = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return bytes(row[0]) if row else None
 
 
 def read_json(path: Path) -> Dict[str, Any] | None:
-    if not path.exists():
+    data = read_artifact(path)
+    if data is None:
         return None
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except (OSError, json.JSONDecodeError):
+        return json.loads(data.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
         return None
 
 
 def read_lines(path: Path, limit: int = 20) -> List[str]:
-    if not path.exists():
-        return []
-    try:
-        return path.read_text(encoding="utf-8").splitlines()[:limit]
-    except OSError:
+    data = read_artifact(path)
+    if data is None:
         return []
+    return data.decode("utf-8", errors="replace").splitlines()[:limit]
+
+
+def read_blob(packet_dir: Path, value: Any) -> str:
+    """Text of an impact-report field that may be a `{"blob", "bytes", "sha256"}` side-file reference."""
+    if isinstance(value, dict) and isinstance(value.get("blob"), str):
+        data = read_artifact(packet_dir / value["blob"])
+        return "" if data is None else data.decode("utf-8", errors="replace")
+    return "" if value is None else str(value)
 
 
 def print_blocker_block(block: Dict[str, Any], run_id: str) -> None:
@@ -37,15 +73,13 @@ def print_blocker_block(block: Dict[str, Any], run_id: str) -> None:
     reason = block.get("blockerReason") or block.get("reason") or block.get("error")
     if reason:
         print(f"  reason: {reason}")
-    blocker_path = ARTIFACTS / "coordination" / run_id / str(name) / "blocker.json"
-    if blocker_path.exists():
-        blocker_doc = read_json(blocker_path)
-        if blocker_doc:
-            last_message = blocker_doc.get("lastMessage")
-            if isinstance(last_message, str) and last_message.strip():
-                print("  lastMessage:")
-                for line in last_message.splitlines()[:12]:
-                    print(f"    {line}")
+    blocker_doc = read_json(ARTIFACTS / "coordination" / run_id / str(name) / "blocker.json")
+    if blocker_doc:
+        last_message = blocker_doc.get("lastMessage")
+        if isinstance(last_message, str) and last_message.strip():
+            print("  lastMessage:")
+            for line in last_message.splitlines()[:12]:
+                print(f"    {line}")
 
 
 def main() -> int:
@@ -74,8 +108,10 @@ def main() -> int:
     if agents:
         print("agents:")
         for agent in agents:
-            if agent.get("state") == "BLOCKED":
+            if agent.get("state") in ("BLOCKED", "CANCELLED"):
                 print_blocker_block(agent, run_id)
+            elif (agent.get("advisoryCache") or {}).get("hit"):
+                print(f"- {agent.get('name')}: cached guidance from {agent['advisoryCache'].get('sourceRunId')}")
 
     contract = read_json(ARTIFACTS / "pr-packets" / run_id / "contract-check.json")
     if contract:
@@ -107,7 +143,7 @@ def main() -> int:
                 if isinstance(detail, dict):
                     agent_name = detail.get("agent", "unknown")
                     print(f"- agent {agent_name} checkCode={detail.get('checkCode')}")
-                    stderr = detail.get("checkStderr", "").strip()
+                    stderr = read_blob(ARTIFACTS / "pr-packets" / run_id, detail.get("checkStderr")).strip()
                     if stderr:
                         print(f"  stderr: {stderr}")
 
@@ -116,6 +152,15 @@ def main() -> int:
     if planner_intent:
         print(f"- parseAttempts: {planner_intent.get('plannerParseAttempts', 'n/a')}")
         print(f"- fallbackUsed: {planner_intent.get('fallbackUsed', False)}")
+        plan_cache = planner_intent.get("planCache") or {}
+        if plan_cache.get("hit"):
+            print(f"- planCache: reused plan of {plan_cache.get('sourceRunId')}")
+        repo_map = planner_intent.get("repoMap") or {}
+        if repo_map.get("enabled"):
+            cache = "hit" if repo_map.get("cacheHit") else f"built in {repo_map.get('buildMs', 'n/a')}ms"
+            print(f"- repoMap: tree {str(repo_map.get('treeHash', ''))[:12]} ({cache}, {repo_map.get('promptChars', 0)} prompt chars)")
+        else:
+            print("- repoMap: off")
 
     return 0
 
@@ -4,36 +4,118 @@
 from __future__ import annotations
 
 import argparse
+import atexit
+import concurrent.futures
+import functools
+import hashlib
+import hmac
 import http.server
+import ipaddress
+import codecs
 import json
 import os
+import random
+import socket
 import socketserver
+import sqlite3
 import re
 import shlex
 import shutil
+import signal
 import subprocess
+import sys
 import tempfile
 import threading
 import time
+import urllib.error
 import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Callable, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 WORKTREE_ROOT = PROJECT_ROOT / "codex-worktrees"
 ARTIFACTS_ROOT = PROJECT_ROOT / "artifacts"
 COORD_BASE = ARTIFACTS_ROOT / "coordination"
+ARTIFACT_STORE_DIR = ARTIFACTS_ROOT / "store"
+# With fsync=batch, written files are fsynced together once this many are pending or this long has passed.
+ARTIFACT_FSYNC_BATCH_FILES = 64
+ARTIFACT_FSYNC_BATCH_SECONDS = 1.0
 PACKET_BASE = ARTIFACTS_ROOT / "pr-packets"
+CONTRACT_CACHE_DIR = ARTIFACTS_ROOT / "cache" / "contract-check"
+ADVISORY_CACHE_DIR = ARTIFACTS_ROOT / "cache" / "advisory"
+# Bump when the advisory prompt changes so older guidance stops matching.
+ADVISORY_CACHE_VERSION = 1
+DEFAULT_ADVISORY_CACHE_TTL_SECONDS = 24 * 3600.0
+DEFAULT_ADVISORY_CACHE_MAX_ENTRIES = 512
+COMPARE_DIR = ARTIFACTS_ROOT / "compare"
+# `compare` flags a timing as a regression when run B takes this much longer than run A
+# and the difference is at least COMPARE_REGRESSION_MIN_MS.
+COMPARE_REGRESSION_RATIO = 1.2
+COMPARE_REGRESSION_MIN_MS = 500
+PLANNER_SCHEMA_DIR = Path(__file__).resolve().parent / "schemas"
+PLANNER_SCHEMA_FILES = {"plan": "planner-plan.schema.json", "dag": "planner-dag.schema.json"}
+USAGE_INDEX_PATH = ARTIFACTS_ROOT / "usage" / "index.jsonl"
+REPO_MAP_CACHE_DIR = ARTIFACTS_ROOT / "cache" / "repo-map"
+REPO_MAP_VERSION = 1
+REPO_MAP_PROMPT_CHARS = 4000
+REPO_MAP_SUBDIR_LIMIT = 8
+WORKSPACE_MANIFEST = "codex-rs/Cargo.toml"
+CONTRACT_SCRIPT = PROJECT_ROOT / "scripts" / "multiagent" / "contract-check.mjs"
+# Everything the contract check reads from the checked tree; their git object ids key its cache.
+CONTRACT_INPUT_PATHS = (
+    "codex-rs/protocol",
+    "codex-rs/app-server-protocol",
+    "contracts/app-schema.expected.json",
+    "codex-rs/Cargo.lock",
+)
 DASH_REFRESH = 0.35
 WEB_REFRESH = 0.6
 DEFAULT_WEB_PORT = 8765
 DEFAULT_SCOPE_ROOT = "codex-rs"
+# Directories every sparse agent worktree gets besides its scope. Cone mode also
+# checks out the files directly inside each parent directory, so including any
+# codex-rs/* path brings in the workspace Cargo.toml, Cargo.lock and toolchain configs.
+DEFAULT_SPARSE_ALWAYS_PATHS = ("codex-rs/protocol", "codex-rs/utils")
 PLANNER_RETRY_LIMIT = 2
 AGENT_RETRY_LIMIT = 3
 AGENT_RETRY_DELAY_SECONDS = 1.0
+AGENT_RETRY_MAX_DELAY_SECONDS = 30.0
+AGENT_TERMINATE_GRACE_SECONDS = 5.0
+AGENT_WATCHDOG_POLL_SECONDS = 1.0
+STREAM_CHUNK_BYTES = 64 * 1024
+STREAM_MAX_EVENT_CHARS = 4 * 1024 * 1024
+# Oversize events past this many characters per codex process are counted but not written.
+STREAM_SPILL_LIMIT_CHARS = 64 * 1024 * 1024
+STREAM_STDERR_TAIL_BYTES = 4096
+STREAM_STDERR_LOG = "codex-stderr.log"
+# Text fields of the packet impact report longer than this are stored as
+# content-addressed files under <packet>/blobs/ and referenced by path, size and sha256.
+REPORT_BLOB_DIR = "blobs"
+REPORT_BLOB_FIELDS = ("mergedDiff", "checkStdout", "checkStderr", "lastMessage")
+REPORT_INLINE_LIMIT_CHARS = 2048
+ADMISSION_POLL_SECONDS = 2.0
+DEFAULT_TICKET_CONCURRENCY = 2
+# Minimum gap between launches while resource checks are on, so one admission's
+# memory use shows up before the next decision.
+ADMISSION_SETTLE_SECONDS = 1.0
+# Remote workers long-poll for assignments and cancels and heartbeat through
+# those polls; a worker silent for WORKER_LOST_SECONDS has its assignments rescheduled.
+WORKER_POLL_WAIT_SECONDS = 10.0
+WORKER_LOST_SECONDS = 30.0
+WORKER_EVENT_FLUSH_SECONDS = 0.5
+WORKER_CANCEL_GRACE_SECONDS = 15.0
+WORKER_WAIT_TIMEOUT_SECONDS = 120.0
+REMOTE_DISPATCH_LIMIT = 2
+# Per task mode (wall-clock seconds, max seconds between events). 0 disables.
+DEFAULT_AGENT_BUDGETS = {
+    "code": (3600.0, 600.0),
+    "advisory": (900.0, 300.0),
+}
 _AGENT_RETRY_HINTS = (
     "reconnecting",
     "stream disconnected",
@@ -60,6 +142,10 @@ _AGENT_WRITE_HINTS = (
     "policy blocked",
     "write access is not available",
 )
+_ALLOWED_ARTIFACT_STORES = ("local", "sqlite", "memory")
+_ALLOWED_FSYNC_MODES = ("off", "batch", "always")
+_ARTIFACT_STORE_ENV = "CODEX_MULTI_ARTIFACT_STORE"
+_ARTIFACT_FSYNC_ENV = "CODEX_MULTI_ARTIFACT_FSYNC"
 _ALLOWED_SANDBOX_MODES = ("read-only", "workspace-write", "danger-full-access")
 _DEFAULT_AGENT_SANDBOX_MODE = "workspace-write"
 _SANDBOX_ENV = "CODEX_MULTI_SANDBOX_MODE"
@@ -70,6 +156,38 @@ _MODEL_ENV = "CODEX_MULTI_MODEL"
 _MODEL_PROVIDER_ENV = "CODEX_MULTI_MODEL_PROVIDER"
 _CODEX_COMMAND_ENV = "CODEX_MULTI_CODEX_COMMAND"
 _BYPASS_SANDBOX_ENV = "CODEX_MULTI_BYPASS_SANDBOX"
+_FAIL_FAST_ENV = "CODEX_MULTI_FAIL_FAST"
+_AGENT_TIMEOUT_ENV = "CODEX_MULTI_AGENT_TIMEOUT"
+_AGENT_IDLE_TIMEOUT_ENV = "CODEX_MULTI_AGENT_IDLE_TIMEOUT"
+_SPARSE_WORKTREES_ENV = "CODEX_MULTI_SPARSE_WORKTREES"
+_SPARSE_ALWAYS_ENV = "CODEX_MULTI_SPARSE_ALWAYS"
+_MAX_AGENTS_ENV = "CODEX_MULTI_MAX_AGENTS"
+_ADMISSION_MAX_LOAD_ENV = "CODEX_MULTI_ADMISSION_MAX_LOAD"
+_ADMISSION_MIN_MEMORY_ENV = "CODEX_MULTI_ADMISSION_MIN_MEMORY_MB"
+_ADMISSION_MAX_PRESSURE_ENV = "CODEX_MULTI_ADMISSION_MAX_PRESSURE"
+_WORKER_PORT_ENV = "CODEX_MULTI_WORKER_PORT"
+_WORKER_HOST_ENV = "CODEX_MULTI_WORKER_HOST"
+_WORKER_TOKEN_ENV = "CODEX_MULTI_WORKER_TOKEN"
+_ORCHESTRATOR_URL_ENV = "CODEX_MULTI_ORCHESTRATOR_URL"
+_WORKER_TOKEN_HEADER = "X-Codex-Multi-Token"
+_CONTRACT_CACHE_ENV = "CODEX_MULTI_CONTRACT_CACHE"
+_ADVISORY_CACHE_ENV = "CODEX_MULTI_ADVISORY_CACHE"
+_ADVISORY_CACHE_TTL_ENV = "CODEX_MULTI_ADVISORY_CACHE_TTL"
+_ADVISORY_CACHE_MAX_ENTRIES_ENV = "CODEX_MULTI_ADVISORY_CACHE_MAX_ENTRIES"
+_TOKEN_BUDGET_ENV = "CODEX_MULTI_TOKEN_BUDGET"
+_AGENT_TOKEN_BUDGET_ENV = "CODEX_MULTI_AGENT_TOKEN_BUDGET"
+_REPO_MAP_ENV = "CODEX_MULTI_REPO_MAP"
+_PLANNER_SCHEMA_ENV = "CODEX_MULTI_PLANNER_SCHEMA"
+_ALLOWED_PLANNER_SCHEMAS = ("plan", "dag", "off")
+_DEFAULT_PLANNER_SCHEMA = "plan"
+_PLANNER_MODEL_ENV = "CODEX_MULTI_PLANNER_MODEL"
+_WORKER_MODEL_ENV = "CODEX_MULTI_WORKER_MODEL"
+_ESCALATION_MODEL_ENV = "CODEX_MULTI_ESCALATION_MODEL"
+_MODEL_RULES_ENV = "CODEX_MULTI_MODEL_RULES"
+_MAX_EVENT_CHARS_ENV = "CODEX_MULTI_MAX_EVENT_CHARS"
+_TICKET_CONCURRENCY_ENV = "CODEX_MULTI_TICKET_CONCURRENCY"
+# Blockers a stronger model cannot fix: the run is over, the budget is spent, or the platform refused.
+_NON_ESCALATING_BLOCKER_PREFIXES = ("Cancelled", "TOKEN BUDGET", "TIMEOUT", "Platform write restriction")
 
 
 def get_web_dashboard_html() -> str:
@@ -208,6 +326,280 @@ class AgentTask:
     name: str
     scope: str
     objective: str
+    # Agents that must finish before this one launches (`dependsOn` of the dag planner schema).
+    depends_on: Tuple[str, ...] = ()
+
+
+@dataclass
+class TokenUsage:
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+    turns: int = 0
+
+    @property
+    def total(self) -> int:
+        # Cached input is a subset of input tokens, so it is not added again.
+        return self.input_tokens + self.output_tokens
+
+    def add(self, other: "TokenUsage") -> None:
+        self.input_tokens += other.input_tokens
+        self.cached_input_tokens += other.cached_input_tokens
+        self.output_tokens += other.output_tokens
+        self.turns += other.turns
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "inputTokens": self.input_tokens,
+            "cachedInputTokens": self.cached_input_tokens,
+            "outputTokens": self.output_tokens,
+            "totalTokens": self.total,
+            "turns": self.turns,
+        }
+
+    def since(self, earlier: "TokenUsage") -> "TokenUsage":
+        """Tokens this running total added on top of an earlier total of the same session."""
+        return TokenUsage(
+            max(0, self.input_tokens - earlier.input_tokens),
+            max(0, self.cached_input_tokens - earlier.cached_input_tokens),
+            max(0, self.output_tokens - earlier.output_tokens),
+            self.turns,
+        )
+
+    @classmethod
+    def from_event(cls, usage: object) -> "TokenUsage":
+        """Usage of one `turn.completed` event: the session's running total, counted as one turn."""
+        if not isinstance(usage, dict):
+            return cls(turns=1)
+
+        def count(key: str) -> int:
+            value = usage.get(key)
+            return value if isinstance(value, int) and value > 0 else 0
+
+        return cls(count("input_tokens"), count("cached_input_tokens"), count("output_tokens"), 1)
+
+    @classmethod
+    def from_dict(cls, payload: object) -> "TokenUsage":
+        if not isinstance(payload, dict):
+            return cls()
+
+        def count(key: str) -> int:
+            value = payload.get(key)
+            return value if isinstance(value, int) and value > 0 else 0
+
+        return cls(count("inputTokens"), count("cachedInputTokens"), count("outputTokens"), count("turns"))
+
+
+@dataclass
+class StreamStats:
+    """What the codex event reader saw on one or more child processes."""
+
+    stdout_bytes: int = 0
+    events: int = 0
+    malformed: int = 0
+    oversize: int = 0
+    dropped: int = 0
+    spilled_chars: int = 0
+    stderr_bytes: int = 0
+
+    def add(self, other: "StreamStats") -> None:
+        self.stdout_bytes += other.stdout_bytes
+        self.events += other.events
+        self.malformed += other.malformed
+        self.oversize += other.oversize
+        self.dropped += other.dropped
+        self.spilled_chars += other.spilled_chars
+        self.stderr_bytes += other.stderr_bytes
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "stdoutBytes": self.stdout_bytes,
+            "events": self.events,
+            "malformedLines": self.malformed,
+            "oversizeEvents": self.oversize,
+            "droppedEvents": self.dropped,
+            "spilledChars": self.spilled_chars,
+            "stderrBytes": self.stderr_bytes,
+        }
+
+    @classmethod
+    def from_dict(cls, payload: object) -> "StreamStats":
+        if not isinstance(payload, dict):
+            return cls()
+
+        def count(key: str) -> int:
+            value = payload.get(key)
+            return value if isinstance(value, int) and value > 0 else 0
+
+        return cls(
+            count("stdoutBytes"),
+            count("events"),
+            count("malformedLines"),
+            count("oversizeEvents"),
+            count("droppedEvents"),
+            count("spilledChars"),
+            count("stderrBytes"),
+        )
+
+
+@dataclass
+class ModelRule:
+    """`CONDITION=MODEL` routing rule; conditions are `mode:<code|advisory>`, `files<=N` or `files>N`."""
+
+    spec: str
+    model: str
+    mode: Optional[str] = None
+    max_files: Optional[int] = None
+    min_files: Optional[int] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "ModelRule":
+        condition, sep, model = spec.strip().rpartition("=")
+        condition = condition.strip()
+        model = model.strip()
+        if not sep or not condition or not model:
+            raise ValueError(f"model rule {spec!r} must look like CONDITION=MODEL")
+        if condition.startswith("mode:"):
+            mode = condition[len("mode:"):].strip()
+            if mode not in ("code", "advisory"):
+                raise ValueError(f"model rule {spec!r}: mode must be code or advisory")
+            return cls(spec=spec.strip(), model=model, mode=mode)
+        for prefix, key in (("files<", "max_files"), ("files>", "min_files")):
+            if condition.startswith(prefix):
+                bound = condition[len(prefix):]
+                inclusive = bound.startswith("=")
+                try:
+                    value = int(bound.lstrip("=").strip())
+                except ValueError:
+                    break
+                if key == "max_files":
+                    value = value if inclusive else value - 1
+                else:
+                    value = value if inclusive else value + 1
+                return cls(spec=spec.strip(), model=model, **{key: value})
+        raise ValueError(f"model rule {spec!r}: unknown condition {condition!r}")
+
+    @property
+    def needs_file_count(self) -> bool:
+        return self.max_files is not None or self.min_files is not None
+
+    def matches(self, task_mode: str, file_count: Optional[int]) -> bool:
+        if self.mode is not None:
+            return self.mode == task_mode
+        if file_count is None:
+            return False
+        if self.max_files is not None and file_count > self.max_files:
+            return False
+        if self.min_files is not None and file_count < self.min_files:
+            return False
+        return True
+
+
+@dataclass
+class ModelRoute:
+    model: Optional[str]
+    provider: Optional[str]
+    source: str
+    escalation_model: Optional[str] = None
+    scope_files: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, object]:
+        payload: Dict[str, object] = {
+            "model": self.model,
+            "modelProvider": self.provider,
+            "source": self.source,
+            "escalationModel": self.escalation_model,
+        }
+        if self.scope_files is not None:
+            payload["scopeFiles"] = self.scope_files
+        return payload
+
+
+@dataclass
+class ModelRouter:
+    """Pick a model per role: planner, worker (first matching rule wins), and escalation retries."""
+
+    model: Optional[str] = None
+    provider: Optional[str] = None
+    planner_model: Optional[str] = None
+    worker_model: Optional[str] = None
+    escalation_model: Optional[str] = None
+    rules: List[ModelRule] = field(default_factory=list)
+
+    def planner_route(self) -> ModelRoute:
+        if self.planner_model:
+            return ModelRoute(self.planner_model, self.provider, "planner-model")
+        return ModelRoute(self.model, self.provider, "model" if self.model else "codex-default")
+
+    def worker_route(
+        self, scope: str, task_mode: str, path_index: Optional["TrackedPathIndex"] = None
+    ) -> ModelRoute:
+        file_count: Optional[int] = None
+        if task_mode == "code" and any(rule.needs_file_count for rule in self.rules):
+            file_count = count_tracked_files(scope, path_index)
+        escalation = self.escalation_model
+        for rule in self.rules:
+            if rule.matches(task_mode, file_count):
+                return ModelRoute(rule.model, self.provider, f"rule {rule.spec}", escalation, file_count)
+        if self.worker_model:
+            return ModelRoute(self.worker_model, self.provider, "worker-model", escalation, file_count)
+        return ModelRoute(self.model, self.provider, "model" if self.model else "codex-default", escalation, file_count)
+
+
+class InstrumentedLock:
+    """threading.Lock that records how often and how long acquirers had to wait for it."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_ns = 0
+        self.max_wait_ns = 0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter_ns()
+        if not self._lock.acquire(True, timeout):
+            return False
+        waited = time.perf_counter_ns() - started
+        # Counters are only updated while holding the lock.
+        self.acquisitions += 1
+        self.contended += 1
+        self.wait_ns += waited
+        self.max_wait_ns = max(self.max_wait_ns, waited)
+        return True
+
+    def release(self) -> None:
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc: object) -> None:
+        self.release()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "waitMs": round(self.wait_ns / 1e6, 3),
+            "maxWaitMs": round(self.max_wait_ns / 1e6, 3),
+        }
+
+
+@dataclass(frozen=True)
+class AgentView:
+    """Immutable dashboard snapshot of one agent, replaced wholesale on every status change."""
+
+    entry: Dict[str, object]
+    activity: Tuple[str, ...] = ()
 
 
 @dataclass
@@ -231,6 +623,27 @@ class AgentState:
     duration_ms: int = 0
     log: List[str] = field(default_factory=list)
     last_message: str = ""
+    attempts: int = 0
+    merge_state: Optional[str] = None
+    sparse_paths: Optional[List[str]] = None
+    queued_reason: Optional[str] = None
+    worker: Optional[str] = None
+    usage: TokenUsage = field(default_factory=TokenUsage)
+    model: Optional[str] = None
+    escalated: bool = False
+    stream: StreamStats = field(default_factory=StreamStats)
+    advisory_cache: Optional[Dict[str, object]] = None
+    # Last running total codex reported per thread, so a resumed thread only adds what it spent since.
+    thread_usage: Dict[str, TokenUsage] = field(default_factory=dict)
+    # Guards the fields above. Readers use `view`, which is published under it and never mutated.
+    lock: InstrumentedLock = field(default_factory=InstrumentedLock)
+    view: Optional[AgentView] = None
+    # status.json writes happen outside `lock`, ordered by sequence so an older payload never wins.
+    io_lock: threading.Lock = field(default_factory=threading.Lock)
+    status_seq: int = 0
+    written_seq: int = 0
+    # Set once the agent reached its final state; agents that depend on it wait for this.
+    finished: threading.Event = field(default_factory=threading.Event)
 
 
 @dataclass
@@ -239,7 +652,410 @@ class CodexRunResult:
     thread_id: Optional[str]
     last_message: str
     error: Optional[str]
+    timed_out: bool = False
+    usage: TokenUsage = field(default_factory=TokenUsage)
+    stream: StreamStats = field(default_factory=StreamStats)
+    stderr_tail: str = ""
+
+
+@dataclass
+class AgentBudget:
+    wall_seconds: Optional[float] = None
+    idle_seconds: Optional[float] = None
+
+
+def read_available_memory_mb() -> Optional[float]:
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as fp:
+            for line in fp:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024.0
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def read_pressure_avg10(resource: str) -> Optional[float]:
+    """`some avg10` PSI for cpu/memory/io, preferring this process's cgroup v2 over system-wide."""
+    candidates: List[Path] = []
+    try:
+        for line in Path("/proc/self/cgroup").read_text(encoding="utf-8").splitlines():
+            if line.startswith("0::"):
+                candidates.append(Path("/sys/fs/cgroup") / line[3:].lstrip("/") / f"{resource}.pressure")
+    except OSError:
+        pass
+    candidates.append(Path("/proc/pressure") / resource)
+    for candidate in candidates:
+        try:
+            text = candidate.read_text(encoding="utf-8")
+        except OSError:
+            continue
+        m = re.search(r"^some avg10=([0-9.]+)", text, flags=re.MULTILINE)
+        if m:
+            return float(m.group(1))
+    return None
+
+
+class AdmissionController:
+    """Holds agent launches until a concurrency slot and enough host headroom are available."""
+
+    def __init__(
+        self,
+        max_agents: Optional[int] = None,
+        max_load_per_cpu: Optional[float] = None,
+        min_available_mb: Optional[float] = None,
+        max_pressure: Optional[float] = None,
+    ) -> None:
+        self.max_agents = max_agents if max_agents and max_agents > 0 else None
+        self.slots = threading.BoundedSemaphore(self.max_agents) if self.max_agents else None
+        self.max_load_per_cpu = max_load_per_cpu or None
+        self.min_available_mb = min_available_mb or None
+        self.max_pressure = max_pressure or None
+        self.lock = threading.Lock()
+        self.last_admitted = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.slots or self.checks_resources)
+
+    @property
+    def checks_resources(self) -> bool:
+        return bool(self.max_load_per_cpu or self.min_available_mb or self.max_pressure)
+
+    def resource_hold_reason(self) -> Optional[str]:
+        if self.max_load_per_cpu and hasattr(os, "getloadavg"):
+            load = os.getloadavg()[0] / max(1, os.cpu_count() or 1)
+            if load > self.max_load_per_cpu:
+                return f"load average {load:.2f}/cpu above {self.max_load_per_cpu:g}"
+        if self.min_available_mb:
+            available = read_available_memory_mb()
+            if available is not None and available < self.min_available_mb:
+                return f"available memory {available:.0f}MB below {self.min_available_mb:g}MB"
+        if self.max_pressure:
+            for resource in ("memory", "cpu", "io"):
+                pressure = read_pressure_avg10(resource)
+                if pressure is not None and pressure > self.max_pressure:
+                    return f"{resource} pressure {pressure:.1f}% above {self.max_pressure:g}%"
+        return None
+
+    def acquire(self, cancelled: Optional[threading.Event] = None, on_wait: Optional[Callable[[str], None]] = None) -> bool:
+        while not (cancelled and cancelled.is_set()):
+            if self.slots and not self.slots.acquire(timeout=ADMISSION_POLL_SECONDS):
+                if on_wait:
+                    on_wait(f"waiting for an agent slot ({self.max_agents} running)")
+                continue
+            reason, delay = self._admit_resources()
+            if reason is None:
+                return True
+            if self.slots:
+                self.slots.release()
+            if on_wait:
+                on_wait(reason)
+            if cancelled:
+                cancelled.wait(delay)
+            else:
+                time.sleep(delay)
+        return False
+
+    def try_acquire(self) -> Optional[str]:
+        """Admit without waiting; returns None when admitted, otherwise why the launch is held."""
+        if self.slots and not self.slots.acquire(blocking=False):
+            return f"waiting for an agent slot ({self.max_agents} running)"
+        reason, _ = self._admit_resources()
+        if reason is not None and self.slots:
+            self.slots.release()
+        return reason
+
+    def _admit_resources(self) -> Tuple[Optional[str], float]:
+        if not self.checks_resources:
+            return None, 0.0
+        with self.lock:
+            if time.monotonic() - self.last_admitted < ADMISSION_SETTLE_SECONDS:
+                return "spacing agent launches", ADMISSION_SETTLE_SECONDS
+            reason = self.resource_hold_reason()
+            if reason is None:
+                self.last_admitted = time.monotonic()
+            return reason, ADMISSION_POLL_SECONDS
+
+    def release(self) -> None:
+        if self.slots:
+            self.slots.release()
+
+
+@dataclass
+class RunControl:
+    fail_fast: bool = False
+    agent_budget: AgentBudget = field(default_factory=AgentBudget)
+    admission: Optional[AdmissionController] = None
+    workers: Optional["WorkerRegistry"] = None
+    token_budget: Optional[int] = None
+    agent_token_budget: Optional[int] = None
+    usage: TokenUsage = field(default_factory=TokenUsage)
+    planner_usage: TokenUsage = field(default_factory=TokenUsage)
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    cancel_reason: Optional[str] = None
+    cancel_policy: str = "fail-fast"
+    processes: Dict[str, subprocess.Popen] = field(default_factory=dict)
+    lock: InstrumentedLock = field(default_factory=InstrumentedLock)
+
+    def register(self, key: str, proc: subprocess.Popen) -> bool:
+        with self.lock:
+            if self.cancelled.is_set():
+                return False
+            self.processes[key] = proc
+            return True
+
+    def unregister(self, key: str) -> None:
+        with self.lock:
+            self.processes.pop(key, None)
+
+    def cancel(self, reason: str, policy: str = "fail-fast") -> bool:
+        with self.lock:
+            if self.cancelled.is_set():
+                return False
+            self.cancel_reason = reason
+            self.cancel_policy = policy
+            self.cancelled.set()
+            procs = list(self.processes.values())
+        # Terminate in parallel so one slow SIGTERM grace period does not
+        # serialize shutdown of every sibling agent.
+        killers = [
+            threading.Thread(target=terminate_process_group, args=(proc,), daemon=True)
+            for proc in procs
+        ]
+        for killer in killers:
+            killer.start()
+        for killer in killers:
+            killer.join()
+        return True
+
+    def record_usage(
+        self, owner: Optional[TokenUsage], turn: TokenUsage, label: str, agent_budget: bool = True
+    ) -> Optional[str]:
+        """Account one turn's tokens; returns a blocker once the agent or run budget is exceeded.
+
+        Exceeding the run budget also cancels every running agent. The planner passes
+        agent_budget=False: it only counts toward the run budget.
+        """
+        with self.lock:
+            self.usage.add(turn)
+            if owner is not None:
+                owner.add(turn)
+            run_total = self.usage.total
+            owner_total = owner.total if owner is not None else 0
+        if agent_budget and self.agent_token_budget and owner_total > self.agent_token_budget:
+            return f"TOKEN BUDGET: {label} used {owner_total} tokens (agent budget {self.agent_token_budget})"
+        if self.token_budget and run_total > self.token_budget:
+            reason = f"TOKEN BUDGET: run used {run_total} tokens (budget {self.token_budget})"
+            self.cancel(reason, policy="token-budget")
+            return reason
+        return None
+
+    def usage_summary(self) -> Dict[str, object]:
+        with self.lock:
+            return {
+                "total": self.usage.to_dict(),
+                "planner": self.planner_usage.to_dict(),
+                "tokenBudget": self.token_budget,
+                "agentTokenBudget": self.agent_token_budget,
+            }
+
+
+@dataclass
+class RemoteAssignment:
+    assignment_id: str
+    worker_id: str
+    payload: Dict[str, object]
+    on_events: Callable[[List[str]], None]
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Optional[Dict[str, object]] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+
+
+@dataclass
+class RemoteWorker:
+    worker_id: str
+    capacity: int
+    host: str
+    last_seen: float
+    active: Dict[str, RemoteAssignment] = field(default_factory=dict)
+    inbox: List[RemoteAssignment] = field(default_factory=list)
+    cancels: List[str] = field(default_factory=list)
+    registered_at: str = ""
+
+
+class WorkerRegistry:
+    """Orchestrator-side book of remote workers and the agent assignments handed to them."""
+
+    def __init__(self, token: Optional[str] = None, lost_after: float = WORKER_LOST_SECONDS) -> None:
+        self.token = token or None
+        self.lost_after = lost_after
+        self.workers: Dict[str, RemoteWorker] = {}
+        self.assignments: Dict[str, RemoteAssignment] = {}
+        self.cond = threading.Condition()
+        self.sequence = 0
+
+    def register(self, worker_id: str, capacity: int, host: str) -> None:
+        with self.cond:
+            previous = self.workers.get(worker_id)
+            if previous:
+                # A worker that registers again has restarted; whatever it was running is gone.
+                self._drop_worker(previous, f"remote worker {worker_id} restarted")
+            self.workers[worker_id] = RemoteWorker(
+                worker_id=worker_id,
+                capacity=max(1, capacity),
+                host=host,
+                last_seen=time.monotonic(),
+                registered_at=now_iso(),
+            )
+            self.cond.notify_all()
+
+    def live_count(self) -> int:
+        with self.cond:
+            self._reap_locked()
+            return len(self.workers)
+
+    def wait_for_workers(self, count: int, timeout: float, cancelled: Optional[threading.Event] = None) -> int:
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while len(self.workers) < count and not (cancelled and cancelled.is_set()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(min(remaining, 1.0))
+                self._reap_locked()
+            return len(self.workers)
+
+    def dispatch(self, payload: Dict[str, object], on_events: Callable[[List[str]], None]) -> Optional[RemoteAssignment]:
+        """Queue an assignment on the live worker with the most free capacity, or None if all are busy."""
+        with self.cond:
+            self._reap_locked()
+            candidates = [w for w in self.workers.values() if w.capacity > len(w.active)]
+            if not candidates:
+                return None
+            worker = max(candidates, key=lambda w: (w.capacity - len(w.active), -w.last_seen))
+            self.sequence += 1
+            assignment = RemoteAssignment(
+                assignment_id=f"{payload.get('runId')}/{payload.get('agent')}/{self.sequence}",
+                worker_id=worker.worker_id,
+                payload=payload,
+                on_events=on_events,
+            )
+            worker.active[assignment.assignment_id] = assignment
+            worker.inbox.append(assignment)
+            self.assignments[assignment.assignment_id] = assignment
+            self.cond.notify_all()
+            return assignment
+
+    def poll(self, worker_id: str, free: int, wait: float) -> Optional[Dict[str, object]]:
+        """Heartbeat plus long-poll; None means the worker is unknown and must register again."""
+        deadline = time.monotonic() + max(0.0, min(wait, WORKER_POLL_WAIT_SECONDS))
+        with self.cond:
+            self._reap_locked()
+            worker = self.workers.get(worker_id)
+            if not worker:
+                return None
+            worker.last_seen = time.monotonic()
+            # Return early for a cancel, for work the worker has room for, or once a
+            # finished result frees a slot on a worker that polled while full.
+            while not worker.cancels and not (free > 0 and worker.inbox) and not (free <= 0 and len(worker.active) < worker.capacity):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.workers.get(worker_id) is not worker:
+                    break
+                self.cond.wait(remaining)
+            worker.last_seen = time.monotonic()
+            response: Dict[str, object] = {"cancel": list(worker.cancels)}
+            worker.cancels.clear()
+            if free > 0 and worker.inbox:
+                assignment = worker.inbox.pop(0)
+                response["assignment"] = dict(assignment.payload, assignmentId=assignment.assignment_id)
+            return response
+
+    def push_events(self, worker_id: str, assignment_id: str, lines: List[str]) -> bool:
+        assignment = self._touch(worker_id, assignment_id)
+        if not assignment:
+            return False
+        assignment.on_events(lines)
+        return True
+
+    def complete(self, worker_id: str, assignment_id: str, result: Dict[str, object]) -> bool:
+        with self.cond:
+            assignment = self._touch_locked(worker_id, assignment_id)
+            if not assignment:
+                return False
+            worker = self.workers[worker_id]
+            worker.active.pop(assignment_id, None)
+            self.assignments.pop(assignment_id, None)
+            assignment.result = result
+            assignment.done.set()
+            self.cond.notify_all()
+            return True
+
+    def cancel(self, assignment: RemoteAssignment) -> None:
+        with self.cond:
+            if assignment.cancel_requested or assignment.done.is_set():
+                return
+            assignment.cancel_requested = True
+            worker = self.workers.get(assignment.worker_id)
+            if not worker:
+                return
+            if assignment in worker.inbox:
+                # Never picked up: settle it here instead of waiting on the worker.
+                worker.inbox.remove(assignment)
+                worker.active.pop(assignment.assignment_id, None)
+                self.assignments.pop(assignment.assignment_id, None)
+                assignment.error = "cancelled before the remote worker picked it up"
+                assignment.done.set()
+            else:
+                worker.cancels.append(assignment.assignment_id)
+            self.cond.notify_all()
 
+    def reap(self) -> None:
+        with self.cond:
+            self._reap_locked()
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        with self.cond:
+            now = time.monotonic()
+            return [
+                {
+                    "workerId": w.worker_id,
+                    "host": w.host,
+                    "capacity": w.capacity,
+                    "active": sorted(w.active),
+                    "lastSeenSecondsAgo": round(now - w.last_seen, 1),
+                    "registeredAt": w.registered_at,
+                }
+                for w in sorted(self.workers.values(), key=lambda w: w.worker_id)
+            ]
+
+    def _touch(self, worker_id: str, assignment_id: str) -> Optional[RemoteAssignment]:
+        with self.cond:
+            return self._touch_locked(worker_id, assignment_id)
+
+    def _touch_locked(self, worker_id: str, assignment_id: str) -> Optional[RemoteAssignment]:
+        worker = self.workers.get(worker_id)
+        if not worker:
+            return None
+        worker.last_seen = time.monotonic()
+        return worker.active.get(assignment_id)
+
+    def _reap_locked(self) -> None:
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if now - worker.last_seen > self.lost_after:
+                self._drop_worker(worker, f"remote worker {worker.worker_id} lost (no heartbeat for {self.lost_after:g}s)")
+
+    def _drop_worker(self, worker: RemoteWorker, reason: str) -> None:
+        self.workers.pop(worker.worker_id, None)
+        for assignment in worker.active.values():
+            self.assignments.pop(assignment.assignment_id, None)
+            assignment.error = reason
+            assignment.done.set()
+        worker.active.clear()
+        worker.inbox.clear()
+        self.cond.notify_all()
 
 
 def now_iso() -> str:
@@ -351,43 +1167,684 @@ def canonical_scope(scope: str) -> str:
     return scope
 
 
-def in_scope(path: str, scope: str) -> bool:
-    scope = canonical_scope(scope)
-    scope_alt = f"codex-rs/{scope}" if scope else ""
-    rel = path.replace("\\", "/")
-    if not scope:
-        return True
-    rel = rel.strip("/")
-    if rel == scope or rel.startswith(f"{scope}/"):
-        return True
-    if scope_alt and (rel == scope_alt or rel.startswith(f"{scope_alt}/")):
-        return True
+def scope_components(scope: str) -> Tuple[str, ...]:
+    canonical = canonical_scope(scope)
+    return tuple(canonical.split("/")) if canonical else ()
+
+
+def path_components(path: str) -> List[Tuple[str, ...]]:
+    """Component tuples a changed path can match a canonical scope under (raw and `codex-rs/`-stripped)."""
+    rel = path.replace("\\", "/").strip("/")
+    forms = [tuple(part for part in rel.split("/") if part)]
     if rel.startswith("codex-rs/"):
-        rel = rel[len("codex-rs/") :]
-        return rel == scope or rel.startswith(f"{scope}/")
-    return False
+        forms.append(forms[0][1:])
+    return forms
+
+
+class _ScopeNode:
+    __slots__ = ("children", "owners", "subtree_size")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_ScopeNode"] = {}
+        self.owners: List[object] = []
+        self.subtree_size = 0
+
+
+class ScopeTrie:
+    """Prefix trie of canonical scope components (`codex-rs/` aliasing resolved on insert).
+
+    Overlap and membership queries walk one root-to-leaf path, so they cost
+    O(path depth) instead of a scan over every registered scope.
+    """
+
+    def __init__(self) -> None:
+        self.root = _ScopeNode()
+        self._order: Dict[object, int] = {}
+
+    @classmethod
+    def from_scopes(cls, scopes: List[str]) -> "ScopeTrie":
+        trie = cls()
+        for scope in scopes:
+            trie.insert(scope, scope)
+        return trie
+
+    def insert(self, scope: str, owner: object) -> None:
+        self._order.setdefault(owner, len(self._order))
+        node = self.root
+        node.subtree_size += 1
+        for part in scope_components(scope):
+            node = node.children.setdefault(part, _ScopeNode())
+            node.subtree_size += 1
+        node.owners.append(owner)
+
+    def overlaps(self, scope: str) -> bool:
+        node = self.root
+        for part in scope_components(scope):
+            if node.owners:
+                return True
+            child = node.children.get(part)
+            if child is None:
+                return False
+            node = child
+        return node.subtree_size > 0
+
+    def overlapping(self, scope: str) -> List[object]:
+        """Owners whose scope is an ancestor of, equal to, or nested under `scope`."""
+        found: List[object] = []
+        node: Optional[_ScopeNode] = self.root
+        for part in scope_components(scope):
+            found.extend(node.owners)
+            node = node.children.get(part)
+            if node is None:
+                break
+        if node is not None:
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                found.extend(current.owners)
+                stack.extend(current.children.values())
+        return sorted(found, key=lambda owner: self._order[owner])
+
+    def owner_of(self, path: str) -> Optional[object]:
+        """Owner of the deepest registered scope containing `path`, if any."""
+        best: Tuple[int, Optional[object]] = (-1, None)
+        for parts in path_components(path):
+            node = self.root
+            if node.owners:
+                best = max(best, (0, node.owners[-1]), key=lambda item: item[0])
+            for depth, part in enumerate(parts, start=1):
+                node = node.children.get(part)
+                if node is None:
+                    break
+                if node.owners:
+                    best = max(best, (depth, node.owners[-1]), key=lambda item: item[0])
+        return best[1]
+
+    def contains(self, path: str) -> bool:
+        return self.owner_of(path) is not None
+
+
+class TrackedPathIndex:
+    """Tracked files and every directory prefix above them, with file counts, for one commit.
+
+    Existence and size lookups are single dict/set hits; build it through
+    `tracked_path_index()` so it is computed once per HEAD. A run gets it once
+    and passes it to scope validation and model routing.
+    """
+
+    def __init__(self, head: str, paths: List[str]) -> None:
+        self.head = head
+        self.files = frozenset(paths)
+        counts: Dict[str, int] = {"": len(paths)}
+        for path in paths:
+            end = path.find("/")
+            while end != -1:
+                prefix = path[:end]
+                counts[prefix] = counts.get(prefix, 0) + 1
+                end = path.find("/", end + 1)
+        self.dirs = counts
+        self._by_name: Optional[Dict[str, List[str]]] = None
+
+    @classmethod
+    def build(cls, head: str) -> "TrackedPathIndex":
+        proc = subprocess.run(
+            ["git", "ls-files", "-z"],
+            cwd=str(PROJECT_ROOT),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        paths = [entry for entry in proc.stdout.decode("utf-8", errors="replace").split("\0") if entry]
+        return cls(head, paths)
+
+    def is_dir(self, prefix: str) -> bool:
+        return normalize_scope(prefix) in self.dirs
+
+    def exists(self, prefix: str) -> bool:
+        prefix = normalize_scope(prefix)
+        return prefix in self.dirs or prefix in self.files
+
+    def file_count(self, prefix: str) -> int:
+        prefix = normalize_scope(prefix)
+        if prefix in self.files:
+            return 1
+        return self.dirs.get(prefix, 0)
+
+    def nearest_existing(self, prefix: str) -> str:
+        """Deepest tracked directory at or above `prefix` (`""` for the repository root)."""
+        prefix = normalize_scope(prefix)
+        while prefix and prefix not in self.dirs:
+            prefix = prefix.rpartition("/")[0]
+        return prefix
+
+    def paths_ending_with(self, suffix: str) -> List[str]:
+        """Tracked files and directories whose trailing components equal `suffix`."""
+        suffix = normalize_scope(suffix)
+        if not suffix:
+            return []
+        if self._by_name is None:
+            by_name: Dict[str, List[str]] = {}
+            for path in (*self.dirs, *self.files):
+                if path:
+                    by_name.setdefault(path.rpartition("/")[2], []).append(path)
+            self._by_name = by_name
+        last = suffix.rpartition("/")[2]
+        return sorted(d for d in self._by_name.get(last, []) if d == suffix or d.endswith(f"/{suffix}"))
+
+
+_TRACKED_PATH_INDEXES: Dict[str, TrackedPathIndex] = {}
+_TRACKED_PATH_INDEX_LOCK = threading.Lock()
+
+
+def tracked_path_index() -> Optional[TrackedPathIndex]:
+    """Tracked-path index of the main checkout's HEAD, built on first use and reused until HEAD moves."""
+    proc = run_simple(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT)
+    head = proc.stdout.strip()
+    if proc.returncode != 0 or not head:
+        return None
+    with _TRACKED_PATH_INDEX_LOCK:
+        index = _TRACKED_PATH_INDEXES.get(head)
+        if index is None:
+            index = TrackedPathIndex.build(head)
+            _TRACKED_PATH_INDEXES.clear()
+            _TRACKED_PATH_INDEXES[head] = index
+        return index
+
+
+@dataclass
+class ScopeCheck:
+    agent: str
+    status: str
+    scope: str
+    original: str
+    files: int = 0
+    reason: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, object]:
+        payload: Dict[str, object] = {"status": self.status, "scope": self.scope, "files": self.files}
+        if self.original != self.scope:
+            payload["original"] = self.original
+        if self.reason:
+            payload["reason"] = self.reason
+        return payload
+
+
+def scope_candidates(scope: str) -> List[str]:
+    """Repository paths a scope may name: as written, and under `codex-rs/` (see canonical_scope)."""
+    canonical = canonical_scope(scope)
+    candidates = [normalize_scope(scope)]
+    if canonical and f"codex-rs/{canonical}" not in candidates:
+        candidates.append(f"codex-rs/{canonical}")
+    return candidates
+
+
+def check_scope(agent: str, scope: str, index: TrackedPathIndex) -> ScopeCheck:
+    """Classify a code-mode scope as ok, repaired (unique tracked match), new (under a tracked directory) or rejected."""
+    candidates = scope_candidates(scope)
+    if not canonical_scope(scope):
+        return ScopeCheck(agent, "ok", scope, scope, files=index.file_count(candidates[0]))
+    for candidate in candidates:
+        if index.exists(candidate):
+            return ScopeCheck(agent, "ok", scope, scope, files=index.file_count(candidate))
+    matches = index.paths_ending_with(candidates[0])
+    if len(matches) == 1:
+        return ScopeCheck(
+            agent,
+            "repaired",
+            matches[0],
+            scope,
+            files=index.file_count(matches[0]),
+            reason=f"{scope} is not tracked; matched {matches[0]}",
+        )
+    # Missing paths below a tracked directory are new modules the agent will create. Directly
+    # under the `codex-rs/` alias root only a single new component counts, otherwise every scope would pass.
+    for candidate in candidates:
+        nearest = index.nearest_existing(candidate)
+        if nearest and (nearest != DEFAULT_SCOPE_ROOT or nearest == candidate.rpartition("/")[0]):
+            return ScopeCheck(agent, "new", scope, scope, reason=f"creates new paths under {nearest}")
+    detail = f"ambiguous, matches {', '.join(matches[:5])}" if matches else "its parent directory is not tracked either"
+    return ScopeCheck(agent, "rejected", scope, scope, reason=f"Scope not found: {scope} is not a tracked path ({detail})")
+
+
+def validate_plan_scopes(
+    plan: List[AgentTask], index: Optional[TrackedPathIndex]
+) -> Tuple[List[AgentTask], Dict[str, ScopeCheck]]:
+    """Check every planned scope against tracked paths; repair unique matches that stay disjoint."""
+    if index is None:
+        return plan, {}
+    checks = {item.name: check_scope(item.name, item.scope, index) for item in plan}
+    claimed = ScopeTrie()
+    for item in plan:
+        if checks[item.name].status != "repaired":
+            claimed.insert(item.scope, item.name)
+    repaired: List[AgentTask] = []
+    for item in plan:
+        check = checks[item.name]
+        if check.status == "repaired":
+            if claimed.overlaps(check.scope):
+                check.status = "rejected"
+                check.reason = f"Scope not found: {item.scope} is not a tracked path (match {check.scope} overlaps another scope)"
+                check.scope = item.scope
+                check.files = 0
+            else:
+                claimed.insert(check.scope, item.name)
+                item = AgentTask(name=item.name, scope=check.scope, objective=item.objective, depends_on=item.depends_on)
+        repaired.append(item)
+    return repaired, checks
 
 
-def scopes_overlap(scope_a: str, scope_b: str) -> bool:
-    a = canonical_scope(scope_a)
-    b = canonical_scope(scope_b)
-    if not a or not b:
-        return a == "" or b == ""
-    if a == b:
+def fsync_path(path: Path) -> bool:
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        os.fsync(fd)
         return True
-    return a.startswith(f"{b}/") or b.startswith(f"{a}/")
+    except OSError:
+        # Directories cannot be fsynced on every platform.
+        return False
+    finally:
+        os.close(fd)
 
 
-def dump_json(path: Path, payload: object) -> None:
+def atomic_write_file(path: Path, data: bytes, fsync: bool = False) -> None:
+    """Write through a temp file in the same directory renamed over path, so readers never see a torn file."""
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as fp:
-        json.dump(payload, fp, indent=2)
-        fp.write("\n")
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with tmp.open("wb") as fp:
+            fp.write(data)
+            if fsync:
+                fp.flush()
+                os.fsync(fp.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if fsync:
+        fsync_path(path.parent)
+
+
+class ArtifactStore(ABC):
+    """Backend behind dump_json/dump_text and the artifact loaders.
+
+    Keys are paths under artifacts/. Paths outside it (merge patches, temp files) are always
+    written to disk, and reads fall back to disk so files written by codex, git or the contract
+    script stay visible whatever the backend.
+    """
+
+    backend = "base"
+
+    def __init__(self, fsync: str = "off") -> None:
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.appends = 0
+        self.bytes_written = 0
+        self.fsyncs = 0
+
+    @staticmethod
+    def key(path: Path) -> Optional[str]:
+        try:
+            return path.relative_to(ARTIFACTS_ROOT).as_posix()
+        except ValueError:
+            return None
+
+    def write(self, path: Path, data: bytes) -> None:
+        key = self.key(path)
+        if key is None:
+            atomic_write_file(path, data)
+        else:
+            self._write(path, key, data)
+        with self.lock:
+            self.writes += 1
+            self.bytes_written += len(data)
+
+    def append(self, path: Path, data: bytes) -> None:
+        key = self.key(path)
+        if key is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("ab") as fp:
+                fp.write(data)
+        else:
+            self._append(path, key, data)
+        with self.lock:
+            self.appends += 1
+            self.bytes_written += len(data)
+
+    def read(self, path: Path) -> Optional[bytes]:
+        key = self.key(path)
+        data = self._read(key) if key is not None else None
+        if data is not None:
+            return data
+        try:
+            return path.read_bytes()
+        except OSError:
+            return None
+
+    def exists(self, path: Path) -> bool:
+        key = self.key(path)
+        return (key is not None and self._read(key) is not None) or path.exists()
+
+    def list(self, directory: Path) -> List[Tuple[Path, float]]:
+        """(path, modified epoch seconds) of the artifacts directly inside directory."""
+        key = self.key(directory)
+        return self._list(directory, key) if key is not None else []
+
+    def delete(self, path: Path) -> None:
+        key = self.key(path)
+        if key is not None:
+            self._delete(path, key)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def stats(self) -> Dict[str, object]:
+        with self.lock:
+            return {
+                "backend": self.backend,
+                "fsync": self.fsync,
+                "writes": self.writes,
+                "appends": self.appends,
+                "bytes": self.bytes_written,
+                "fsyncs": self.fsyncs,
+            }
+
+    def location(self, path: Path) -> str:
+        """Where a user finds this artifact, for printed evidence paths."""
+        try:
+            return path.relative_to(PROJECT_ROOT).as_posix()
+        except ValueError:
+            return str(path)
+
+    @abstractmethod
+    def _write(self, path: Path, key: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def _append(self, path: Path, key: str, data: bytes) -> None:
+        ...
+
+    def _read(self, key: str) -> Optional[bytes]:
+        """The stored bytes, or None to fall back to the file on disk."""
+        return None
+
+    @abstractmethod
+    def _list(self, directory: Path, key: str) -> List[Tuple[Path, float]]:
+        ...
+
+    @abstractmethod
+    def _delete(self, path: Path, key: str) -> None:
+        ...
+
+
+class LocalArtifactStore(ArtifactStore):
+    """The artifacts/ layout on disk, every file replaced atomically."""
+
+    backend = "local"
+
+    def __init__(self, fsync: str = "off") -> None:
+        super().__init__(fsync)
+        self.pending: List[Path] = []
+        self.last_flush = time.monotonic()
+
+    def _write(self, path: Path, key: str, data: bytes) -> None:
+        atomic_write_file(path, data, fsync=self.fsync == "always")
+        self._written(path)
+
+    def _append(self, path: Path, key: str, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("ab") as fp:
+            fp.write(data)
+            if self.fsync == "always":
+                fp.flush()
+                os.fsync(fp.fileno())
+        self._written(path)
+
+    def _list(self, directory: Path, key: str) -> List[Tuple[Path, float]]:
+        found: List[Tuple[Path, float]] = []
+        try:
+            children = list(directory.iterdir())
+        except OSError:
+            return found
+        for path in children:
+            # Skip in-flight temp files of atomic writes.
+            if path.name.startswith("."):
+                continue
+            try:
+                if path.is_file():
+                    found.append((path, path.stat().st_mtime))
+            except OSError:
+                continue
+        return found
+
+    def _delete(self, path: Path, key: str) -> None:
+        path.unlink(missing_ok=True)
+
+    def _written(self, path: Path) -> None:
+        if self.fsync == "always":
+            with self.lock:
+                self.fsyncs += 1
+            return
+        if self.fsync != "batch":
+            return
+        with self.lock:
+            self.pending.append(path)
+            due = (
+                len(self.pending) >= ARTIFACT_FSYNC_BATCH_FILES
+                or time.monotonic() - self.last_flush >= ARTIFACT_FSYNC_BATCH_SECONDS
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, []
+            self.last_flush = time.monotonic()
+        files = list(dict.fromkeys(pending))
+        synced = sum(1 for path in files if fsync_path(path))
+        for directory in dict.fromkeys(path.parent for path in files):
+            fsync_path(directory)
+        with self.lock:
+            self.fsyncs += synced
+
+
+class SqliteArtifactStore(ArtifactStore):
+    """One SQLite file per run under artifacts/store/.
+
+    `<run-id>.sqlite` holds the run's coordination and packet artifacts and `shared.sqlite`
+    everything else (caches, indexes, batch summaries). Every write is its own transaction.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, root: Path = ARTIFACT_STORE_DIR, fsync: str = "off") -> None:
+        super().__init__(fsync)
+        self.root = root
+        self.db_lock = threading.Lock()
+        self.connections: Dict[str, sqlite3.Connection] = {}
+
+    @staticmethod
+    def database(key: str) -> str:
+        parts = key.split("/")
+        if len(parts) > 2 and parts[0] in ("coordination", "pr-packets"):
+            return parts[1]
+        return "shared"
+
+    def location(self, path: Path) -> str:
+        key = self.key(path)
+        if key is None:
+            return super().location(path)
+        # A run directory lives in its run database even though the key has no file part yet.
+        name = self.database(key + "/") if key.count("/") == 1 else self.database(key)
+        return f"{super().location(path)} (in {super().location(self.root / f'{name}.sqlite')})"
+
+    def connect(self, key: str) -> sqlite3.Connection:
+        name = self.database(key)
+        conn = self.connections.get(name)
+        if conn is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.root / f"{name}.sqlite"), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={ {'always': 'FULL', 'batch': 'NORMAL'}.get(self.fsync, 'OFF') }")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts (path TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self.connections[name] = conn
+        return conn
+
+    def _write(self, path: Path, key: str, data: bytes) -> None:
+        with self.db_lock:
+            self.connect(key).execute(
+                "INSERT OR REPLACE INTO artifacts (path, data, updated_at) VALUES (?, ?, ?)", (key, data, time.time())
+            )
+        self._committed()
+
+    def _append(self, path: Path, key: str, data: bytes) -> None:
+        with self.db_lock:
+            conn = self.connect(key)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT data FROM artifacts WHERE path = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO artifacts (path, data, updated_at) VALUES (?, ?, ?)",
+                    (key, (bytes(row[0]) if row else b"") + data, time.time()),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self._committed()
+
+    def _committed(self) -> None:
+        # synchronous=FULL syncs every commit.
+        if self.fsync == "always":
+            with self.lock:
+                self.fsyncs += 1
+
+    def _read(self, key: str) -> Optional[bytes]:
+        with self.db_lock:
+            row = self.connect(key).execute("SELECT data FROM artifacts WHERE path = ?", (key,)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def _list(self, directory: Path, key: str) -> List[Tuple[Path, float]]:
+        prefix = f"{key}/"
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self.db_lock:
+            rows = self.connect(prefix).execute(
+                "SELECT path, updated_at FROM artifacts WHERE path LIKE ? ESCAPE '\\'", (pattern,)
+            ).fetchall()
+        return [(ARTIFACTS_ROOT / path, float(updated)) for path, updated in rows if path.startswith(prefix) and "/" not in path[len(prefix):]]
+
+    def _delete(self, path: Path, key: str) -> None:
+        with self.db_lock:
+            self.connect(key).execute("DELETE FROM artifacts WHERE path = ?", (key,))
+
+    def flush(self) -> None:
+        if self.fsync != "batch":
+            return
+        with self.db_lock:
+            connections = list(self.connections.values())
+            for conn in connections:
+                conn.execute("PRAGMA wal_checkpoint(FULL)")
+        with self.lock:
+            self.fsyncs += len(connections)
+
+    def close(self) -> None:
+        self.flush()
+        with self.db_lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.connections.clear()
+
+
+class MemoryArtifactStore(ArtifactStore):
+    """Artifacts kept in a dict, for tests and benchmarks; nothing under artifacts/ reaches the disk."""
+
+    backend = "memory"
+
+    def __init__(self) -> None:
+        super().__init__("off")
+        self.files: Dict[str, Tuple[bytes, float]] = {}
+
+    def location(self, path: Path) -> str:
+        if self.key(path) is None:
+            return super().location(path)
+        return f"{super().location(path)} (in memory, not saved)"
+
+    def _write(self, path: Path, key: str, data: bytes) -> None:
+        with self.lock:
+            self.files[key] = (bytes(data), time.time())
+
+    def _append(self, path: Path, key: str, data: bytes) -> None:
+        with self.lock:
+            previous = self.files.get(key, (b"", 0.0))[0]
+            self.files[key] = (previous + data, time.time())
+
+    def _read(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.files.get(key)
+        return entry[0] if entry else None
+
+    def _list(self, directory: Path, key: str) -> List[Tuple[Path, float]]:
+        prefix = f"{key}/"
+        with self.lock:
+            return [
+                (ARTIFACTS_ROOT / path, modified)
+                for path, (_, modified) in self.files.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            ]
+
+    def _delete(self, path: Path, key: str) -> None:
+        with self.lock:
+            self.files.pop(key, None)
+
+
+def open_artifact_store(backend: Optional[str] = None, fsync: Optional[str] = None) -> ArtifactStore:
+    """A store for `backend` and `fsync` (env defaults); unknown values fall back to local and off."""
+    backend = (backend or os.environ.get(_ARTIFACT_STORE_ENV) or "local").strip().lower()
+    fsync = (fsync or os.environ.get(_ARTIFACT_FSYNC_ENV) or "off").strip().lower()
+    if fsync not in _ALLOWED_FSYNC_MODES:
+        fsync = "off"
+    if backend == "sqlite":
+        return SqliteArtifactStore(fsync=fsync)
+    if backend == "memory":
+        return MemoryArtifactStore()
+    return LocalArtifactStore(fsync=fsync)
+
+
+_ARTIFACT_STORE: Optional[ArtifactStore] = None
+_ARTIFACT_STORE_LOCK = threading.Lock()
+
+
+def artifact_store() -> ArtifactStore:
+    global _ARTIFACT_STORE
+    if _ARTIFACT_STORE is None:
+        with _ARTIFACT_STORE_LOCK:
+            if _ARTIFACT_STORE is None:
+                _ARTIFACT_STORE = open_artifact_store()
+                atexit.register(_ARTIFACT_STORE.close)
+    return _ARTIFACT_STORE
+
+
+def set_artifact_store(store: ArtifactStore) -> Optional[ArtifactStore]:
+    """Swap the process-wide store (tests, benchmarks); returns the previous one, unclosed."""
+    global _ARTIFACT_STORE
+    with _ARTIFACT_STORE_LOCK:
+        previous, _ARTIFACT_STORE = _ARTIFACT_STORE, store
+    return previous
+
+
+def dump_json(path: Path, payload: object) -> None:
+    artifact_store().write(path, (json.dumps(payload, indent=2) + "\n").encode("utf-8"))
 
 
 def dump_text(path: Path, text: str) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(text, encoding="utf-8")
+    artifact_store().write(path, text.encode("utf-8"))
 
 
 def run_simple(cmd: List[str], cwd: Path, check: bool = False) -> subprocess.CompletedProcess[str]:
@@ -410,23 +1867,63 @@ def run_simple(cmd: List[str], cwd: Path, check: bool = False) -> subprocess.Com
 
 
 def load_state_file(path: Path) -> Dict[str, object]:
-    if not path.exists():
+    data = artifact_store().read(path)
+    if data is None:
         return {}
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except (json.JSONDecodeError, OSError, UnicodeDecodeError):
+        return json.loads(data.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
         return {}
 
 
 def load_json_or_none(path: Path) -> Optional[dict]:
-    if not path.exists():
+    data = artifact_store().read(path)
+    if data is None:
         return None
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except (json.JSONDecodeError, OSError, UnicodeDecodeError):
+        return json.loads(data.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
         return None
 
 
+def store_blob(packet_dir: Path, text: str) -> Dict[str, object]:
+    """Write text once under blobs/<sha256>.txt and return its reference."""
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    rel = f"{REPORT_BLOB_DIR}/{digest}.txt"
+    path = packet_dir / rel
+    if not artifact_store().exists(path):
+        artifact_store().write(path, data)
+    return {"blob": rel, "bytes": len(data), "sha256": digest}
+
+
+def is_blob_ref(value: object) -> bool:
+    return isinstance(value, dict) and isinstance(value.get("blob"), str) and isinstance(value.get("sha256"), str)
+
+
+def externalize_blobs(value: object, packet_dir: Path) -> object:
+    """Copy of a report with every long REPORT_BLOB_FIELDS string replaced by a blob reference."""
+    if isinstance(value, dict):
+        out: Dict[str, object] = {}
+        for key, item in value.items():
+            if key in REPORT_BLOB_FIELDS and isinstance(item, str) and len(item) > REPORT_INLINE_LIMIT_CHARS:
+                out[key] = store_blob(packet_dir, item)
+            else:
+                out[key] = externalize_blobs(item, packet_dir)
+        return out
+    if isinstance(value, list):
+        return [externalize_blobs(item, packet_dir) for item in value]
+    return value
+
+
+def resolve_blob(packet_dir: Path, value: object) -> str:
+    """Text of a report field, reading its blob only when the field was externalized."""
+    if not is_blob_ref(value):
+        return "" if value is None else str(value)
+    data = artifact_store().read(packet_dir / str(value["blob"]))
+    return data.decode("utf-8", errors="replace") if data is not None else ""
+
+
 def write_state_snapshot(path: Path, payload: Dict[str, object]) -> None:
     dump_json(path, payload)
 
@@ -484,6 +1981,53 @@ def summarize_event_line(raw: str) -> Optional[str]:
     return None
 
 
+def build_agent_view(a: AgentState) -> AgentView:
+    """Dashboard entry of one agent; the caller holds a.lock."""
+    latest_message = a.log[-1] if a.log else ""
+    latest_text = summarize_event_line(latest_message) or latest_message
+    entry = {
+        "name": a.name,
+        "scope": a.scope,
+        "objective": a.objective,
+        "status": a.status,
+        "threadId": a.thread_id,
+        "exitCode": a.exit_code,
+        "changedFiles": len(a.changed_files),
+        "durationMs": a.duration_ms,
+        "startedAt": a.started_at,
+        "finishedAt": a.finished_at,
+        "blockerReason": a.blocker_reason,
+        "mergeState": a.merge_state,
+        "queuedReason": a.queued_reason,
+        "worker": a.worker,
+        "usage": a.usage.to_dict(),
+        "model": a.model,
+        "escalated": a.escalated,
+        "cachedFrom": (a.advisory_cache or {}).get("sourceRunId"),
+        "latestMessage": latest_text[:320],
+    }
+    activity = []
+    for line in a.log:
+        summary = summarize_event_line(line)
+        if summary:
+            activity.append(f"{a.name}: {summary}")
+    return AgentView(entry, tuple(activity))
+
+
+def lock_wait_summary(agents: List[AgentState], control: Optional[RunControl] = None) -> Dict[str, object]:
+    """Time threads spent waiting for agent locks (event ingestion, status, dashboard) and the run control lock."""
+    per_agent = {a.name: a.lock.stats() for a in agents}
+    summary: Dict[str, object] = {
+        "agentWaitMs": round(sum(float(item["waitMs"]) for item in per_agent.values()), 3),
+        "agentMaxWaitMs": max((float(item["maxWaitMs"]) for item in per_agent.values()), default=0.0),
+        "agentContended": sum(int(item["contended"]) for item in per_agent.values()),
+        "agents": per_agent,
+    }
+    if control:
+        summary["control"] = control.lock.stats()
+    return summary
+
+
 def build_dashboard_payload(
     run_id: str,
     task: str,
@@ -505,28 +2049,13 @@ def build_dashboard_payload(
         "agents": [],
     }
     for a in sorted(agents, key=lambda a: a.name):
-        latest_message = a.log[-1] if a.log else ""
-        latest_text = summarize_event_line(latest_message) or latest_message
-        snapshot["agents"].append(
-            {
-                "name": a.name,
-                "scope": a.scope,
-                "objective": a.objective,
-                "status": a.status,
-                "threadId": a.thread_id,
-                "exitCode": a.exit_code,
-                "changedFiles": len(a.changed_files),
-                "durationMs": a.duration_ms,
-                "startedAt": a.started_at,
-                "finishedAt": a.finished_at,
-                "blockerReason": a.blocker_reason,
-                "latestMessage": latest_text[:320],
-            }
-        )
-        for line in a.log:
-            summary = summarize_event_line(line)
-            if summary:
-                snapshot.setdefault("activity", []).append(f"{a.name}: {summary}")
+        # Published views only: building the dashboard never takes an agent lock.
+        view = a.view
+        if view is None:
+            continue
+        snapshot["agents"].append(view.entry)
+        if view.activity:
+            snapshot.setdefault("activity", []).extend(view.activity)
 
     if "activity" in snapshot:
         snapshot["activity"] = snapshot["activity"][-20:]
@@ -541,46 +2070,175 @@ def is_transient_agent_error(error: Optional[str]) -> bool:
     return any(token in lower for token in _AGENT_RETRY_HINTS)
 
 
-def is_write_restricted(message: Optional[str]) -> bool:
-    if not message:
-        return False
-    lower = message.lower()
-    return any(token in lower for token in _AGENT_WRITE_HINTS)
+def _non_negative_float(value: Optional[str]) -> Optional[float]:
+    if value is None or not value.strip():
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
 
 
-class _DashboardServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
-    daemon_threads = True
+def resolve_agent_budget(
+    task_mode: str,
+    wall_seconds: Optional[float] = None,
+    idle_seconds: Optional[float] = None,
+) -> AgentBudget:
+    """Resolve watchdog budgets: CLI value, then per-mode env, then global env, then mode default."""
+    default_wall, default_idle = DEFAULT_AGENT_BUDGETS.get(task_mode, DEFAULT_AGENT_BUDGETS["code"])
+    suffix = f"_{task_mode.upper()}"
+    resolved = []
+    for explicit, env_name, default in (
+        (wall_seconds, _AGENT_TIMEOUT_ENV, default_wall),
+        (idle_seconds, _AGENT_IDLE_TIMEOUT_ENV, default_idle),
+    ):
+        value = explicit
+        if value is None:
+            value = _non_negative_float(os.environ.get(env_name + suffix))
+        if value is None:
+            value = _non_negative_float(os.environ.get(env_name))
+        if value is None:
+            value = default
+        resolved.append(value or None)
+    return AgentBudget(wall_seconds=resolved[0], idle_seconds=resolved[1])
+
+
+class _StreamWatchdog:
+    """Kills a codex process group that exceeds its wall-clock or idle budget."""
+
+    def __init__(self, proc: subprocess.Popen, budget: AgentBudget) -> None:
+        self.proc = proc
+        self.budget = budget
+        self.started = time.monotonic()
+        self.last_event = self.started
+        self.reason: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+
+    def start(self) -> None:
+        if self.budget.wall_seconds or self.budget.idle_seconds:
+            self._thread.start()
+
+    def touch(self) -> None:
+        self.last_event = time.monotonic()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(AGENT_WATCHDOG_POLL_SECONDS):
+            now = time.monotonic()
+            wall = self.budget.wall_seconds
+            idle = self.budget.idle_seconds
+            if wall and now - self.started > wall:
+                self.reason = f"TIMEOUT: exceeded wall-clock budget of {wall:g}s"
+            elif idle and now - self.last_event > idle:
+                self.reason = f"TIMEOUT: no events for {idle:g}s (idle budget)"
+            if self.reason:
+                terminate_process_group(self.proc)
+                return
 
 
-def start_web_dashboard_server(
-    state_file: Path, port: int, on_start: Optional[Callable[[str], Optional[str]]] = None
-) -> Tuple[http.server.HTTPServer, int]:
-    html = get_web_dashboard_html()
+def retry_backoff_seconds(attempt: int) -> float:
+    """Exponential backoff with equal jitter for retry number `attempt` (2 = first retry)."""
+    ceiling = min(AGENT_RETRY_MAX_DELAY_SECONDS, AGENT_RETRY_DELAY_SECONDS * (2 ** max(0, attempt - 2)))
+    return random.uniform(ceiling / 2, ceiling)
 
-    class _Handler(http.server.BaseHTTPRequestHandler):
-        def _send_json(self, status: int, payload: Dict[str, object]) -> None:
-            body = json.dumps(payload).encode("utf-8")
-            self.send_response(status)
-            self.send_header("Content-Type", "application/json; charset=utf-8")
-            self.send_header("Cache-Control", "no-cache")
-            self.send_header("Content-Length", str(len(body)))
-            self.end_headers()
-            self.wfile.write(body)
 
-        def _read_json(self) -> Optional[Dict[str, object]]:
-            length = int(self.headers.get("Content-Length", "0") or 0)
-            if length <= 0:
-                return None
-            try:
-                body = self.rfile.read(length).decode("utf-8", errors="replace")
-            except OSError:
-                return None
-            try:
-                payload = json.loads(body)
-            except json.JSONDecodeError:
-                return None
-            return payload if isinstance(payload, dict) else None
+def should_escalate(blocker: Optional[str], escalation_model: Optional[str], model: Optional[str]) -> bool:
+    if not blocker or not escalation_model or escalation_model == model:
+        return False
+    if blocker.startswith(_NON_ESCALATING_BLOCKER_PREFIXES):
+        return False
+    return not is_transient_agent_error(blocker)
+
+
+def count_tracked_files(scope: str, index: Optional[TrackedPathIndex] = None) -> int:
+    """Number of files git tracks under `scope`, used as the scope size for model rules."""
+    if index is None:
+        index = tracked_path_index()
+    if index is None:
+        return 0
+    return max(index.file_count(candidate) for candidate in scope_candidates(scope))
+
+
+def is_fatal_blocker(blocker: Optional[str]) -> bool:
+    if not blocker:
+        return False
+    if blocker.startswith("Scope violation"):
+        return True
+    return not is_transient_agent_error(blocker)
+
+
+def terminate_process_group(proc: subprocess.Popen, grace_seconds: float = AGENT_TERMINATE_GRACE_SECONDS) -> None:
+    if proc.poll() is not None:
+        return
+    try:
+        if os.name == "nt":
+            proc.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+    except OSError:
+        pass
+    try:
+        proc.wait(timeout=grace_seconds)
+        return
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        if os.name == "nt":
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def is_write_restricted(message: Optional[str]) -> bool:
+    if not message:
+        return False
+    lower = message.lower()
+    return any(token in lower for token in _AGENT_WRITE_HINTS)
+
+
+class _DashboardServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _JsonRequestHandler(http.server.BaseHTTPRequestHandler):
+    def _send_json(self, status: int, payload: Dict[str, object]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Optional[Dict[str, object]]:
+        length = int(self.headers.get("Content-Length", "0") or 0)
+        if length <= 0:
+            return None
+        try:
+            body = self.rfile.read(length).decode("utf-8", errors="replace")
+        except OSError:
+            return None
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError:
+            return None
+        return payload if isinstance(payload, dict) else None
+
+    def log_message(self, format: str, *args) -> None:  # pragma: no cover
+        return
+
+
+def start_web_dashboard_server(
+    state_file: Path, port: int, on_start: Optional[Callable[[str], Optional[str]]] = None
+) -> Tuple[http.server.HTTPServer, int]:
+    html = get_web_dashboard_html()
 
+    class _Handler(_JsonRequestHandler):
         def do_GET(self) -> None:
             parsed = urllib.parse.urlparse(self.path)
             if parsed.path in ("/", "/index.html"):
@@ -639,9 +2297,6 @@ def start_web_dashboard_server(
                 return
             self._send_json(202, {"runId": run_id, "status": "started"})
 
-        def log_message(self, format: str, *args) -> None:  # pragma: no cover
-            return
-
     try:
         server = _DashboardServer(("127.0.0.1", port), _Handler)
     except OSError as exc:  # pragma: no cover
@@ -651,6 +2306,117 @@ def start_web_dashboard_server(
     return server, server.server_address[1]
 
 
+def is_loopback_host(host: str) -> bool:
+    host = host.strip().strip("[]")
+    if host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def start_worker_registry_server(registry: WorkerRegistry, host: str, port: int) -> Tuple[http.server.HTTPServer, int]:
+    """Serve the pull-based worker API: register, poll (heartbeat + long-poll), events, result."""
+    # Workers receive full prompts and send back patches that are merged locally, so only
+    # loopback may skip the shared secret.
+    if not registry.token and not is_loopback_host(host):
+        raise RuntimeError(
+            f"refusing to serve the worker registry on {host or 'all interfaces'} without a worker token; "
+            f"set --worker-token (env: {_WORKER_TOKEN_ENV}) or bind 127.0.0.1"
+        )
+
+    class _Handler(_JsonRequestHandler):
+        def _authorized(self) -> bool:
+            if registry.token and not hmac.compare_digest(self.headers.get(_WORKER_TOKEN_HEADER) or "", registry.token):
+                self._send_json(403, {"error": "Invalid worker token."})
+                return False
+            return True
+
+        def do_GET(self) -> None:
+            if urllib.parse.urlparse(self.path).path != "/api/workers":
+                self.send_response(404)
+                self.end_headers()
+                return
+            if self._authorized():
+                self._send_json(200, {"workers": registry.snapshot()})
+
+        def do_POST(self) -> None:
+            if not self._authorized():
+                return
+            path = urllib.parse.urlparse(self.path).path
+            payload = self._read_json()
+            worker_id = payload.get("workerId") if payload else None
+            if not isinstance(worker_id, str) or not worker_id:
+                self._send_json(400, {"error": "workerId is required."})
+                return
+
+            if path == "/api/workers/register":
+                try:
+                    capacity = int(payload.get("capacity") or 1)
+                except (TypeError, ValueError):
+                    capacity = 1
+                registry.register(worker_id, capacity, str(payload.get("host") or self.client_address[0]))
+                self._send_json(200, {"ok": True, "pollSeconds": WORKER_POLL_WAIT_SECONDS})
+            elif path == "/api/workers/poll":
+                try:
+                    free = int(payload.get("free") or 0)
+                    wait = float(payload.get("wait") or 0)
+                except (TypeError, ValueError):
+                    free, wait = 0, 0.0
+                response = registry.poll(worker_id, free, wait)
+                if response is None:
+                    self._send_json(404, {"error": "Unknown worker; register again."})
+                else:
+                    self._send_json(200, response)
+            elif path == "/api/workers/events":
+                lines = payload.get("lines")
+                lines = [str(line) for line in lines] if isinstance(lines, list) else []
+                if registry.push_events(worker_id, str(payload.get("assignmentId")), lines):
+                    self._send_json(200, {"ok": True})
+                else:
+                    self._send_json(409, {"error": "Assignment is no longer active."})
+            elif path == "/api/workers/result":
+                result = payload.get("result")
+                if not isinstance(result, dict):
+                    self._send_json(400, {"error": "result must be an object."})
+                elif registry.complete(worker_id, str(payload.get("assignmentId")), result):
+                    self._send_json(200, {"ok": True})
+                else:
+                    self._send_json(409, {"error": "Assignment is no longer active."})
+            else:
+                self._send_json(404, {"error": "Unknown endpoint."})
+
+    try:
+        server = _DashboardServer((host, port), _Handler)
+    except OSError as exc:  # pragma: no cover
+        raise RuntimeError(f"failed to bind worker registry port {port}: {exc}") from exc
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, server.server_address[1]
+
+
+def post_json(url: str, payload: Dict[str, object], token: Optional[str] = None, timeout: float = 30.0) -> Tuple[int, Dict[str, object]]:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    if token:
+        request.add_header(_WORKER_TOKEN_HEADER, token)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status, body = response.status, response.read()
+    except urllib.error.HTTPError as exc:
+        status, body = exc.code, exc.read()
+    try:
+        parsed = json.loads(body.decode("utf-8", errors="replace")) if body else {}
+    except json.JSONDecodeError:
+        parsed = {}
+    return status, parsed if isinstance(parsed, dict) else {}
+
+
 def run_web_prompt_mode(
     run_id: str,
     web_port: int = DEFAULT_WEB_PORT,
@@ -659,6 +2425,21 @@ def run_web_prompt_mode(
     bypass_approvals_and_sandbox: bool = False,
     model: Optional[str] = None,
     model_provider: Optional[str] = None,
+    fail_fast: bool = False,
+    agent_timeout: Optional[float] = None,
+    agent_idle_timeout: Optional[float] = None,
+    sparse_worktrees: bool = False,
+    sparse_always: Optional[List[str]] = None,
+    admission: Optional[AdmissionController] = None,
+    workers: Optional[WorkerRegistry] = None,
+    wait_for_workers: int = 0,
+    token_budget: Optional[int] = None,
+    agent_token_budget: Optional[int] = None,
+    planner_model: Optional[str] = None,
+    worker_model: Optional[str] = None,
+    escalation_model: Optional[str] = None,
+    model_rules: Optional[List[ModelRule]] = None,
+    planner_schema: str = _DEFAULT_PLANNER_SCHEMA,
 ) -> int:
     coord_run = COORD_BASE / run_id
     state_file = coord_run / "live-state.json"
@@ -698,6 +2479,21 @@ def run_web_prompt_mode(
                 bypass_approvals_and_sandbox=bypass_approvals_and_sandbox,
                 model=model,
                 model_provider=model_provider,
+                fail_fast=fail_fast,
+                agent_timeout=agent_timeout,
+                agent_idle_timeout=agent_idle_timeout,
+                sparse_worktrees=sparse_worktrees,
+                sparse_always=sparse_always,
+                admission=admission,
+                workers=workers,
+                wait_for_workers=wait_for_workers,
+                token_budget=token_budget,
+                agent_token_budget=agent_token_budget,
+                planner_model=planner_model,
+                worker_model=worker_model,
+                escalation_model=escalation_model,
+                model_rules=model_rules,
+                planner_schema=planner_schema,
             )
         except Exception as exc:  # pragma: no cover
             write_state_snapshot(
@@ -822,23 +2618,138 @@ def can_write_workspace(path: Path) -> Optional[str]:
         return f"Workspace write probe failed: {exc}"
 
 
+# Outside any bracket only openers matter; inside, structure and strings; inside a string, its end.
+_JSON_OPEN_RE = re.compile(r"[{\[]")
+_JSON_TOKEN_RE = re.compile(r'[{}\[\]"]')
+_JSON_STRING_END_RE = re.compile(r'["\\\n]')
+# What may follow an opening bracket in real JSON; `{ see` or `[note]` in prose is not a candidate.
+_JSON_OBJECT_START_RE = re.compile(r'\s*["}]')
+_JSON_ARRAY_START_RE = re.compile(r'\s*[\[\]{"\-0-9tfn]')
+JSON_RESCAN_LIMIT = 4
+_PLAN_LIST_KEYS = ("subtasks", "agents", "tasks", "steps", "items", "plan")
+_PLAN_ITEM_KEYS = frozenset(("name", "scope", "objective"))
+
+
+def balanced_json_spans(text: str, lo: int = 0, hi: Optional[int] = None) -> List[Tuple[int, int, int]]:
+    """Balanced `{...}`/`[...]` spans of text[lo:hi] as (start, end, parent index or -1), ordered by start.
+
+    One forward pass that jumps between the characters that matter: openers in
+    prose, brackets and quotes inside a span, and the closing quote, backslash or
+    newline inside a string (JSON strings cannot hold a raw newline, so one ends a
+    stray string). A mismatched closer drops the open spans. When stray quotes
+    leave a span unclosed, the text after it is rescanned, at most
+    JSON_RESCAN_LIMIT times.
+    """
+    closed = set()
+    offset = lo
+    hi = len(text) if hi is None else hi
+    for _ in range(JSON_RESCAN_LIMIT + 1):
+        stack: List[Tuple[int, str]] = []
+        in_string = False
+        pos = offset
+        while True:
+            if in_string:
+                match = _JSON_STRING_END_RE.search(text, pos, hi)
+                if not match:
+                    break
+                pos = match.end()
+                if match.group() == "\\":
+                    pos += 1
+                else:
+                    in_string = False
+                continue
+            match = (_JSON_TOKEN_RE if stack else _JSON_OPEN_RE).search(text, pos, hi)
+            if not match:
+                break
+            at = match.start()
+            pos = at + 1
+            ch = match.group()
+            if ch == '"':
+                in_string = True
+            elif ch == "{" or ch == "[":
+                start_re = _JSON_OBJECT_START_RE if ch == "{" else _JSON_ARRAY_START_RE
+                if start_re.match(text, pos, hi):
+                    stack.append((at, "}" if ch == "{" else "]"))
+            elif stack[-1][1] == ch:
+                closed.add((stack.pop()[0], pos))
+            else:
+                stack.clear()
+        if not stack:
+            break
+        offset = stack[0][0] + 1
+    spans: List[Tuple[int, int, int]] = []
+    open_spans: List[int] = []
+    for start, end in sorted(closed):
+        while open_spans and spans[open_spans[-1]][1] <= start:
+            open_spans.pop()
+        spans.append((start, end, open_spans[-1] if open_spans else -1))
+        open_spans.append(len(spans) - 1)
+    return spans
+
+
+def plan_candidate_score(value: object) -> Tuple[int, int]:
+    """How well a decoded value matches the planner schema: (shape tier, complete subtasks)."""
+
+    def complete(items: object) -> int:
+        if not isinstance(items, list):
+            return 0
+        return sum(1 for item in items if isinstance(item, dict) and _PLAN_ITEM_KEYS <= item.keys())
+
+    if isinstance(value, dict):
+        for key in _PLAN_LIST_KEYS:
+            if isinstance(value.get(key), list):
+                count = complete(value[key])
+                return (3 if count else 2), count
+        if _PLAN_ITEM_KEYS <= value.keys():
+            return 1, 1
+        return 0, 0
+    count = complete(value)
+    return (2 if count else 0), count
+
+
 def parse_embedded_json(text: str) -> Optional[object]:
-    s = re.sub(r"```.*?```", "", text, flags=re.DOTALL)
+    """Best planner-shaped JSON object or array embedded in free text, found in linear time.
+
+    Only outermost balanced spans are decoded. When a span does not decode, its
+    children are tried and the text after its opening bracket is rescanned (at
+    most JSON_RESCAN_LIMIT times) in case stray quotes hid a span. Candidates are ranked by
+    plan_candidate_score; on a tie the later span wins, since planners echo examples and drafts
+    before their final answer.
+    """
     decoder = json.JSONDecoder()
-    for text_block in (s, text):
-        for prefix in ("{", "["):
-            idx = text_block.find(prefix)
-            while 0 <= idx < len(text_block):
-                try:
-                    value, _ = decoder.raw_decode(text_block[idx:])
-                    if isinstance(value, (dict, list)):
-                        return value
-                except json.JSONDecodeError:
-                    pass
-                idx = text_block.find(prefix, idx + 1)
-                if idx == -1:
-                    break
-    return None
+    best: Optional[object] = None
+    best_rank: Tuple[Tuple[int, int], int] = ((-1, -1), -1)
+    tried = set()
+    regions = [(0, len(text))]
+    rescans = 0
+    while regions:
+        lo, hi = regions.pop()
+        spans = balanced_json_spans(text, lo, hi)
+        children: Dict[int, List[int]] = {}
+        for index, (_, _, parent) in enumerate(spans):
+            children.setdefault(parent, []).append(index)
+        pending = list(reversed(children.get(-1, [])))
+        while pending:
+            index = pending.pop()
+            start, end, _ = spans[index]
+            if start in tried:
+                continue
+            tried.add(start)
+            try:
+                # Decode the span on its own: a decode error counts lines up to its position,
+                # which against the whole text would make every failure O(len(text)).
+                value, _ = decoder.raw_decode(text[start:end])
+            except json.JSONDecodeError:
+                pending.extend(reversed(children.get(index, [])))
+                # Only a quote can have thrown the scan off; a span without one needs no rescan.
+                if rescans < JSON_RESCAN_LIMIT and text.find('"', start, end) != -1:
+                    rescans += 1
+                    regions.append((start + 1, hi))
+                continue
+            rank = (plan_candidate_score(value), start)
+            if rank > best_rank:
+                best, best_rank = value, rank
+    return best
 
 
 def append_log(state: AgentState, line: str, lock: threading.Lock, state_file_run_id: Optional[str] = None) -> None:
@@ -850,10 +2761,33 @@ def append_log(state: AgentState, line: str, lock: threading.Lock, state_file_ru
                 state.log.pop(0)
         if state_file_run_id:
             state.started_at = state.started_at or now_iso()
-            write_status(state, state_file_run_id)
+    if state_file_run_id:
+        write_status(state, state_file_run_id)
+    else:
+        publish_agent_view(state)
+
+
+def publish_agent_view(state: AgentState) -> None:
+    with state.lock:
+        state.view = build_agent_view(state)
 
 
 def write_status(state: AgentState, run_id: str) -> None:
+    """Publish the agent's view and write status.json; must not be called while holding state.lock."""
+    with state.lock:
+        state.status_seq += 1
+        seq = state.status_seq
+        payload = status_payload(state, run_id)
+        state.view = build_agent_view(state)
+    with state.io_lock:
+        # Racing writers of one agent: whoever got the newer payload decides what is on disk.
+        if seq <= state.written_seq:
+            return
+        dump_json(state.status_path, payload)
+        state.written_seq = seq
+
+
+def status_payload(state: AgentState, run_id: str) -> Dict[str, object]:
     payload = {
         "agent": state.name,
         "runId": run_id,
@@ -864,11 +2798,30 @@ def write_status(state: AgentState, run_id: str) -> None:
         "finishedAt": state.finished_at,
         "durationMs": state.duration_ms,
         "exitCode": state.exit_code,
+        "attempts": state.attempts,
+        "usage": state.usage.to_dict(),
         "updatedAt": now_iso(),
     }
     if state.blocker_reason:
         payload["blockerReason"] = state.blocker_reason
-    dump_json(state.status_path, payload)
+    if state.queued_reason:
+        payload["queuedReason"] = state.queued_reason
+    if state.worker:
+        payload["worker"] = state.worker
+    if state.model:
+        payload["model"] = state.model
+    thread_usage = {key: usage.to_dict() for key, usage in list(state.thread_usage.items()) if key}
+    if thread_usage:
+        payload["threadUsage"] = thread_usage
+    return payload
+
+
+def load_thread_usage(status: Dict[str, object]) -> Dict[str, TokenUsage]:
+    """Per-thread running totals saved in a `status.json` (`threadUsage`)."""
+    saved = status.get("threadUsage")
+    if not isinstance(saved, dict):
+        return {}
+    return {str(key): TokenUsage.from_dict(value) for key, value in saved.items() if key}
 
 
 def run_codex_stream(
@@ -881,8 +2834,19 @@ def run_codex_stream(
     bypass_approvals_and_sandbox: bool = False,
     model: Optional[str] = None,
     model_provider: Optional[str] = None,
+    control: Optional[RunControl] = None,
+    control_key: Optional[str] = None,
+    budget: Optional[AgentBudget] = None,
+    resume_thread_id: Optional[str] = None,
+    add_dirs: Optional[List[Path]] = None,
+    on_usage: Optional[Callable[[TokenUsage], Optional[str]]] = None,
+    output_schema: Optional[Path] = None,
+    on_thread: Optional[Callable[[str], None]] = None,
+    thread_usage: Optional[Dict[str, TokenUsage]] = None,
 ) -> CodexRunResult:
     sandbox_mode = normalize_sandbox_mode(sandbox_mode)
+    # codex writes the last message itself, so its directory must exist on disk whatever the artifact store.
+    last_message_path.parent.mkdir(parents=True, exist_ok=True)
     if bypass_approvals_and_sandbox:
         cmd = codex_cmd + ["--dangerously-bypass-approvals-and-sandbox"]
     else:
@@ -898,35 +2862,297 @@ def run_codex_stream(
         "--skip-git-repo-check",
         "--output-last-message",
         str(last_message_path),
-        prompt,
     ])
+    for extra_dir in add_dirs or []:
+        cmd.extend(["--add-dir", str(extra_dir)])
+    # An exec option, so it has to come before the `resume` subcommand.
+    if output_schema:
+        cmd.extend(["--output-schema", str(output_schema)])
+    if resume_thread_id:
+        cmd.extend(["resume", resume_thread_id])
+    cmd.append(prompt)
     proc = subprocess.Popen(
         cmd,
         cwd=str(workspace),
         text=False,
         stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
+        stderr=subprocess.PIPE,
         env=os.environ.copy(),
+        # Own process group so cancellation can take down codex and any
+        # commands it spawned in one signal.
+        start_new_session=os.name != "nt",
+        creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == "nt" else 0,
     )
     thread_id = None
     last_message = ""
     error: Optional[str] = None
+    control_key = control_key or str(proc.pid)
+    if control and not control.register(control_key, proc):
+        terminate_process_group(proc)
     if not proc.stdout:
+        if control:
+            control.unregister(control_key)
         return CodexRunResult(1, None, "", "No stdout stream")
 
-    for raw in proc.stdout:
-        if isinstance(raw, bytes):
-            raw = raw.decode("utf-8", errors="replace")
+    watchdog = _StreamWatchdog(proc, budget or AgentBudget())
+    # Codex writes its own artifacts next to the last message, so stderr and spills go there too.
+    log_dir = last_message_path.parent
+    stats = StreamStats()
+    stderr_tail = bytearray()
+    stderr_thread: Optional[threading.Thread] = None
+    if proc.stderr:
+        stderr_thread = threading.Thread(
+            target=drain_stderr,
+            # Stderr noise is not progress: only codex events reset the idle timer.
+            args=(proc.stderr, log_dir / STREAM_STDERR_LOG, proc.pid, stats, stderr_tail),
+            daemon=True,
+        )
+        stderr_thread.start()
+    reader = CodexEventReader(proc.stdout, stats, log_dir, max_event_chars())
+
+    def handle_line(raw: str) -> None:
+        watchdog.touch()
         if on_line:
             on_line(raw)
-        line = raw.strip("\n")
+
+    usage = TokenUsage()
+    budget_stop: List[str] = []
+
+    def handle_usage(turn: TokenUsage) -> None:
+        usage.add(turn)
+        reason = on_usage(turn) if on_usage else None
+        if reason and not budget_stop:
+            budget_stop.append(reason)
+            threading.Thread(target=terminate_process_group, args=(proc,), daemon=True).start()
+
+    watchdog.start()
+    try:
+        exit_code, thread_id, last_message, error = _consume_codex_events(
+            proc, reader, handle_line, handle_usage, on_thread, thread_usage
+        )
+    finally:
+        watchdog.stop()
+        if control:
+            control.unregister(control_key)
+        if stderr_thread:
+            # A grandchild that inherited stderr can hold the pipe open after codex exits.
+            stderr_thread.join(AGENT_TERMINATE_GRACE_SECONDS)
+
+    if budget_stop:
+        error = budget_stop[0]
+    if watchdog.reason:
+        error = watchdog.reason
+
+    if not last_message and last_message_path.exists():
+        last_message = last_message_path.read_text(encoding="utf-8", errors="ignore")
+
+    return CodexRunResult(
+        exit_code=exit_code,
+        thread_id=thread_id,
+        last_message=last_message.strip(),
+        error=error,
+        timed_out=watchdog.reason is not None,
+        usage=usage,
+        stream=stats,
+        stderr_tail=bytes(stderr_tail).decode("utf-8", errors="replace"),
+    )
+
+
+def max_event_chars() -> int:
+    raw = os.environ.get(_MAX_EVENT_CHARS_ENV, "").strip()
+    try:
+        value = int(raw) if raw else STREAM_MAX_EVENT_CHARS
+    except ValueError:
+        value = STREAM_MAX_EVENT_CHARS
+    return value if value > 0 else STREAM_MAX_EVENT_CHARS
+
+
+class CodexEventReader:
+    """Splits codex `--json` stdout into lines, reading large chunks through an incremental UTF-8 decoder.
+
+    A line longer than `max_chars` is never held in memory: it is streamed to a spill file in
+    `spill_dir` (up to STREAM_SPILL_LIMIT_CHARS per process) and yielded as a short note instead.
+    """
+
+    def __init__(self, stream: BinaryIO, stats: StreamStats, spill_dir: Path, max_chars: int = STREAM_MAX_EVENT_CHARS) -> None:
+        self.stream = stream
+        self.stats = stats
+        self.spill_dir = spill_dir
+        self.max_chars = max_chars
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        # Set while the current line is oversize: its length so far, and where it is going.
+        self._oversize_chars: Optional[int] = None
+        self._spill_path: Optional[Path] = None
+        self._spill = None
+        self._truncated = False
+
+    def __iter__(self) -> Iterator[Tuple[str, bool]]:
+        """Yields `(line, oversize)`; an oversize line is the note, not the event."""
+        # read1 returns whatever the pipe has instead of waiting for a full chunk.
+        read = getattr(self.stream, "read1", self.stream.read)
+        while True:
+            chunk = read(STREAM_CHUNK_BYTES)
+            self.stats.stdout_bytes += len(chunk)
+            text = self._decoder.decode(chunk, final=not chunk)
+            start = 0
+            while True:
+                end = text.find("\n", start)
+                if end == -1:
+                    break
+                item = self._finish(text[start:end])
+                start = end + 1
+                if item:
+                    yield item
+            if start < len(text):
+                self._extend(text[start:])
+            if not chunk:
+                if self._pending or self._oversize_chars is not None:
+                    item = self._finish("")
+                    if item:
+                        yield item
+                return
+
+    def _extend(self, piece: str) -> None:
+        if self._oversize_chars is not None:
+            self._write_oversize(piece)
+            return
+        self._pending.append(piece)
+        self._pending_chars += len(piece)
+        if self._pending_chars > self.max_chars:
+            self._start_oversize()
+
+    def _finish(self, piece: str) -> Optional[Tuple[str, bool]]:
+        if self._oversize_chars is None and self._pending_chars + len(piece) > self.max_chars:
+            self._pending.append(piece)
+            self._start_oversize()
+            piece = ""
+        if self._oversize_chars is not None:
+            self._write_oversize(piece)
+            return self._end_oversize()
+        if self._pending:
+            self._pending.append(piece)
+            piece = "".join(self._pending)
+            self._pending = []
+            self._pending_chars = 0
+        line = piece.rstrip("\r")
+        return (line, False) if line.strip() else None
+
+    def _start_oversize(self) -> None:
+        self.stats.oversize += 1
+        self._oversize_chars = 0
+        self._truncated = False
+        if self.stats.spilled_chars < STREAM_SPILL_LIMIT_CHARS:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            self._spill_path = self.spill_dir / f"oversize-event-{int(time.time() * 1000)}-{self.stats.oversize}.json"
+            self._spill = self._spill_path.open("w", encoding="utf-8", newline="")
+        else:
+            self._truncated = True
+        pending = "".join(self._pending)
+        self._pending = []
+        self._pending_chars = 0
+        self._write_oversize(pending)
+
+    def _write_oversize(self, piece: str) -> None:
+        self._oversize_chars += len(piece)
+        if not self._spill:
+            return
+        room = STREAM_SPILL_LIMIT_CHARS - self.stats.spilled_chars
+        if len(piece) > room:
+            piece = piece[:room]
+            self._truncated = True
+        self._spill.write(piece)
+        self.stats.spilled_chars += len(piece)
+        if self._truncated:
+            self._spill.close()
+            self._spill = None
+
+    def _end_oversize(self) -> Tuple[str, bool]:
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+        size = self._oversize_chars
+        if self._truncated:
+            self.stats.dropped += 1
+            kept = f", first part kept in {self._spill_path}" if self._spill_path else ""
+            note = f"[codex-multi] dropped oversize event ({size} chars): spill limit reached{kept}"
+        else:
+            note = f"[codex-multi] oversize event ({size} chars) spilled to {self._spill_path}"
+        self._oversize_chars = None
+        self._spill_path = None
+        self._truncated = False
+        return note, True
+
+
+def drain_stderr(
+    stream: BinaryIO,
+    log_path: Path,
+    pid: int,
+    stats: StreamStats,
+    tail: bytearray,
+) -> None:
+    """Copies codex stderr into `log_path` chunk by chunk, keeping the last few KB in `tail`."""
+    read = getattr(stream, "read1", stream.read)
+    handle = None
+    try:
+        while True:
+            chunk = read(STREAM_CHUNK_BYTES)
+            if not chunk:
+                return
+            stats.stderr_bytes += len(chunk)
+            tail.extend(chunk)
+            del tail[:-STREAM_STDERR_TAIL_BYTES]
+            if handle is None:
+                log_path.parent.mkdir(parents=True, exist_ok=True)
+                handle = log_path.open("ab")
+                handle.write(f"--- {now_iso()} codex pid {pid} ---\n".encode("utf-8"))
+            handle.write(chunk)
+            handle.flush()
+    except (OSError, ValueError):
+        return
+    finally:
+        if handle:
+            handle.close()
+
+
+def _consume_codex_events(
+    proc: subprocess.Popen,
+    reader: CodexEventReader,
+    on_line: Callable[[str], None],
+    on_usage: Optional[Callable[[TokenUsage], None]] = None,
+    on_thread: Optional[Callable[[str], None]] = None,
+    thread_usage: Optional[Dict[str, TokenUsage]] = None,
+) -> Tuple[int, Optional[str], str, Optional[str]]:
+    """Read codex's JSONL events; `on_usage` gets the tokens of each turn.
+
+    `turn.completed` carries the session's running total, and `codex exec resume` continues
+    that total from the saved session. `thread_usage` keeps the last total per thread so only
+    the difference is reported; pass the same dict to every run of the same thread.
+    """
+    if thread_usage is None:
+        thread_usage = {}
+    thread_id = None
+    last_message = ""
+    error: Optional[str] = None
+    for line, oversize in reader:
+        on_line(line)
+        if oversize:
+            continue
         try:
             event = json.loads(line)
         except json.JSONDecodeError:
+            reader.stats.malformed += 1
             continue
+        if not isinstance(event, dict):
+            reader.stats.malformed += 1
+            continue
+        reader.stats.events += 1
         event_type = event.get("type")
         if event_type == "thread.started":
             thread_id = event.get("thread_id")
+            if on_thread and thread_id:
+                on_thread(thread_id)
         elif event_type == "item.completed":
             item = event.get("item", {})
             details = item.get("details", {})
@@ -934,6 +3160,13 @@ def run_codex_stream(
                 msg = details.get("text", "")
                 if msg:
                     last_message = msg
+        elif event_type == "turn.completed":
+            total = TokenUsage.from_event(event.get("usage"))
+            key = thread_id or ""
+            turn = total.since(thread_usage.get(key, TokenUsage()))
+            thread_usage[key] = total
+            if on_usage:
+                on_usage(turn)
         elif event_type == "turn.failed":
             error = event.get("error", {}).get("message") if isinstance(event.get("error"), dict) else str(event)
         elif event_type == "error":
@@ -941,33 +3174,100 @@ def run_codex_stream(
             if isinstance(err, str):
                 error = err
 
-    exit_code = proc.wait()
+    return proc.wait(), thread_id, last_message, error
+
+
+@functools.lru_cache(maxsize=None)
+def git_status_fast_config() -> Tuple[str, ...]:
+    """`-c` overrides that make `git status` cheaper where the local git supports them."""
+    args = ["-c", "core.untrackedCache=true"]
+    version = run_simple(["git", "version"], cwd=PROJECT_ROOT).stdout
+    m = re.search(r"(\d+)\.(\d+)", version)
+    # The built-in fsmonitor daemon exists on macOS and Windows only (git >= 2.37).
+    if m and (int(m.group(1)), int(m.group(2))) >= (2, 37) and sys.platform in ("darwin", "win32"):
+        args.extend(["-c", "core.fsmonitor=true"])
+    return tuple(args)
+
+
+def parse_porcelain_v2(output: str) -> List[Tuple[str, str]]:
+    """(kind, path) entries from `git status --porcelain=v2 -z`; kind is one of 1, 2, u, ?, !."""
+    entries: List[Tuple[str, str]] = []
+    records = output.split("\0")
+    i = 0
+    while i < len(records):
+        record = records[i]
+        i += 1
+        if not record:
+            continue
+        kind = record[0]
+        if kind == "1":
+            parts = record.split(" ", 8)
+        elif kind == "2":
+            parts = record.split(" ", 9)
+            i += 1  # the rename/copy source path is a separate NUL-terminated field
+        elif kind == "u":
+            parts = record.split(" ", 10)
+        elif kind in "?!":
+            parts = [record[2:]]
+        else:
+            continue
+        if parts[-1]:
+            entries.append((kind, parts[-1]))
+    return entries
+
 
-    if not last_message and last_message_path.exists():
-        last_message = last_message_path.read_text(encoding="utf-8", errors="ignore")
+def git_status_entries(workspace: Path, pathspecs: List[str], untracked: str = "all") -> Optional[List[Tuple[str, str]]]:
+    cmd = ["git", *git_status_fast_config(), "status", "--porcelain=v2", "-z", f"--untracked-files={untracked}"]
+    if pathspecs:
+        cmd.extend(["--", *pathspecs])
+    status = run_simple(cmd, cwd=workspace)
+    if status.returncode != 0:
+        return None
+    return parse_porcelain_v2(status.stdout)
 
-    return CodexRunResult(
-        exit_code=exit_code,
-        thread_id=thread_id,
-        last_message=last_message.strip(),
-        error=error,
-    )
+
+def scope_pathspecs(scope: str, exclude: bool = False) -> List[str]:
+    canonical = canonical_scope(scope)
+    if not canonical:
+        return []
+    magic = "top,literal,exclude" if exclude else "top,literal"
+    return [f":({magic}){canonical}", f":({magic})codex-rs/{canonical}"]
 
 
-def collect_changed_files(workspace: Path) -> List[str]:
-    status = run_simple(["git", "status", "--short", "--untracked-files=all"], cwd=workspace)
-    if status.returncode != 0:
+def collect_changed_files(workspace: Path, scope: Optional[str] = None) -> List[str]:
+    entries = git_status_entries(workspace, scope_pathspecs(scope) if scope else [])
+    if entries is None:
+        return []
+    return sorted({path for kind, path in entries if kind != "!"})
+
+
+def collect_out_of_scope_changes(workspace: Path, scope: str, matcher: Optional[ScopeTrie] = None) -> List[str]:
+    """Cheap check for writes outside `scope`: untracked directories are not expanded unless needed."""
+    excludes = scope_pathspecs(scope, exclude=True)
+    if not excludes:
+        return []
+    matcher = matcher or ScopeTrie.from_scopes([scope])
+    entries = git_status_entries(workspace, excludes, untracked="normal")
+    if entries is None:
         return []
-    files = []
-    for line in status.stdout.splitlines():
-        if len(line) < 4:
+    outside: set = set()
+    for kind, path in entries:
+        if kind == "!" or matcher.contains(path):
             continue
-        path = line[3:].strip()
-        if " -> " in path:
-            path = path.split(" -> ", 1)[1]
-        if path:
-            files.append(path)
-    return sorted(set(files))
+        if kind == "?" and path.endswith("/") and matcher.overlaps(path.rstrip("/")):
+            # A collapsed untracked directory that is a parent of the scope; list it in full.
+            expanded = git_status_entries(workspace, [f":(top,literal){path}"]) or []
+            outside.update(p for k, p in expanded if k != "!" and not matcher.contains(p))
+            continue
+        outside.add(path)
+    return sorted(outside)
+
+
+def detect_agent_changes(workspace: Path, scope: str, matcher: ScopeTrie) -> Tuple[List[str], List[str]]:
+    """Changed files (in and out of scope) plus the out-of-scope subset, scanning only the scope in full."""
+    inside = collect_changed_files(workspace, scope)
+    outside = collect_out_of_scope_changes(workspace, scope, matcher)
+    return sorted(set(inside) | set(outside)), outside
 
 
 def collect_diff(workspace: Path) -> str:
@@ -975,17 +3275,9 @@ def collect_diff(workspace: Path) -> str:
     if not tracked:
         tracked = ""
 
-    status = run_simple(
-        ["git", "status", "--short", "--untracked-files=all"],
-        cwd=workspace,
-    ).stdout.splitlines()
-
     untracked_diffs = []
-    for line in status:
-        if not line.startswith("?? "):
-            continue
-        relpath = line[3:].strip()
-        if not relpath:
+    for kind, relpath in git_status_entries(workspace, []) or []:
+        if kind != "?":
             continue
         file_path = workspace / relpath
         if not file_path.exists() or not file_path.is_file():
@@ -1026,11 +3318,123 @@ def collect_diff(workspace: Path) -> str:
     return "\n".join(p for p in parts if p).rstrip() + ("\n" if (tracked or untracked_diffs) else "")
 
 
-def create_worktree(path: Path, base: str = "HEAD") -> None:
+def sparse_checkout_paths(
+    scope: str, always: Optional[List[str]] = None, index: Optional[TrackedPathIndex] = None
+) -> Optional[List[str]]:
+    """Cone-mode directories for a sparse agent worktree, or None when the scope needs a full checkout.
+
+    Cone mode only takes directories, and `sparse-checkout set` on a populated worktree rejects a
+    tracked file, so a file scope contributes its parent directory.
+    """
+    canonical = canonical_scope(scope)
+    if not canonical:
+        return None
+    if index is None:
+        index = tracked_path_index()
+    paths: List[str] = []
+    extras = DEFAULT_SPARSE_ALWAYS_PATHS if always is None else always
+    for candidate in (canonical, f"codex-rs/{canonical}", *extras):
+        path = normalize_scope(candidate)
+        if index is not None and path in index.files:
+            # Files at the repository root are always checked out in cone mode.
+            path = path.rpartition("/")[0]
+        if path and path not in paths:
+            paths.append(path)
+    return paths or None
+
+
+def create_worktree(path: Path, base: str = "HEAD", sparse_paths: Optional[List[str]] = None) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     if path.exists():
         shutil.rmtree(path)
-    run_simple(["git", "worktree", "add", "--detach", str(path), base], cwd=PROJECT_ROOT, check=True)
+        # A leftover worktree stays registered after its directory is gone, and `worktree add` refuses the path.
+        run_simple(["git", "worktree", "prune"], cwd=PROJECT_ROOT)
+    if not sparse_paths:
+        run_simple(["git", "worktree", "add", "--detach", str(path), base], cwd=PROJECT_ROOT, check=True)
+        return
+    run_simple(["git", "worktree", "add", "--detach", "--no-checkout", str(path), base], cwd=PROJECT_ROOT, check=True)
+    run_simple(["git", "-C", str(path), "sparse-checkout", "set", "--cone", *sparse_paths], cwd=PROJECT_ROOT, check=True)
+    run_simple(["git", "-C", str(path), "checkout", "--detach", base], cwd=PROJECT_ROOT, check=True)
+
+
+def is_worktree_root(path: Path) -> bool:
+    if not path.is_dir():
+        return False
+    top = run_simple(["git", "rev-parse", "--show-toplevel"], cwd=path).stdout.strip()
+    return bool(top) and Path(top).resolve() == path.resolve()
+
+
+def recycle_worktree(path: Path, base: str, sparse_paths: Optional[List[str]] = None) -> None:
+    """Clean an existing worktree and check out `base` in it; ignored build output survives."""
+    reset_worktree(path)
+    if sparse_paths:
+        # The previous agent may have widened its checkout.
+        run_simple(["git", "-C", str(path), "sparse-checkout", "set", "--cone", *sparse_paths], cwd=PROJECT_ROOT, check=True)
+    run_simple(["git", "-C", str(path), "checkout", "--detach", "--force", "--quiet", base], cwd=PROJECT_ROOT, check=True)
+
+
+class WorktreePool:
+    """Detached worktrees recycled across the tickets of a batch.
+
+    A released worktree is cleaned and checked out at the next ticket's base commit instead of
+    being added from scratch; ignored build output such as cargo's `target/` survives the reuse.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.lock = threading.Lock()
+        # `git worktree add` takes repository-wide locks, so slots are created one at a time.
+        self.create_lock = threading.Lock()
+        self.slots: List[Path] = []
+        self.free: Dict[Tuple[str, ...], List[Path]] = {}
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, base: str, sparse_paths: Optional[List[str]] = None) -> Path:
+        key = tuple(sparse_paths or ())
+        with self.lock:
+            free = self.free.get(key)
+            path = free.pop() if free else None
+            if path is None:
+                path = self.root / f"slot-{len(self.slots) + 1:03d}"
+                self.slots.append(path)
+        if not path.exists():
+            with self.create_lock:
+                create_worktree(path, base=base, sparse_paths=sparse_paths)
+            with self.lock:
+                self.created += 1
+            return path
+        recycle_worktree(path, base, sparse_paths)
+        with self.lock:
+            self.reused += 1
+        return path
+
+    def release(self, path: Path, sparse_paths: Optional[List[str]] = None) -> None:
+        with self.lock:
+            free = self.free.setdefault(tuple(sparse_paths or ()), [])
+            if path in self.slots and path not in free:
+                free.append(path)
+
+    def close(self) -> None:
+        with self.lock:
+            slots = list(self.slots)
+            self.slots.clear()
+            self.free.clear()
+        for path in slots:
+            if path.exists():
+                run_simple(["git", "worktree", "remove", "--force", str(path)], cwd=PROJECT_ROOT)
+        run_simple(["git", "worktree", "prune"], cwd=PROJECT_ROOT)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"slots": len(self.slots), "created": self.created, "reused": self.reused}
+
+
+def worktree_git_dir(workspace: Path) -> Optional[Path]:
+    proc = run_simple(["git", "rev-parse", "--absolute-git-dir"], cwd=workspace)
+    if proc.returncode != 0 or not proc.stdout.strip():
+        return None
+    return Path(proc.stdout.strip())
 
 
 def run_agent(
@@ -1044,6 +3448,11 @@ def run_agent(
     bypass_approvals_and_sandbox: bool = False,
     model: Optional[str] = None,
     model_provider: Optional[str] = None,
+    control: Optional[RunControl] = None,
+    merge_gate: Optional["MergeGate"] = None,
+    on_event: Optional[Callable[[str], None]] = None,
+    escalation_model: Optional[str] = None,
+    resume_thread_id: Optional[str] = None,
 ) -> None:
     last_message_path = state.coord_dir / "last-message.txt"
 
@@ -1051,7 +3460,8 @@ def run_agent(
         state.status = "RUNNING"
         state.started_at = now_iso()
         state.duration_ms = 0
-        write_status(state, run_id)
+        state.model = model
+    write_status(state, run_id)
 
     if task_mode == "advisory":
         prompt = (
@@ -1078,9 +3488,50 @@ def run_agent(
             scope=state.scope or ".",
             objective=state.objective,
         )
+        if state.sparse_paths:
+            prompt += (
+                "This worktree is a sparse checkout of: {paths}.\n"
+                "If you need to read files outside it, first run `git sparse-checkout add <directory>`.\n"
+            ).format(paths=", ".join(state.sparse_paths))
+
+    resume_prompt = (
+        "Your previous turn was interrupted (a transient connection error or an orchestrator restart).\n"
+        "Continue the same task from where you left off: {objective}\n"
+        "Check the current state of your scope ({scope}) first and do not redo completed work.\n"
+    ).format(objective=state.objective, scope=state.scope or ".")
+
+    def on_line(line: str) -> None:
+        append_log(state, line, lock, run_id)
+        if on_event:
+            on_event(line)
+
+    def on_usage(turn: TokenUsage) -> Optional[str]:
+        blocker = None
+        if control:
+            blocker = control.record_usage(state.usage, turn, state.name)
+        else:
+            state.usage.add(turn)
+        # Checkpoint the usage and thread totals too, so `resume` does not count them again.
+        write_status(state, run_id)
+        return blocker
+
+    def on_thread(thread_id: str) -> None:
+        # Checkpoint the thread right away so `resume` can continue it after a crash.
+        with lock:
+            state.thread_id = thread_id
+        write_status(state, run_id)
 
+    scope_matcher = ScopeTrie.from_scopes([state.scope])
+    # Sparse agents widen their checkout through the worktree's private git dir,
+    # which lives outside the workspace sandbox.
+    add_dirs: List[Path] = []
+    if state.sparse_paths:
+        git_dir = worktree_git_dir(state.workspace)
+        if git_dir:
+            add_dirs.append(git_dir)
     blocker: Optional[str] = None
     result: Optional[CodexRunResult] = None
+    changes_detected = False
     final_last_message = ""
     total_duration_ms = 0
     if require_file_changes:
@@ -1097,40 +3548,89 @@ def run_agent(
             append_log(state, f"workspace preflight failed: {workspace_probe}", lock, run_id)
 
     if not blocker:
-        for attempt in range(1, AGENT_RETRY_LIMIT + 1):
-            if attempt > 1:
+        attempt = 0
+        attempt_limit = AGENT_RETRY_LIMIT
+        current_model = model
+        escalating = False
+        while attempt < attempt_limit:
+            attempt += 1
+            if escalating:
+                escalating = False
+            elif attempt > 1:
+                delay = retry_backoff_seconds(attempt)
+                resume_note = f", resuming thread {resume_thread_id}" if resume_thread_id else ""
                 append_log(
                     state,
-                    f"retrying agent execution (attempt {attempt}/{AGENT_RETRY_LIMIT}) after {blocker}",
+                    f"retrying agent execution (attempt {attempt}/{attempt_limit}{resume_note}) "
+                    f"in {delay:.1f}s after {blocker}",
                     lock,
                     run_id,
                 )
-                time.sleep(AGENT_RETRY_DELAY_SECONDS * attempt)
+                if control:
+                    control.cancelled.wait(delay)
+                else:
+                    time.sleep(delay)
+            if control and control.cancelled.is_set():
+                break
 
+            changes_detected = False
             try:
                 started = time.time()
-                result = run_codex_stream(
-                    prompt=prompt,
-                    workspace=state.workspace,
-                    last_message_path=last_message_path,
-                    codex_cmd=codex_cmd,
-                    on_line=lambda line: append_log(state, line, lock, run_id),
-                    sandbox_mode=sandbox_mode,
-                    bypass_approvals_and_sandbox=bypass_approvals_and_sandbox,
-                    model=model,
-                    model_provider=model_provider,
-                )
+                state.attempts = attempt
+
+                def run_once(resume_id: Optional[str]) -> CodexRunResult:
+                    once = run_codex_stream(
+                        prompt=resume_prompt if resume_id else prompt,
+                        workspace=state.workspace,
+                        last_message_path=last_message_path,
+                        codex_cmd=codex_cmd,
+                        on_line=on_line,
+                        sandbox_mode=sandbox_mode,
+                        bypass_approvals_and_sandbox=bypass_approvals_and_sandbox,
+                        model=current_model,
+                        model_provider=model_provider,
+                        control=control,
+                        control_key=state.name,
+                        budget=control.agent_budget if control else None,
+                        resume_thread_id=resume_id,
+                        add_dirs=add_dirs,
+                        on_usage=on_usage,
+                        on_thread=on_thread,
+                        thread_usage=state.thread_usage,
+                    )
+                    with lock:
+                        state.stream.add(once.stream)
+                    if once.exit_code != 0 and once.stderr_tail.strip():
+                        append_log(state, f"codex stderr: {once.stderr_tail.strip().splitlines()[-1]}", lock, run_id)
+                    return once
+
+                result = run_once(resume_thread_id)
+                if (
+                    resume_thread_id
+                    and result.exit_code != 0
+                    and not result.timed_out
+                    and not is_transient_agent_error(result.error)
+                    and not (control and control.cancelled.is_set())
+                ):
+                    append_log(
+                        state,
+                        f"resume of thread {resume_thread_id} failed ({result.error or result.exit_code}); starting a fresh session",
+                        lock,
+                        run_id,
+                    )
+                    result = run_once(None)
+                resume_thread_id = result.thread_id or resume_thread_id
                 done_at = time.time()
                 total_duration_ms += int((done_at - started) * 1000)
                 final_last_message = result.last_message
-                state.changed_files = collect_changed_files(state.workspace)
+                state.changed_files, violations = detect_agent_changes(state.workspace, state.scope, scope_matcher)
+                changes_detected = True
                 blocker = result.error
                 if require_file_changes and not blocker and is_write_restricted(result.last_message):
                     blocker = "Platform write restriction detected from agent output."
                 if result.exit_code != 0:
                     blocker = blocker or "Agent exited with non-zero status."
                 else:
-                    violations = [f for f in state.changed_files if not in_scope(f, state.scope)]
                     if violations:
                         blocker = f"Scope violation: edited {', '.join(violations[:5])}"
                     elif require_file_changes and not state.changed_files:
@@ -1147,65 +3647,742 @@ def run_agent(
                     error=blocker,
                 )
 
-            if blocker and is_transient_agent_error(blocker) and attempt < AGENT_RETRY_LIMIT:
+            if blocker and is_transient_agent_error(blocker) and attempt < attempt_limit:
+                continue
+            if (
+                not state.escalated
+                and not (control and control.cancelled.is_set())
+                and should_escalate(blocker, escalation_model, current_model)
+            ):
+                append_log(
+                    state,
+                    f"escalating from model {current_model or 'default'} to {escalation_model} after {blocker}",
+                    lock,
+                    run_id,
+                )
+                record_model_escalation(state, current_model, escalation_model, blocker)
+                # The stronger model starts a fresh session from a clean worktree.
+                reset_worktree(state.workspace)
+                with lock:
+                    state.escalated = True
+                    state.model = escalation_model
+                write_status(state, run_id)
+                current_model = escalation_model
+                resume_thread_id = None
+                attempt_limit = attempt + AGENT_RETRY_LIMIT
+                escalating = True
                 continue
             break
 
+    if not changes_detected:
+        state.changed_files, _ = detect_agent_changes(state.workspace, state.scope, scope_matcher)
+
+    finish_agent(
+        state,
+        lock,
+        run_id,
+        blocker,
+        exit_code=result.exit_code if result else None,
+        thread_id=result.thread_id if result else None,
+        duration_ms=total_duration_ms,
+        last_message=final_last_message,
+        control=control,
+        merge_gate=merge_gate,
+    )
+
+
+def reset_worktree(workspace: Path) -> None:
+    run_simple(["git", "reset", "--hard", "--quiet"], cwd=workspace)
+    run_simple(["git", "clean", "-fd", "--quiet"], cwd=workspace)
+
+
+def record_model_escalation(state: AgentState, from_model: Optional[str], to_model: Optional[str], reason: str) -> None:
+    intent = load_json_or_none(state.intent_path) or {}
+    routing = intent.get("routing") if isinstance(intent.get("routing"), dict) else {}
+    routing["escalation"] = {"from": from_model, "to": to_model, "reason": reason, "at": now_iso()}
+    intent["routing"] = routing
+    dump_json(state.intent_path, intent)
+
+
+def finish_agent(
+    state: AgentState,
+    lock: threading.Lock,
+    run_id: str,
+    blocker: Optional[str],
+    exit_code: Optional[int],
+    thread_id: Optional[str],
+    duration_ms: int,
+    last_message: str,
+    control: Optional[RunControl] = None,
+    merge_gate: Optional["MergeGate"] = None,
+) -> None:
+    """Record an agent's final state and artifacts, apply fail-fast, and hand DONE work to the merge gate."""
+    cancelled = False
+    if control and control.cancelled.is_set() and (blocker or exit_code is None):
+        cancelled = True
+        blocker = f"Cancelled by {control.cancel_policy} policy after {control.cancel_reason}"
+    elif control and control.fail_fast and is_fatal_blocker(blocker):
+        if control.cancel(f"{state.name}: {blocker}"):
+            append_log(state, f"fail-fast: cancelling sibling agents after {blocker}", lock, run_id)
+
+    blocker_doc: Optional[Dict[str, object]] = None
     with lock:
         state.finished_at = now_iso()
-        state.exit_code = result.exit_code if result else 1
-        state.thread_id = result.thread_id if result else None
-        state.duration_ms = total_duration_ms
-        state.changed_files = collect_changed_files(state.workspace)
+        state.exit_code = exit_code if exit_code is not None else 1
+        state.thread_id = thread_id
+        state.duration_ms = duration_ms
         state.blocker_reason = blocker
-        state.last_message = final_last_message
+        state.last_message = last_message
         if blocker:
-            state.status = "BLOCKED"
-            dump_json(
-                state.blocker_path,
-                {
-                    "agent": state.name,
-                    "runId": run_id,
-                    "state": "BLOCKED",
-                    "scope": state.scope,
-                    "reason": blocker,
-                    "createdAt": now_iso(),
-                    "lastMessage": final_last_message,
-                },
-            )
-            dump_json(
-                state.impact_path,
-                {
-                    "agent": state.name,
-                    "runId": run_id,
-                    "state": state.status,
-                    "scope": state.scope,
-                    "changedFiles": state.changed_files,
-                    "durationMs": state.duration_ms,
-                    "error": blocker,
-                },
-            )
+            state.status = "CANCELLED" if cancelled else "BLOCKED"
+            blocker_doc = {
+                "agent": state.name,
+                "runId": run_id,
+                "state": state.status,
+                "scope": state.scope,
+                "reason": blocker,
+                "createdAt": now_iso(),
+                "lastMessage": last_message,
+                "lastEvents": list(state.log),
+            }
+            impact_doc = {
+                "agent": state.name,
+                "runId": run_id,
+                "state": state.status,
+                "scope": state.scope,
+                "changedFiles": list(state.changed_files),
+                "durationMs": state.duration_ms,
+                "usage": state.usage.to_dict(),
+                "stream": state.stream.to_dict(),
+                "model": state.model,
+                "escalated": state.escalated,
+                "error": blocker,
+            }
         else:
             state.status = "DONE"
-            dump_json(
-                state.impact_path,
-                {
-                    "agent": state.name,
-                    "runId": run_id,
-                    "state": state.status,
-                    "scope": state.scope,
-                    "changedFiles": state.changed_files,
-                    "durationMs": state.duration_ms,
-                    "exitCode": state.exit_code,
-                    "threadId": state.thread_id,
-                    "lastMessage": final_last_message,
-                    "finishedAt": state.finished_at,
-                },
-            )
-        write_status(state, run_id)
-
-
-def parse_plan(raw_task: str, raw_plan: Optional[object], task_mode: str = "code") -> List[AgentTask]:
+            impact_doc = {
+                "agent": state.name,
+                "runId": run_id,
+                "state": state.status,
+                "scope": state.scope,
+                "changedFiles": list(state.changed_files),
+                "durationMs": state.duration_ms,
+                "exitCode": state.exit_code,
+                "threadId": state.thread_id,
+                "usage": state.usage.to_dict(),
+                "stream": state.stream.to_dict(),
+                "model": state.model,
+                "escalated": state.escalated,
+                "lastMessage": last_message,
+                "advisoryCache": state.advisory_cache,
+                "finishedAt": state.finished_at,
+            }
+    # The documents were built under the lock; the disk writes do not hold up event ingestion.
+    if blocker_doc:
+        dump_json(state.blocker_path, blocker_doc)
+    dump_json(state.impact_path, impact_doc)
+    write_status(state, run_id)
+
+    if merge_gate and state.status == "DONE":
+        merge_state = merge_gate.submit(state)
+        append_log(state, f"merge gate: {merge_state}", lock)
+    state.finished.set()
+
+
+def restore_finished_agent(state: AgentState, base_commit: str) -> bool:
+    """Reload a DONE agent of an interrupted run when its impact report and worktree are still intact."""
+    status = load_json_or_none(state.status_path) or {}
+    impact = load_json_or_none(state.impact_path) or {}
+    if status.get("state") != "DONE" or impact.get("state") != "DONE" or not state.workspace.exists():
+        return False
+    head = run_simple(["git", "rev-parse", "HEAD"], cwd=state.workspace).stdout.strip()
+    if head != base_commit:
+        return False
+    changed, _ = detect_agent_changes(state.workspace, state.scope, ScopeTrie.from_scopes([state.scope]))
+    if sorted(impact.get("changedFiles") or []) != changed:
+        return False
+    state.status = "DONE"
+    state.changed_files = changed
+    state.thread_id = status.get("threadId")
+    state.thread_usage = load_thread_usage(status)
+    state.exit_code = impact.get("exitCode", 0)
+    state.duration_ms = int(impact.get("durationMs") or 0)
+    state.started_at = status.get("startedAt")
+    state.finished_at = impact.get("finishedAt") or status.get("finishedAt")
+    state.attempts = int(status.get("attempts") or 0)
+    state.model = impact.get("model")
+    state.escalated = bool(impact.get("escalated"))
+    state.last_message = str(impact.get("lastMessage") or "")
+    state.stream = StreamStats.from_dict(impact.get("stream"))
+    state.finished.set()
+    return True
+
+
+def advisory_cache_limits() -> Optional[Tuple[float, int]]:
+    """(TTL seconds, max entries) of the advisory result cache, or None when it is turned off."""
+    if os.environ.get(_ADVISORY_CACHE_ENV, "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+
+    def read(name: str, default: float) -> float:
+        raw = os.environ.get(name, "").strip()
+        try:
+            value = float(raw) if raw else default
+        except ValueError:
+            value = default
+        return value if value > 0 else default
+
+    ttl = read(_ADVISORY_CACHE_TTL_ENV, DEFAULT_ADVISORY_CACHE_TTL_SECONDS)
+    return ttl, int(read(_ADVISORY_CACHE_MAX_ENTRIES_ENV, DEFAULT_ADVISORY_CACHE_MAX_ENTRIES))
+
+
+def advisory_cache_key(objective: str, scope: str, head: str, model: Optional[str], provider: Optional[str]) -> str:
+    digest = hashlib.sha256()
+    # Whitespace-only differences in the objective still hit.
+    for part in (str(ADVISORY_CACHE_VERSION), " ".join(objective.split()), scope.strip(), head, model or "", provider or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def lookup_advisory_result(key: str, ttl_seconds: float) -> Optional[dict]:
+    path = ADVISORY_CACHE_DIR / f"{key}.json"
+    entry = load_json_or_none(path)
+    if not entry:
+        return None
+    try:
+        stored = datetime.fromisoformat(str(entry.get("storedAt"))).timestamp()
+    except ValueError:
+        stored = 0.0
+    if time.time() - stored > ttl_seconds:
+        artifact_store().delete(path)
+        return None
+    if not str(entry.get("lastMessage") or "").strip():
+        return None
+    return entry
+
+
+def prune_advisory_cache(ttl_seconds: float, max_entries: int) -> int:
+    """Drop expired entries, then the oldest ones past max_entries; returns how many were removed."""
+    store = artifact_store()
+    entries = sorted(
+        ((stored, path) for path, stored in store.list(ADVISORY_CACHE_DIR) if path.suffix == ".json"), reverse=True
+    )
+    cutoff = time.time() - ttl_seconds
+    removed = 0
+    for index, (stored, path) in enumerate(entries):
+        if index >= max_entries or stored < cutoff:
+            store.delete(path)
+            removed += 1
+    return removed
+
+
+def store_advisory_result(state: AgentState, run_id: str, limits: Tuple[float, int]) -> None:
+    """Save a freshly produced DONE advisory answer under the key computed at launch."""
+    info = state.advisory_cache
+    if not info or info.get("hit") or state.status != "DONE" or not state.last_message.strip():
+        return
+    dump_json(
+        ADVISORY_CACHE_DIR / f"{info['key']}.json",
+        {
+            "version": ADVISORY_CACHE_VERSION,
+            "key": info["key"],
+            "runId": run_id,
+            "agent": state.name,
+            "objective": state.objective,
+            "scope": state.scope,
+            "headCommit": info.get("headCommit"),
+            "model": state.model,
+            "threadId": state.thread_id,
+            "durationMs": state.duration_ms,
+            "usage": state.usage.to_dict(),
+            "lastMessage": state.last_message,
+            "storedAt": now_iso(),
+        },
+    )
+    prune_advisory_cache(*limits)
+
+
+def serve_cached_advisory(
+    state: AgentState,
+    entry: dict,
+    lock: threading.Lock,
+    run_id: str,
+    control: Optional[RunControl] = None,
+) -> None:
+    """Finish an advisory agent with guidance cached for the same objective, scope, commit and model."""
+    state.advisory_cache = dict(
+        state.advisory_cache or {},
+        hit=True,
+        sourceRunId=entry.get("runId"),
+        storedAt=entry.get("storedAt"),
+        savedMs=int(entry.get("durationMs") or 0),
+        savedTokens=TokenUsage.from_dict(entry.get("usage")).total,
+    )
+    append_log(state, f"advisory cache hit: guidance from run {entry.get('runId')}", lock, run_id)
+    finish_agent(
+        state,
+        lock,
+        run_id,
+        None,
+        exit_code=0,
+        thread_id=entry.get("threadId"),
+        duration_ms=0,
+        last_message=str(entry.get("lastMessage") or ""),
+        control=control,
+    )
+
+
+def run_agent_when_admitted(
+    state: AgentState,
+    lock: threading.Lock,
+    run_id: str,
+    control: Optional[RunControl],
+    run: Callable[[], None],
+    run_remote: Optional[Callable[[], Optional[bool]]] = None,
+) -> None:
+    """Keep the agent QUEUED (with a visible reason) until a remote worker or local admission takes it."""
+    admission = control.admission if control else None
+    workers = control.workers if control else None
+
+    def on_wait(reason: str) -> None:
+        with lock:
+            changed = state.queued_reason != reason
+            state.queued_reason = reason
+        if changed:
+            write_status(state, run_id)
+
+    if not workers or not run_remote:
+        if not admission or not admission.enabled:
+            run()
+            return
+        admitted = admission.acquire(cancelled=control.cancelled, on_wait=on_wait)
+        with lock:
+            state.queued_reason = None
+        try:
+            run()
+        finally:
+            if admitted:
+                admission.release()
+        return
+
+    # Idle remote capacity is used first; local admission takes the overflow.
+    dispatches = 0
+    while not control.cancelled.is_set():
+        if dispatches < REMOTE_DISPATCH_LIMIT:
+            outcome = run_remote()
+            if outcome:
+                return
+            if outcome is False:
+                dispatches += 1
+                continue
+        reason = admission.try_acquire() if admission and admission.enabled else None
+        if reason is None:
+            with lock:
+                state.queued_reason = None
+            try:
+                run()
+            finally:
+                if admission and admission.enabled:
+                    admission.release()
+            return
+        on_wait(f"{reason}; no idle remote worker")
+        control.cancelled.wait(ADMISSION_POLL_SECONDS)
+    run()
+
+
+def run_agent_after_dependencies(
+    state: AgentState,
+    dependencies: List[AgentState],
+    run_id: str,
+    control: RunControl,
+    launch: Callable[[], None],
+) -> None:
+    """Keep the agent QUEUED until every agent it depends on has finished; block it if one did not end DONE."""
+    for dependency in dependencies:
+        if not dependency.finished.is_set():
+            with state.lock:
+                state.queued_reason = f"waiting for {dependency.name}"
+            write_status(state, run_id)
+        while not dependency.finished.wait(AGENT_WATCHDOG_POLL_SECONDS):
+            if control.cancelled.is_set():
+                # The agent records the cancellation itself.
+                launch()
+                return
+        with dependency.lock:
+            dependency_status = dependency.status
+        if dependency_status != "DONE":
+            finish_agent(
+                state,
+                state.lock,
+                run_id,
+                f"Dependency {dependency.name} ended {dependency_status}",
+                exit_code=None,
+                thread_id=None,
+                duration_ms=0,
+                last_message="",
+                control=control,
+            )
+            return
+    if dependencies:
+        with state.lock:
+            state.queued_reason = None
+    launch()
+
+
+def apply_patch(workspace: Path, patch: str) -> Optional[str]:
+    """Apply a unified diff to a worktree; returns git's complaint on failure."""
+    proc = subprocess.run(
+        ["git", "apply", "--binary", "--whitespace=nowarn", "-"],
+        cwd=str(workspace),
+        input=patch,
+        text=True,
+        capture_output=True,
+    )
+    if proc.returncode != 0:
+        return (proc.stderr or proc.stdout).strip()[:400] or f"git apply exited {proc.returncode}"
+    return None
+
+
+def run_remote_agent(
+    state: AgentState,
+    lock: threading.Lock,
+    run_id: str,
+    control: RunControl,
+    payload: Dict[str, object],
+    merge_gate: Optional["MergeGate"] = None,
+) -> Optional[bool]:
+    """Run one agent on a remote worker and apply its patch locally.
+
+    Returns None when no worker had free capacity, False when the worker was lost
+    and the agent should be rescheduled, True once the agent reached a final state.
+    """
+    workers = control.workers
+
+    def on_events(lines: List[str]) -> None:
+        for line in lines:
+            append_log(state, line, lock, run_id)
+
+    assignment = workers.dispatch(payload, on_events) if workers else None
+    if not assignment:
+        return None
+
+    with lock:
+        state.status = "RUNNING"
+        state.worker = assignment.worker_id
+        state.queued_reason = None
+        state.started_at = now_iso()
+        state.model = payload.get("model") or None
+    write_status(state, run_id)
+    append_log(state, f"dispatched to remote worker {assignment.worker_id}", lock, run_id)
+
+    started = time.time()
+    cancel_deadline: Optional[float] = None
+    while not assignment.done.wait(AGENT_WATCHDOG_POLL_SECONDS):
+        workers.reap()
+        if control.cancelled.is_set():
+            if cancel_deadline is None:
+                workers.cancel(assignment)
+                cancel_deadline = time.monotonic() + WORKER_CANCEL_GRACE_SECONDS
+            elif time.monotonic() > cancel_deadline:
+                break
+    duration_ms = int((time.time() - started) * 1000)
+
+    result = assignment.result
+    if result is None and not control.cancelled.is_set():
+        append_log(state, f"{assignment.error or 'remote worker vanished'}; rescheduling agent", lock, run_id)
+        with lock:
+            state.status = "QUEUED"
+            state.worker = None
+        write_status(state, run_id)
+        return False
+
+    result = result or {}
+    blocker = result.get("blockerReason") or assignment.error
+    patch = str(result.get("patch") or "")
+    if patch and not blocker:
+        failure = apply_patch(state.workspace, patch)
+        if failure:
+            blocker = f"Patch from remote worker {assignment.worker_id} did not apply locally: {failure}"
+    state.changed_files, violations = detect_agent_changes(
+        state.workspace, state.scope, ScopeTrie.from_scopes([state.scope])
+    )
+    if violations and not blocker:
+        blocker = f"Scope violation: edited {', '.join(violations[:5])}"
+    escalation = result.get("escalation")
+    if isinstance(escalation, dict):
+        record_model_escalation(state, escalation.get("from"), escalation.get("to"), str(escalation.get("reason") or ""))
+    with lock:
+        state.attempts = int(result.get("attempts") or 1)
+        state.model = result.get("model") or state.model
+        state.escalated = bool(escalation)
+        state.stream.add(StreamStats.from_dict(result.get("stream")))
+    budget_blocker = control.record_usage(state.usage, TokenUsage.from_dict(result.get("usage")), state.name)
+    blocker = blocker or budget_blocker
+    exit_code = result.get("exitCode")
+    finish_agent(
+        state,
+        lock,
+        run_id,
+        blocker,
+        exit_code=exit_code if isinstance(exit_code, int) else None,
+        thread_id=result.get("threadId"),
+        duration_ms=int(result.get("durationMs") or duration_ms),
+        last_message=str(result.get("lastMessage") or ""),
+        control=control,
+        merge_gate=merge_gate,
+    )
+    return True
+
+
+class _EventForwarder:
+    """Batches an assignment's codex events and posts them to the orchestrator."""
+
+    def __init__(self, url: str, token: Optional[str], worker_id: str, assignment_id: str, on_withdrawn: Callable[[], None]) -> None:
+        self.url = url
+        self.token = token
+        self.worker_id = worker_id
+        self.assignment_id = assignment_id
+        self.on_withdrawn = on_withdrawn
+        self.pending: List[str] = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def add(self, line: str) -> None:
+        with self.lock:
+            self.pending.append(line.rstrip("\n"))
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self._flush()
+
+    def _run(self) -> None:
+        while not self.stopped.wait(WORKER_EVENT_FLUSH_SECONDS):
+            self._flush()
+
+    def _flush(self) -> None:
+        with self.lock:
+            lines, self.pending = self.pending, []
+        if not lines:
+            return
+        try:
+            status, _ = post_json(
+                f"{self.url}/api/workers/events",
+                {"workerId": self.worker_id, "assignmentId": self.assignment_id, "lines": lines},
+                self.token,
+            )
+        except (OSError, urllib.error.URLError):
+            return
+        if status == 409:
+            self.on_withdrawn()
+
+
+# `git worktree add` and `remove` are not safe to run concurrently in one repository, and every
+# worker in this process (`--capacity`, or several run_worker threads) shares the checkout.
+_WORKER_CHECKOUT_LOCK = threading.Lock()
+
+
+def execute_remote_assignment(
+    assignment: Dict[str, object],
+    url: str,
+    token: Optional[str],
+    worker_id: str,
+    codex_cmd: List[str],
+    control: RunControl,
+    allow_bypass: bool = False,
+) -> Dict[str, object]:
+    """Worker side: run one assigned agent in a private worktree and return its result with the patch."""
+    run_id = normalize_name(str(assignment.get("runId") or "remote"))
+    name = normalize_name(str(assignment.get("agent") or "agent"))
+    assignment_id = str(assignment.get("assignmentId"))
+    base = str(assignment.get("baseCommit") or "HEAD")
+    task_mode = "advisory" if assignment.get("taskMode") == "advisory" else "code"
+    workspace = WORKTREE_ROOT / "remote" / normalize_name(worker_id) / run_id / name
+    coord_dir = ARTIFACTS_ROOT / "workers" / normalize_name(worker_id) / run_id / name
+
+    def blocked(reason: str) -> Dict[str, object]:
+        return {"status": "BLOCKED", "blockerReason": reason, "exitCode": 1, "attempts": 0, "patch": ""}
+
+    if assignment.get("bypass") and not allow_bypass:
+        return blocked(f"worker {worker_id} does not allow --bypass-approvals-and-sandbox assignments")
+    sandbox_mode = normalize_sandbox_mode(str(assignment.get("sandboxMode") or _DEFAULT_AGENT_SANDBOX_MODE))
+    # Full access is as unsandboxed as bypass, so it needs the same opt-in from the worker.
+    if sandbox_mode == "danger-full-access" and not allow_bypass:
+        return blocked(f"worker {worker_id} does not allow danger-full-access assignments")
+    if run_simple(["git", "cat-file", "-e", f"{base}^{{commit}}"], cwd=PROJECT_ROOT).returncode != 0:
+        run_simple(["git", "fetch", "--quiet", "origin", base], cwd=PROJECT_ROOT)
+        if run_simple(["git", "cat-file", "-e", f"{base}^{{commit}}"], cwd=PROJECT_ROOT).returncode != 0:
+            return blocked(f"base commit {base} is not available on worker {worker_id}")
+
+    sparse_paths = assignment.get("sparsePaths")
+    sparse_paths = [str(p) for p in sparse_paths] if isinstance(sparse_paths, list) and sparse_paths else None
+    try:
+        with _WORKER_CHECKOUT_LOCK:
+            create_worktree(workspace, base=base, sparse_paths=sparse_paths)
+    except RuntimeError as exc:
+        return blocked(f"worker {worker_id} could not create a worktree: {str(exc).strip()[:240]}")
+
+    state = AgentState(
+        name=name,
+        scope=str(assignment.get("scope") or ""),
+        objective=str(assignment.get("objective") or ""),
+        workspace=workspace,
+        coord_dir=coord_dir,
+        status_path=coord_dir / "status.json",
+        intent_path=coord_dir / "intent.json",
+        impact_path=coord_dir / "impact-report.json",
+        blocker_path=coord_dir / "blocker.json",
+        sparse_paths=sparse_paths,
+        worker=worker_id,
+    )
+    dump_json(state.intent_path, dict(assignment, receivedAt=now_iso()))
+    forwarder = _EventForwarder(url, token, worker_id, assignment_id, lambda: control.cancel("assignment withdrawn by orchestrator"))
+    forwarder.start()
+    try:
+        run_agent(
+            state,
+            codex_cmd,
+            state.lock,
+            run_id,
+            task_mode=task_mode,
+            require_file_changes=bool(assignment.get("requireFileChanges", task_mode == "code")),
+            sandbox_mode=sandbox_mode,
+            bypass_approvals_and_sandbox=bool(assignment.get("bypass")),
+            model=assignment.get("model") or None,
+            model_provider=assignment.get("modelProvider") or None,
+            control=control,
+            on_event=forwarder.add,
+            escalation_model=assignment.get("escalationModel") or None,
+        )
+        patch = collect_diff(workspace) if state.changed_files else ""
+    finally:
+        forwarder.close()
+        with _WORKER_CHECKOUT_LOCK:
+            run_simple(["git", "worktree", "remove", "--force", str(workspace)], cwd=PROJECT_ROOT)
+    return {
+        "status": state.status,
+        "blockerReason": state.blocker_reason,
+        "exitCode": state.exit_code,
+        "threadId": state.thread_id,
+        "durationMs": state.duration_ms,
+        "attempts": state.attempts,
+        "lastMessage": state.last_message,
+        "changedFiles": state.changed_files,
+        "usage": state.usage.to_dict(),
+        "stream": state.stream.to_dict(),
+        "model": state.model,
+        "escalation": ((load_json_or_none(state.intent_path) or {}).get("routing") or {}).get("escalation"),
+        "patch": patch,
+    }
+
+
+def run_worker(
+    orchestrator_url: str,
+    capacity: int = 1,
+    worker_id: Optional[str] = None,
+    token: Optional[str] = None,
+    allow_bypass: bool = False,
+) -> int:
+    """Pull agent assignments from an orchestrator until interrupted."""
+    url = orchestrator_url.rstrip("/")
+    capacity = max(1, capacity)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    codex_cmd = find_codex_command()
+    active: Dict[str, RunControl] = {}
+    active_lock = threading.Lock()
+    registered = False
+    backoff = 1
+
+    def execute(assignment: Dict[str, object], control: RunControl) -> None:
+        assignment_id = str(assignment.get("assignmentId"))
+        print(f"[{worker_id}] running {assignment_id}")
+        try:
+            try:
+                result = execute_remote_assignment(
+                    assignment, url, token, worker_id, codex_cmd, control, allow_bypass
+                )
+            except Exception as exc:
+                result = {"status": "BLOCKED", "blockerReason": f"Internal worker failure: {exc}", "exitCode": 1, "patch": ""}
+            for attempt in range(1, AGENT_RETRY_LIMIT + 1):
+                try:
+                    post_json(
+                        f"{url}/api/workers/result",
+                        {"workerId": worker_id, "assignmentId": assignment_id, "result": result},
+                        token,
+                    )
+                    break
+                except (OSError, urllib.error.URLError):
+                    time.sleep(retry_backoff_seconds(attempt + 1))
+            print(f"[{worker_id}] finished {assignment_id}: {result.get('status')}")
+        finally:
+            with active_lock:
+                active.pop(assignment_id, None)
+
+    print(f"Worker {worker_id}: capacity {capacity}, orchestrator {url}")
+    try:
+        while True:
+            try:
+                if not registered:
+                    status, body = post_json(
+                        f"{url}/api/workers/register",
+                        {"workerId": worker_id, "capacity": capacity, "host": socket.gethostname()},
+                        token,
+                    )
+                    if status == 403:
+                        print("ERROR: orchestrator rejected the worker token.")
+                        return 1
+                    registered = status == 200
+                    if not registered:
+                        raise OSError(f"register returned HTTP {status}: {body.get('error')}")
+                    print(f"[{worker_id}] registered")
+                with active_lock:
+                    free = capacity - len(active)
+                status, body = post_json(
+                    f"{url}/api/workers/poll",
+                    {"workerId": worker_id, "free": free, "wait": WORKER_POLL_WAIT_SECONDS},
+                    token,
+                    timeout=WORKER_POLL_WAIT_SECONDS + 30.0,
+                )
+                if status == 404:
+                    registered = False
+                    continue
+                if status != 200:
+                    raise OSError(f"poll returned HTTP {status}: {body.get('error')}")
+                backoff = 1
+            except (OSError, urllib.error.URLError) as exc:
+                print(f"[{worker_id}] orchestrator unreachable ({exc}); retrying")
+                time.sleep(retry_backoff_seconds(backoff + 1))
+                backoff = min(backoff + 1, 5)
+                continue
+
+            for assignment_id in body.get("cancel") or []:
+                with active_lock:
+                    control = active.get(str(assignment_id))
+                if control:
+                    threading.Thread(target=control.cancel, args=("orchestrator cancelled the run",), daemon=True).start()
+            assignment = body.get("assignment")
+            if isinstance(assignment, dict):
+                budget = assignment.get("budget") if isinstance(assignment.get("budget"), dict) else {}
+                control = RunControl(
+                    agent_budget=AgentBudget(budget.get("wallSeconds"), budget.get("idleSeconds")),
+                    agent_token_budget=assignment.get("agentTokenBudget") or None,
+                )
+                with active_lock:
+                    active[str(assignment.get("assignmentId"))] = control
+                threading.Thread(target=execute, args=(assignment, control), daemon=True).start()
+    except KeyboardInterrupt:
+        with active_lock:
+            controls = list(active.values())
+        for control in controls:
+            control.cancel("worker interrupted")
+        return 130
+
+
+def parse_plan(raw_task: str, raw_plan: Optional[object], task_mode: str = "code") -> List[AgentTask]:
     if task_mode != "advisory":
         single_file_scope = detect_single_file_scope(raw_task)
         if single_file_scope:
@@ -1258,6 +4435,8 @@ def parse_plan(raw_task: str, raw_plan: Optional[object], task_mode: str = "code
 
     parsed: List[AgentTask] = []
     used = set()
+    # Planner name -> agent name, for `dependsOn`; a duplicated name refers to its first agent.
+    renamed: Dict[str, str] = {}
     for idx, item in enumerate(subtasks, start=1):
         if not isinstance(item, dict):
             continue
@@ -1268,6 +4447,7 @@ def parse_plan(raw_task: str, raw_plan: Optional[object], task_mode: str = "code
             name = f"{base}-{i}"
             i += 1
         used.add(name)
+        renamed.setdefault(base, name)
         scope = normalize_scope(str(item.get("scope") or item.get("fileScope") or ""))
         objective = str(
             item.get("objective")
@@ -1276,7 +4456,13 @@ def parse_plan(raw_task: str, raw_plan: Optional[object], task_mode: str = "code
             or item.get("description")
             or raw_task
         )
-        parsed.append(AgentTask(name=name, scope=scope, objective=objective))
+        depends = item.get("dependsOn") or item.get("depends_on") or []
+        depends_on = tuple(normalize_name(str(dep)) for dep in depends) if isinstance(depends, list) else ()
+        parsed.append(AgentTask(name=name, scope=scope, objective=objective, depends_on=depends_on))
+    parsed = [
+        AgentTask(item.name, item.scope, item.objective, tuple(renamed.get(dep, dep) for dep in item.depends_on))
+        for item in parsed
+    ]
 
     if not parsed:
         fallback_scope = "analysis" if task_mode == "advisory" else "codex-rs"
@@ -1287,11 +4473,38 @@ def parse_plan(raw_task: str, raw_plan: Optional[object], task_mode: str = "code
                 objective=raw_task,
             )
         ]
-    return parsed
+    return resolve_dependencies(parsed)
+
+
+def resolve_dependencies(tasks: List[AgentTask]) -> List[AgentTask]:
+    """Keep only dependencies on other agents of the plan, dropping any that would close a cycle."""
+    names = {item.name for item in tasks}
+    kept: Dict[str, Tuple[str, ...]] = {}
+
+    def reaches(start: str, target: str) -> bool:
+        stack, seen = [start], set()
+        while stack:
+            name = stack.pop()
+            if name == target:
+                return True
+            if name not in seen:
+                seen.add(name)
+                stack.extend(kept.get(name, ()))
+        return False
+
+    resolved: List[AgentTask] = []
+    for item in tasks:
+        depends_on: List[str] = []
+        for dep in item.depends_on:
+            if dep in names and dep != item.name and dep not in depends_on and not reaches(dep, item.name):
+                depends_on.append(dep)
+        kept[item.name] = tuple(depends_on)
+        resolved.append(AgentTask(item.name, item.scope, item.objective, kept[item.name]))
+    return resolved
 
 
 def normalize_disjoint_scopes(tasks: List[AgentTask], fallback_root: str = DEFAULT_SCOPE_ROOT) -> List[AgentTask]:
-    used: List[str] = []
+    used = ScopeTrie()
     normalized: List[AgentTask] = []
     has_many_agents = len(tasks) > 1
 
@@ -1302,11 +4515,14 @@ def normalize_disjoint_scopes(tasks: List[AgentTask], fallback_root: str = DEFAU
             base_scope = fallback_root if not has_many_agents else f"{fallback_root}/{name}"
 
         candidate = base_scope
-        if any(scopes_overlap(candidate, existing) for existing in used):
+        # A scope covering the fallback root would leave no `<root>/<name>` scope free for the others.
+        if has_many_agents and ScopeTrie.from_scopes([base_scope]).contains(fallback_root):
+            candidate = f"{fallback_root}/{name}"
+        if used.overlaps(candidate):
             candidate = f"{fallback_root}/{name}"
 
         suffix = 1
-        while any(scopes_overlap(candidate, existing) for existing in used):
+        while used.overlaps(candidate):
             candidate = f"{fallback_root}/{name}-{suffix}"
             suffix += 1
 
@@ -1315,13 +4531,305 @@ def normalize_disjoint_scopes(tasks: List[AgentTask], fallback_root: str = DEFAU
                 name=name,
                 scope=candidate,
                 objective=item.objective,
+                depends_on=item.depends_on,
             )
         )
-        used.append(candidate)
+        used.insert(candidate, name)
 
     return normalized
 
 
+def head_tree_hash() -> Optional[str]:
+    proc = run_simple(["git", "rev-parse", "HEAD^{tree}"], cwd=PROJECT_ROOT)
+    tree = proc.stdout.strip()
+    return tree if proc.returncode == 0 and tree else None
+
+
+def parse_workspace_members(manifest: str) -> List[str]:
+    """`[workspace] members = [...]` of a Cargo manifest, without needing a TOML parser."""
+    match = re.search(r"^\[workspace\][^\[]*?^members\s*=\s*\[(.*?)\]", manifest, re.S | re.M)
+    if not match:
+        return []
+    body = re.sub(r"#[^\n]*", "", match.group(1))
+    return re.findall(r'"([^"]+)"', body)
+
+
+def _read_blobs(specs: List[str]) -> Dict[str, str]:
+    """Read `<tree>:<path>` blobs with a single `git cat-file --batch`; missing ones are left out."""
+    if not specs:
+        return {}
+    proc = subprocess.run(
+        ["git", "cat-file", "--batch"],
+        cwd=str(PROJECT_ROOT),
+        input="\n".join(specs).encode("utf-8") + b"\n",
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=False,
+    )
+    blobs: Dict[str, str] = {}
+    data = proc.stdout
+    pos = 0
+    for spec in specs:
+        end = data.find(b"\n", pos)
+        if end < 0:
+            break
+        header = data[pos:end].split()
+        pos = end + 1
+        if len(header) != 3 or header[1] != b"blob":
+            continue
+        size = int(header[2])
+        blobs[spec] = data[pos : pos + size].decode("utf-8", errors="replace")
+        pos += size + 1
+    return blobs
+
+
+def build_repo_map(tree: str) -> Dict[str, object]:
+    """Directory sizes, file counts and Cargo workspace crates of a tree, from one `git ls-tree` pass."""
+    proc = run_simple(["git", "ls-tree", "-r", "-l", "-z", tree], cwd=PROJECT_ROOT, check=True)
+    dirs: Dict[str, List[int]] = {}
+    root_files = 0
+    for entry in proc.stdout.split("\0"):
+        meta, _, path = entry.partition("\t")
+        parts = meta.split()
+        if len(parts) != 4 or parts[1] != "blob":
+            continue
+        size = int(parts[3]) if parts[3].isdigit() else 0
+        segments = path.split("/")
+        if len(segments) == 1:
+            root_files += 1
+            continue
+        for depth in range(1, len(segments)):
+            stats = dirs.setdefault("/".join(segments[:depth]), [0, 0])
+            stats[0] += 1
+            stats[1] += size
+
+    def stats_of(path: str) -> Dict[str, object]:
+        files, size = dirs.get(path, [0, 0])
+        return {"path": path, "files": files, "bytes": size}
+
+    top_level = sorted((d for d in dirs if "/" not in d), key=lambda d: -dirs[d][0])
+    directories = []
+    for top in top_level:
+        item = stats_of(top)
+        children = sorted(
+            (d for d in dirs if d.startswith(top + "/") and "/" not in d[len(top) + 1 :]),
+            key=lambda d: -dirs[d][0],
+        )
+        item["subdirs"] = [stats_of(d) for d in children[:REPO_MAP_SUBDIR_LIMIT]]
+        item["subdirCount"] = len(children)
+        directories.append(item)
+
+    workspace_root = WORKSPACE_MANIFEST.rsplit("/", 1)[0]
+    manifest = _read_blobs([f"{tree}:{WORKSPACE_MANIFEST}"]).get(f"{tree}:{WORKSPACE_MANIFEST}", "")
+    members = parse_workspace_members(manifest)
+    member_specs = [f"{tree}:{workspace_root}/{member}/Cargo.toml" for member in members]
+    member_manifests = _read_blobs(member_specs)
+    crates = []
+    for member, spec in zip(members, member_specs):
+        name_match = re.search(r'^\s*name\s*=\s*"([^"]+)"', member_manifests.get(spec, ""), re.M)
+        crate = stats_of(f"{workspace_root}/{member}")
+        crate["name"] = name_match.group(1) if name_match else None
+        crates.append(crate)
+
+    return {
+        "version": REPO_MAP_VERSION,
+        "treeHash": tree,
+        "rootFiles": root_files,
+        "directories": directories,
+        "workspace": {"manifest": WORKSPACE_MANIFEST, "crates": crates} if members else None,
+    }
+
+
+def load_repo_map() -> Tuple[Optional[Dict[str, object]], Dict[str, object]]:
+    """Repository map of HEAD, built once per tree hash and cached under artifacts/cache/repo-map."""
+    if os.environ.get(_REPO_MAP_ENV, "1").strip().lower() in ("0", "false", "no", "off"):
+        return None, {"enabled": False}
+    tree = head_tree_hash()
+    if not tree:
+        return None, {"enabled": False, "error": "HEAD has no tree"}
+    cache_path = REPO_MAP_CACHE_DIR / f"{tree}.json"
+    cached = load_json_or_none(cache_path)
+    if cached and cached.get("version") == REPO_MAP_VERSION:
+        return cached, {"enabled": True, "treeHash": tree, "cacheHit": True}
+    started = time.time()
+    try:
+        repo_map = build_repo_map(tree)
+    except RuntimeError as exc:
+        return None, {"enabled": True, "treeHash": tree, "error": str(exc).strip()[:240]}
+    build_ms = int((time.time() - started) * 1000)
+    repo_map["buildMs"] = build_ms
+    dump_json(cache_path, repo_map)
+    return repo_map, {"enabled": True, "treeHash": tree, "cacheHit": False, "buildMs": build_ms}
+
+
+def format_repo_map(repo_map: Dict[str, object], limit: int = REPO_MAP_PROMPT_CHARS) -> str:
+    """Compact planner-facing rendering of a repository map, truncated to `limit` characters."""
+
+    def size_of(item: Dict[str, object]) -> str:
+        return f"{item['files']} files, {format_bytes(int(item['bytes']))}"
+
+    lines = ["Repository map (tracked files at HEAD; scopes must be real paths from this map):"]
+    workspace = repo_map.get("workspace") or {}
+    workspace_root = str(workspace.get("manifest", "")).rsplit("/", 1)[0] if workspace else ""
+    for item in repo_map.get("directories") or []:
+        lines.append(f"- {item['path']}/ ({size_of(item)})")
+        if item["path"] == workspace_root and workspace.get("crates"):
+            entries = []
+            for crate in workspace["crates"]:
+                member = str(crate["path"])[len(workspace_root) + 1 :]
+                name = crate.get("name")
+                # Package names are only spelled out when the directory does not already give them away.
+                label = f"{member} [{name}]" if name and not str(name).endswith(member.rsplit("/", 1)[-1]) else member
+                entries.append(f"{label} {crate['files']}f")
+            lines.append(f"  Cargo workspace crates under {workspace_root}/ ({len(entries)}): {', '.join(entries)}")
+            continue
+        subdirs = item.get("subdirs") or []
+        if subdirs:
+            more = int(item.get("subdirCount") or 0) - len(subdirs)
+            lines.append(
+                "  "
+                + ", ".join(f"{sub['path']}/ {sub['files']}f" for sub in subdirs)
+                + (f", +{more} more" if more > 0 else "")
+            )
+    lines.append(f"- {repo_map.get('rootFiles', 0)} files at the repository root")
+    text = "\n".join(lines)
+    if len(text) > limit:
+        text = text[: limit - 4].rsplit("\n", 1)[0] + "\n..."
+    return text
+
+
+# Whether the codex command accepted `exec --output-schema`, keyed by command line.
+_OUTPUT_SCHEMA_SUPPORT: Dict[str, bool] = {}
+
+
+def planner_schema_path(name: str) -> Optional[Path]:
+    filename = PLANNER_SCHEMA_FILES.get(name)
+    if not filename:
+        return None
+    path = PLANNER_SCHEMA_DIR / filename
+    return path if path.exists() else None
+
+
+def output_schema_rejected(result: CodexRunResult) -> bool:
+    """True when codex exited on the `--output-schema` argument itself (an older CLI) instead of running."""
+    if result.exit_code == 0 or result.thread_id:
+        return False
+    return "output-schema" in result.stderr_tail
+
+
+@dataclass
+class PlanCacheEntry:
+    run_id: str
+    plan: List[AgentTask]
+    intent: Dict[str, object]
+
+
+class PlanCache:
+    """Normalized plans shared by the tickets of a batch.
+
+    Keyed by task, task mode, planner model, output schema and the HEAD tree, so a repeated
+    ticket skips the planner only while the repository it was planned against is unchanged.
+    A ticket whose plan is already being made waits for it instead of planning again.
+    """
+
+    def __init__(self) -> None:
+        self.cond = threading.Condition()
+        self.entries: Dict[str, PlanCacheEntry] = {}
+        self.planning: set = set()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(raw_task: str, task_mode: str, model: Optional[str], planner_schema: str) -> Optional[str]:
+        tree = head_tree_hash()
+        if not tree:
+            return None
+        material = json.dumps([raw_task.strip(), task_mode, model, planner_schema, tree])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def claim(self, key: str) -> Optional[PlanCacheEntry]:
+        """The cached plan, or None after which the caller must plan and call `finish`."""
+        with self.cond:
+            while key in self.planning:
+                self.cond.wait()
+            entry = self.entries.get(key)
+            if entry:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            self.planning.add(key)
+            return None
+
+    def finish(self, key: str, entry: Optional[PlanCacheEntry]) -> None:
+        with self.cond:
+            self.planning.discard(key)
+            if entry:
+                self.entries.setdefault(key, entry)
+            self.cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self.cond:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+def replay_cached_plan(entry: PlanCacheEntry, run_id: str, planner_dir: Path) -> Tuple[List[AgentTask], CodexRunResult]:
+    """Planner artifacts for a plan-cache hit; no codex process runs."""
+    cache_info = {"hit": True, "sourceRunId": entry.run_id}
+    dump_json(planner_dir / "intent.json", dict(entry.intent, runId=run_id, planCache=cache_info, parsedAt=now_iso()))
+    dump_json(
+        planner_dir / "impact-report.json",
+        {
+            "runId": run_id,
+            "agentCount": len(entry.plan),
+            "exitCode": 0,
+            "state": "DONE",
+            "parsed": True,
+            "planCache": cache_info,
+            "usage": TokenUsage().to_dict(),
+        },
+    )
+    dump_json(
+        planner_dir / "status.json",
+        {
+            "agent": "planner",
+            "runId": run_id,
+            "state": "DONE",
+            "threadId": None,
+            "usage": TokenUsage().to_dict(),
+            "updatedAt": now_iso(),
+        },
+    )
+    return list(entry.plan), CodexRunResult(exit_code=0, thread_id=None, last_message="", error=None)
+
+
+def load_planner_checkpoint(
+    run_id: str, control: Optional[RunControl] = None
+) -> Optional[Tuple[List[AgentTask], CodexRunResult]]:
+    """The normalized plan of an interrupted run, or None when its planner never finished."""
+    planner_dir = COORD_BASE / run_id / "planner"
+    intent = load_json_or_none(planner_dir / "intent.json") or {}
+    subtasks = (intent.get("normalizedPlan") or {}).get("subtasks")
+    plan = [
+        AgentTask(
+            str(item["name"]),
+            str(item.get("scope") or ""),
+            str(item.get("objective") or ""),
+            tuple(str(dep) for dep in item.get("dependsOn") or []),
+        )
+        for item in subtasks or []
+        if isinstance(item, dict) and item.get("name")
+    ]
+    if not plan:
+        return None
+    status = load_json_or_none(planner_dir / "status.json") or {}
+    impact = load_json_or_none(planner_dir / "impact-report.json") or {}
+    usage = TokenUsage.from_dict(status.get("usage"))
+    if control and usage.total:
+        control.record_usage(control.planner_usage, usage, "planner", agent_budget=False)
+    exit_code = impact.get("exitCode") if isinstance(impact.get("exitCode"), int) else 0
+    return plan, CodexRunResult(exit_code=exit_code, thread_id=status.get("threadId"), last_message="", error=None)
+
+
 def run_planner(
     raw_task: str,
     codex_cmd: List[str],
@@ -1331,14 +4839,115 @@ def run_planner(
     bypass_approvals_and_sandbox: bool = False,
     model: Optional[str] = None,
     model_provider: Optional[str] = None,
+    budget: Optional[AgentBudget] = None,
+    control: Optional[RunControl] = None,
+    route: Optional[ModelRoute] = None,
+    planner_schema: str = _DEFAULT_PLANNER_SCHEMA,
+    plan_cache: Optional[PlanCache] = None,
 ) -> Tuple[List[AgentTask], CodexRunResult]:
     planner_dir = COORD_BASE / run_id / "planner"
     status_path = planner_dir / "status.json"
     intent_path = planner_dir / "intent.json"
     impact_path = planner_dir / "impact-report.json"
 
+    cache_key = plan_cache.key(raw_task, task_mode, model, planner_schema) if plan_cache else None
+    if plan_cache and cache_key:
+        cached = plan_cache.claim(cache_key)
+        if cached:
+            return replay_cached_plan(cached, run_id, planner_dir)
+        entry: Optional[PlanCacheEntry] = None
+        try:
+            plan, result = run_planner(
+                raw_task,
+                codex_cmd,
+                run_id,
+                task_mode=task_mode,
+                sandbox_mode=sandbox_mode,
+                bypass_approvals_and_sandbox=bypass_approvals_and_sandbox,
+                model=model,
+                model_provider=model_provider,
+                budget=budget,
+                control=control,
+                route=route,
+                planner_schema=planner_schema,
+            )
+            intent = load_json_or_none(intent_path) or {}
+            # A fallback plan is what a bad reply produced; the next ticket should ask again.
+            if result.exit_code == 0 and not intent.get("fallbackUsed"):
+                entry = PlanCacheEntry(run_id, list(plan), intent)
+        finally:
+            plan_cache.finish(cache_key, entry)
+        return plan, result
+
     dump_json(status_path, {"agent": "planner", "runId": run_id, "state": "RUNNING", "updatedAt": now_iso()})
+    usage = control.planner_usage if control else TokenUsage()
 
+    def on_usage(turn: TokenUsage) -> Optional[str]:
+        if control:
+            return control.record_usage(usage, turn, "planner", agent_budget=False)
+        usage.add(turn)
+        return None
+
+    command_key = shlex.join(codex_cmd)
+    schema_path = planner_schema_path(planner_schema)
+    if _OUTPUT_SCHEMA_SUPPORT.get(command_key) is False:
+        schema_path = None
+    schema_info: Dict[str, object] = {
+        "schema": planner_schema,
+        "path": str(schema_path) if schema_path else None,
+        "supported": _OUTPUT_SCHEMA_SUPPORT.get(command_key),
+        "structured": False,
+    }
+
+    stream = StreamStats()
+
+    def run_planner_codex(text: str) -> CodexRunResult:
+        nonlocal schema_path
+        attempt = run_codex_stream(
+            prompt=text,
+            workspace=PROJECT_ROOT,
+            last_message_path=planner_dir / "last-message.txt",
+            codex_cmd=codex_cmd,
+            sandbox_mode=sandbox_mode,
+            bypass_approvals_and_sandbox=bypass_approvals_and_sandbox,
+            model=model,
+            model_provider=model_provider,
+            budget=budget,
+            on_usage=on_usage,
+            output_schema=schema_path,
+        )
+        stream.add(attempt.stream)
+        if schema_path:
+            supported = not output_schema_rejected(attempt)
+            _OUTPUT_SCHEMA_SUPPORT[command_key] = supported
+            schema_info["supported"] = supported
+            if not supported:
+                schema_path = None
+                return run_planner_codex(text)
+        return attempt
+
+    def parse_reply(reply: CodexRunResult) -> Tuple[Optional[object], bool]:
+        """The reply's plan JSON and whether it came straight from structured output."""
+        # Structured output is the plan itself; the embedded-JSON heuristics are only the fallback.
+        if schema_path and reply.exit_code == 0:
+            try:
+                value = json.loads(reply.last_message)
+            except json.JSONDecodeError:
+                value = None
+            if isinstance(value, dict):
+                return value, True
+        return parse_embedded_json(reply.last_message), False
+
+    dag = planner_schema == "dag"
+    dag_rule = (
+        "- every subtask lists `dependsOn`: names of subtasks that must finish first (empty when independent)\n"
+        if dag
+        else ""
+    )
+    depends_example = ',"dependsOn":[]' if dag else ""
+
+    # Advisory scopes are topic tags, so only code-mode planning is grounded in the repository map.
+    repo_map_info: Dict[str, object] = {"enabled": False}
     if task_mode == "advisory":
         prompt = (
             "You are a planner for a multi-agent advisory team.\n"
@@ -1348,11 +4957,16 @@ def run_planner(
             "Scope rules are strict:\n"
             "- every scope MUST be a unique short topic tag (for example `requirements`, `risks`, `sequencing`)\n"
             "- scopes MUST NOT overlap or repeat\n"
-            "- do not use filesystem paths unless explicitly requested by the user\n\n"
-            'Example: {"raw_task":"...", "subtasks":[{"name":"agent-requirements","scope":"requirements","objective":"list requirements and assumptions"}] }\n\n'
+            "- do not use filesystem paths unless explicitly requested by the user\n"
+            f"{dag_rule}\n"
+            'Example: {"raw_task":"...", "subtasks":[{"name":"agent-requirements","scope":"requirements","objective":"list requirements and assumptions"'
+            f"{depends_example}}}] }}\n\n"
             f"User task: {raw_task}"
         )
     else:
+        repo_map, repo_map_info = load_repo_map()
+        repo_map_text = f"{format_repo_map(repo_map)}\n\n" if repo_map else ""
+        repo_map_info["promptChars"] = len(repo_map_text)
         prompt = (
             "You are a planner for a multi-agent engineering team.\n"
             "Decompose the task into 2-4 subtasks for named agents.\n"
@@ -1360,23 +4974,17 @@ def run_planner(
             "Scope rules are strict:\n"
             "- every scope MUST be path-like and MUST NOT overlap another scope (no parent/child relationships)\n"
             "- do not reuse scope prefixes (for example, avoid both `feature` and `feature/src`)\n"
-            "- prefer dedicated sibling paths under a shared root when possible\n\n"
-            'Example: {"raw_task":"...", "subtasks":[{"name":"agent-a","scope":"feature/a","objective":"..."}] }\n\n'
+            "- prefer dedicated sibling paths under a shared root when possible\n"
+            f"{dag_rule}\n"
+            'Example: {"raw_task":"...", "subtasks":[{"name":"agent-a","scope":"feature/a","objective":"..."'
+            f"{depends_example}}}] }}\n\n"
+            f"{repo_map_text}"
             f"User task: {raw_task}"
         )
 
-    result = run_codex_stream(
-        prompt=prompt,
-        workspace=PROJECT_ROOT,
-        last_message_path=planner_dir / "last-message.txt",
-        codex_cmd=codex_cmd,
-        sandbox_mode=sandbox_mode,
-        bypass_approvals_and_sandbox=bypass_approvals_and_sandbox,
-        model=model,
-        model_provider=model_provider,
-    )
+    result = run_planner_codex(prompt)
 
-    parsed = parse_embedded_json(result.last_message)
+    parsed, structured = parse_reply(result)
     retry_attempts = 0
     planner_fallback_detected = False
     fallback_plan = parse_plan(raw_task, parsed, task_mode=task_mode)
@@ -1399,24 +5007,15 @@ def run_planner(
                 retry_shape_example = (
                     "Example: {\"raw_task\":\"...\",\"subtasks\":[{\"name\":\"agent-1\",\"scope\":\"feature/a\",\"objective\":\"...\"}]}\n"
                 )
-            retry_attempt = run_codex_stream(
-                prompt=(
-                    f"{prompt}\n\n"
-                    "Your response is still not in the required planner JSON shape.\n"
-                    "Return ONLY valid JSON object with key `subtasks` containing 2-4 entries.\n"
-                    f"{retry_shape_example}"
-                    "Do not include prose, bullets, or fences."
-                ),
-                workspace=PROJECT_ROOT,
-                last_message_path=planner_dir / "last-message.txt",
-                codex_cmd=codex_cmd,
-                sandbox_mode=sandbox_mode,
-                bypass_approvals_and_sandbox=bypass_approvals_and_sandbox,
-                model=model,
-                model_provider=model_provider,
+            retry_attempt = run_planner_codex(
+                f"{prompt}\n\n"
+                "Your response is still not in the required planner JSON shape.\n"
+                "Return ONLY valid JSON object with key `subtasks` containing 2-4 entries.\n"
+                f"{retry_shape_example}"
+                "Do not include prose, bullets, or fences."
             )
             retry_attempts += 1
-            parsed_retry = parse_embedded_json(retry_attempt.last_message)
+            parsed_retry, structured_retry = parse_reply(retry_attempt)
             if parsed_retry is None:
                 continue
             plan_retry = parse_plan(raw_task, parsed_retry, task_mode=task_mode)
@@ -1428,11 +5027,13 @@ def run_planner(
                 )
             ):
                 parsed = parsed_retry
+                structured = structured_retry
                 result = retry_attempt
                 planner_fallback_detected = False
                 break
 
     planner_parse_attempts = retry_attempts + 1
+    schema_info["structured"] = structured
 
     plan = parse_plan(raw_task, parsed, task_mode=task_mode)
     fallback_root = "analysis" if task_mode == "advisory" else DEFAULT_SCOPE_ROOT
@@ -1446,12 +5047,16 @@ def run_planner(
             "plannerResult": parsed or {},
             "plannerParseAttempts": planner_parse_attempts,
             "fallbackUsed": planner_fallback_detected,
+            "repoMap": repo_map_info,
+            "outputSchema": schema_info,
+            "routing": (route or ModelRoute(model, model_provider, "model" if model else "codex-default")).to_dict(),
             "normalizedPlan": {
                 "subtasks": [
                     {
                         "name": item.name,
                         "scope": item.scope,
                         "objective": item.objective,
+                        "dependsOn": list(item.depends_on),
                     }
                     for item in plan
                 ],
@@ -1467,6 +5072,12 @@ def run_planner(
             "exitCode": result.exit_code,
             "state": "DONE" if result.exit_code == 0 else "BLOCKED",
             "parsed": bool(parsed),
+            "parseAttempts": planner_parse_attempts,
+            "fallbackUsed": planner_fallback_detected,
+            "repoMap": repo_map_info,
+            "outputSchema": schema_info,
+            "usage": usage.to_dict(),
+            "stream": stream.to_dict(),
         },
     )
     dump_json(
@@ -1476,6 +5087,7 @@ def run_planner(
             "runId": run_id,
             "state": "DONE" if result.exit_code == 0 else "BLOCKED",
             "threadId": result.thread_id,
+            "usage": usage.to_dict(),
             "updatedAt": now_iso(),
         },
     )
@@ -1483,18 +5095,21 @@ def run_planner(
 
 
 def validate_scope_rules(tasks: List[AgentTask]) -> Tuple[bool, List[str]]:
-    issues: List[str] = []
-    for i in range(len(tasks)):
-        for j in range(i + 1, len(tasks)):
-            if scopes_overlap(tasks[i].scope, tasks[j].scope):
-                issues.append(
-                    f"scope overlap: {tasks[i].name}:{tasks[i].scope or '.'} and {tasks[j].name}:{tasks[j].scope or '.'}"
-                )
+    trie = ScopeTrie()
+    pairs: List[Tuple[int, int]] = []
+    for j, task in enumerate(tasks):
+        pairs.extend((i, j) for i in trie.overlapping(task.scope))
+        trie.insert(task.scope, j)
+    issues = [
+        f"scope overlap: {tasks[i].name}:{tasks[i].scope or '.'} and {tasks[j].name}:{tasks[j].scope or '.'}"
+        for i, j in sorted(pairs)
+    ]
     return len(issues) == 0, issues
 
 
 def needs_contract_check(agents: List[AgentState]) -> bool:
     sensitive_prefixes = (
+        "codex-rs/app-server-protocol/",
         "codex-rs/codex-app-server-protocol/",
         "codex-rs/protocol/",
     )
@@ -1506,58 +5121,57 @@ def needs_contract_check(agents: List[AgentState]) -> bool:
     return False
 
 
-def check_mergeability(agents: List[AgentState], run_id: str) -> Dict[str, object]:
-    result: Dict[str, object] = {"passed": False, "details": []}
-    temp_root = Path(tempfile.mkdtemp(prefix=f"{run_id}-merge-"))
-    merge_tree = temp_root / "merge"
-    patches: List[Path] = []
-    details: List[dict] = []
-    non_empty_patches: List[Tuple[AgentState, str]] = []
+class MergeGate:
+    """Dry-run merge that applies each agent patch to a shared merge worktree as soon as it is ready.
 
-    for agent in agents:
-        patch = collect_diff(agent.workspace)
-        if patch.strip():
-            non_empty_patches.append((agent, patch))
-        else:
-            details.append(
-                {
-                    "agent": agent.name,
-                    "skipped": "empty patch",
-                    "checkCode": 0,
-                    "applyCode": 0,
-                }
-            )
-
-    if not non_empty_patches:
-        result.update(
-            {
-                "passed": True,
-                "details": details + [{"mode": "skip", "reason": "all patches empty"}],
-                "mergedDiff": "",
-                "patches": [],
-            }
-        )
-        shutil.rmtree(temp_root, ignore_errors=True)
-        return result
+    Agents submit their patch when they reach DONE, so conflict detection overlaps
+    with agents that are still running; `finalize` only has to apply whatever was
+    not submitted yet (for example BLOCKED agents) and collect the merged diff.
+    """
 
-    try:
-        run_simple(
-            [
-                "git",
-                "worktree",
-                "add",
-                "--detach",
-                str(merge_tree),
-                "HEAD",
-            ],
-            cwd=PROJECT_ROOT,
-            check=True,
-        )
-
-        for agent, patch in non_empty_patches:
-            patch_path = temp_root / f"{agent.name}.patch"
+    def __init__(self, run_id: str, control: Optional[RunControl] = None, base: str = "HEAD") -> None:
+        self.run_id = run_id
+        self.control = control
+        self.base = base
+        self.lock = threading.Lock()
+        self.temp_root: Optional[Path] = None
+        self.merge_tree: Optional[Path] = None
+        self.details: List[dict] = []
+        self.patches: List[Path] = []
+        self.submitted: set = set()
+        self.conflicts: List[str] = []
+        self.applied_incrementally = 0
+
+    def _ensure_tree(self) -> Path:
+        if self.merge_tree is None:
+            self.temp_root = Path(tempfile.mkdtemp(prefix=f"{self.run_id}-merge-"))
+            merge_tree = self.temp_root / "merge"
+            run_simple(["git", "worktree", "add", "--detach", str(merge_tree), self.base], cwd=PROJECT_ROOT, check=True)
+            self.merge_tree = merge_tree
+        return self.merge_tree
+
+    def submit(self, agent: AgentState, incremental: bool = True) -> str:
+        # Agents blocked before launch (unknown scope) never got a worktree.
+        patch = collect_diff(agent.workspace) if agent.workspace.exists() else ""
+        with self.lock:
+            if agent.name in self.submitted:
+                return agent.merge_state or "PENDING"
+            self.submitted.add(agent.name)
+            if not patch.strip():
+                self.details.append({"agent": agent.name, "skipped": "empty patch", "checkCode": 0, "applyCode": 0})
+                agent.merge_state = "EMPTY"
+                return agent.merge_state
+            try:
+                merge_tree = self._ensure_tree()
+            except RuntimeError as exc:
+                self.details.append({"agent": agent.name, "checkCode": 2, "checkStdout": "", "checkStderr": str(exc)})
+                self.conflicts.append(agent.name)
+                agent.merge_state = "CONFLICT"
+                return agent.merge_state
+
+            patch_path = self.temp_root / f"{agent.name}.patch"
             dump_text(patch_path, patch)
-            patches.append(patch_path)
+            self.patches.append(patch_path)
             check = run_simple(["git", "-C", str(merge_tree), "apply", "--check", str(patch_path)], cwd=PROJECT_ROOT)
             detail: Dict[str, object] = {
                 "agent": agent.name,
@@ -1566,38 +5180,112 @@ def check_mergeability(agents: List[AgentState], run_id: str) -> Dict[str, objec
                 "checkStdout": check.stdout,
                 "checkStderr": check.stderr,
             }
-            if check.returncode != 0:
-                details.append(detail)
-                result["details"] = details
-                return result
-
-            apply = run_simple(["git", "-C", str(merge_tree), "apply", str(patch_path)], cwd=PROJECT_ROOT)
-            detail["applyCode"] = apply.returncode
-            detail["applyStdout"] = apply.stdout
-            detail["applyStderr"] = apply.stderr
-            details.append(detail)
-            if apply.returncode != 0:
-                result["details"] = details
-                return result
-
-        merged = run_simple(["git", "-C", str(merge_tree), "diff", "--binary"], cwd=PROJECT_ROOT).stdout
-        result.update({
-            "passed": True,
-            "details": details,
-            "mergedDiff": merged,
-            "patches": [str(p) for p in patches],
-        })
-    finally:
-        if merge_tree.exists():
-            run_simple(["git", "worktree", "remove", "--force", str(merge_tree)], cwd=PROJECT_ROOT)
-        run_simple(["git", "worktree", "prune"], cwd=PROJECT_ROOT)
-        shutil.rmtree(temp_root, ignore_errors=True)
+            if check.returncode == 0:
+                apply = run_simple(["git", "-C", str(merge_tree), "apply", str(patch_path)], cwd=PROJECT_ROOT)
+                detail["applyCode"] = apply.returncode
+                detail["applyStdout"] = apply.stdout
+                detail["applyStderr"] = apply.stderr
+            self.details.append(detail)
+            if check.returncode != 0 or detail.get("applyCode") != 0:
+                self.conflicts.append(agent.name)
+                agent.merge_state = "CONFLICT"
+            else:
+                agent.merge_state = "MERGED"
+                if incremental:
+                    self.applied_incrementally += 1
+
+        if agent.merge_state == "CONFLICT" and self.control and self.control.fail_fast:
+            self.control.cancel(f"{agent.name}: merge conflict")
+        return agent.merge_state
+
+    def finalize(self, agents: List[AgentState], keep_tree: bool = False) -> Dict[str, object]:
+        """Apply outstanding patches and collect the merged diff.
+
+        With keep_tree the merge worktree survives (when the merge passed) so later
+        gates can inspect the merged result; the caller must then `close()`.
+        """
+        started = time.time()
+        keep = False
+        try:
+            for agent in agents:
+                if agent.name not in self.submitted:
+                    self.submit(agent, incremental=False)
+            with self.lock:
+                result: Dict[str, object] = {
+                    "passed": not self.conflicts,
+                    "details": list(self.details),
+                    "conflicts": list(self.conflicts),
+                    "appliedIncrementally": self.applied_incrementally,
+                }
+                if self.merge_tree is None:
+                    if not self.conflicts:
+                        result["details"].append({"mode": "skip", "reason": "all patches empty"})
+                    result.update({"mergedDiff": "", "patches": []})
+                elif not self.conflicts:
+                    # Stage first so files created by the patches show up in the merged diff.
+                    run_simple(["git", "-C", str(self.merge_tree), "add", "-A"], cwd=PROJECT_ROOT)
+                    merged = run_simple(
+                        ["git", "-C", str(self.merge_tree), "diff", "--cached", "--binary"], cwd=PROJECT_ROOT
+                    ).stdout
+                    result.update({"mergedDiff": merged, "patches": [str(p) for p in self.patches]})
+                    keep = keep_tree
+        finally:
+            if not keep:
+                self.close()
+        result["finalizeMs"] = int((time.time() - started) * 1000)
+        return result
+
+    def contract_inputs(self) -> Optional[Dict[str, str]]:
+        """Git object ids of the contract check inputs in the staged merge result, if it is still around."""
+        with self.lock:
+            if self.merge_tree is None:
+                return None
+            tree = run_simple(["git", "-C", str(self.merge_tree), "write-tree"], cwd=PROJECT_ROOT)
+            if tree.returncode != 0:
+                return None
+            inputs: Dict[str, str] = {}
+            for rel in CONTRACT_INPUT_PATHS:
+                oid = run_simple(
+                    ["git", "-C", str(self.merge_tree), "rev-parse", "--verify", "--quiet", f"{tree.stdout.strip()}:{rel}"],
+                    cwd=PROJECT_ROOT,
+                )
+                inputs[rel] = oid.stdout.strip() if oid.returncode == 0 else "missing"
+            return inputs
+
+    def close(self) -> None:
+        with self.lock:
+            if self.merge_tree is not None and self.merge_tree.exists():
+                run_simple(["git", "worktree", "remove", "--force", str(self.merge_tree)], cwd=PROJECT_ROOT)
+            if self.temp_root is not None:
+                run_simple(["git", "worktree", "prune"], cwd=PROJECT_ROOT)
+                shutil.rmtree(self.temp_root, ignore_errors=True)
+            self.merge_tree = None
+            self.temp_root = None
+
+
+def contract_cache_key(inputs: Dict[str, str]) -> str:
+    digest = hashlib.sha256()
+    for rel in sorted(inputs):
+        digest.update(f"{rel}\0{inputs[rel]}\n".encode("utf-8"))
+    try:
+        digest.update(CONTRACT_SCRIPT.read_bytes())
+    except OSError:
+        pass
+    return digest.hexdigest()
 
-    return result
 
+def run_contract_check(
+    run_id: str,
+    packet_dir: Path,
+    source_root: Optional[Path] = None,
+    inputs: Optional[Dict[str, str]] = None,
+) -> Dict[str, object]:
+    """Run the protocol contract check against source_root (default: the main checkout).
 
-def run_contract_check(run_id: str, packet_dir: Path) -> Dict[str, object]:
-    script = PROJECT_ROOT / "scripts" / "multiagent" / "contract-check.mjs"
+    When the hashed inputs of the checked tree are given, a previous PASS/FAIL for
+    byte-identical inputs is reused from the cache instead of rebuilding the schema.
+    """
+    script = CONTRACT_SCRIPT
     if not script.exists():
         return {
             "runId": run_id,
@@ -1608,6 +5296,28 @@ def run_contract_check(run_id: str, packet_dir: Path) -> Dict[str, object]:
             "stdout": "",
             "stderr": "",
         }
+
+    cache_path: Optional[Path] = None
+    cache_info: Dict[str, object] = {"enabled": False}
+    if inputs and os.environ.get(_CONTRACT_CACHE_ENV, "1").strip().lower() not in ("0", "false", "no", "off"):
+        key = contract_cache_key(inputs)
+        cache_path = CONTRACT_CACHE_DIR / f"{key}.json"
+        cache_info = {"enabled": True, "key": key, "inputs": inputs, "hit": False}
+        cached = load_json_or_none(cache_path)
+        if cached and isinstance(cached.get("result"), dict):
+            contract = dict(cached["result"])
+            contract.update({"runId": run_id, "timestamp": now_iso()})
+            contract["cache"] = dict(
+                cache_info,
+                hit=True,
+                savedMs=cached.get("checkMs", contract.get("durationMs", 0)),
+                sourceRunId=cached.get("runId"),
+                storedAt=cached.get("storedAt"),
+            )
+            dump_json(packet_dir / "contract-check.json", contract)
+            dump_text(packet_dir / "contract-check.diff.txt", str(cached.get("diff") or ""))
+            return contract
+
     if not shutil.which("node"):
         return {
             "runId": run_id,
@@ -1617,9 +5327,15 @@ def run_contract_check(run_id: str, packet_dir: Path) -> Dict[str, object]:
             "timestamp": now_iso(),
             "stdout": "",
             "stderr": "Node not available",
+            "cache": cache_info,
         }
 
-    proc = run_simple(["node", str(script), "--run-id", run_id], cwd=PROJECT_ROOT)
+    cmd = ["node", str(script), "--run-id", run_id]
+    if source_root:
+        cmd.extend(["--source-root", str(source_root)])
+    started = time.time()
+    proc = run_simple(cmd, cwd=PROJECT_ROOT)
+    check_ms = int((time.time() - started) * 1000)
     check_path = packet_dir / "contract-check.json"
     generated = None
     if check_path.exists():
@@ -1637,15 +5353,32 @@ def run_contract_check(run_id: str, packet_dir: Path) -> Dict[str, object]:
             "timestamp": now_iso(),
             "stdout": proc.stdout,
             "stderr": proc.stderr,
+            "cache": cache_info,
         }
     generated.setdefault("timestamp", now_iso())
+    generated["cache"] = cache_info
+    dump_json(check_path, generated)
+    # ERROR means the check itself broke (toolchain, build), which says nothing about the inputs.
+    if cache_path and generated.get("status") in ("PASS", "FAIL"):
+        diff_path = packet_dir / "contract-check.diff.txt"
+        dump_json(
+            cache_path,
+            {
+                "runId": run_id,
+                "storedAt": now_iso(),
+                "checkMs": check_ms,
+                "inputs": inputs,
+                "result": {k: v for k, v in generated.items() if k != "cache"},
+                "diff": diff_path.read_text(encoding="utf-8", errors="replace") if diff_path.exists() else "",
+            },
+        )
     return generated
 
 
 def ensure_final_contract_files(packet_dir: Path, contract: Dict[str, object]) -> None:
-    if not (packet_dir / "contract-check.json").exists():
+    if not artifact_store().exists(packet_dir / "contract-check.json"):
         dump_json(packet_dir / "contract-check.json", contract)
-    if not (packet_dir / "contract-check.diff.txt").exists():
+    if not artifact_store().exists(packet_dir / "contract-check.diff.txt"):
         dump_text(
             packet_dir / "contract-check.diff.txt",
             f"status={contract.get('status')}\nstdout={contract.get('stdout','')}\nstderr={contract.get('stderr','')}",
@@ -1654,20 +5387,124 @@ def ensure_final_contract_files(packet_dir: Path, contract: Dict[str, object]) -
 
 def validate_required_artifacts(run_id: str, agents: List[AgentState]) -> List[str]:
     missing: List[str] = []
+    store = artifact_store()
     for agent in agents:
-        if not agent.status_path.exists():
+        if not store.exists(agent.status_path):
             missing.append(f"{agent.name}: status.json")
-        if not agent.intent_path.exists():
+        if not store.exists(agent.intent_path):
             missing.append(f"{agent.name}: intent.json")
-        if agent.status == "DONE" and not agent.impact_path.exists():
+        if agent.status == "DONE" and not store.exists(agent.impact_path):
             missing.append(f"{agent.name}: impact-report.json")
-        if agent.status == "BLOCKED" and not agent.blocker_path.exists():
+        if agent.status in ("BLOCKED", "CANCELLED") and not store.exists(agent.blocker_path):
             missing.append(f"{agent.name}: blocker.json")
     if not (COORD_BASE / run_id).exists():
         missing.append("coordination root missing")
     return missing
 
 
+@dataclass
+class Gate:
+    name: str
+    run: Callable[[], bool]
+    depends_on: Tuple[str, ...] = ()
+    # Skip (instead of run) when a dependency did not pass.
+    requires_pass: bool = False
+    # A failure short-circuits every gate that has not started yet.
+    fatal: bool = False
+    # Runs even after a fatal short-circuit, e.g. evidence that must always be written.
+    always: bool = False
+
+
+class GatePipeline:
+    """Runs post-agent gates concurrently as soon as their dependencies have finished."""
+
+    def __init__(self, gates: List[Gate], max_workers: int = 4) -> None:
+        names = {gate.name for gate in gates}
+        for gate in gates:
+            missing = [dep for dep in gate.depends_on if dep not in names]
+            if missing:
+                raise ValueError(f"gate {gate.name} depends on unknown gate(s): {', '.join(missing)}")
+        self.gates = gates
+        self.max_workers = max(1, max_workers)
+
+    def run(self) -> Dict[str, Dict[str, object]]:
+        started = time.time()
+        results: Dict[str, Dict[str, object]] = {}
+        pending = list(self.gates)
+        running: Dict[concurrent.futures.Future, Gate] = {}
+        short_circuit: Optional[str] = None
+
+        def record(gate: Gate, status: str, began: Optional[float] = None, reason: Optional[str] = None) -> None:
+            entry: Dict[str, object] = {"status": status, "dependsOn": list(gate.depends_on)}
+            if began is not None:
+                entry["startedMs"] = int((began - started) * 1000)
+                entry["durationMs"] = int((time.time() - began) * 1000)
+            if reason:
+                entry["reason"] = reason
+            results[gate.name] = entry
+
+        def timed(gate: Gate) -> Tuple[Optional[bool], float, Optional[str]]:
+            began = time.time()
+            try:
+                return gate.run(), began, None
+            except Exception as exc:
+                return None, began, f"{type(exc).__name__}: {exc}"
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for gate in list(pending):
+                    if any(dep not in results for dep in gate.depends_on):
+                        continue
+                    pending.remove(gate)
+                    if short_circuit and not gate.always:
+                        record(gate, "SKIPPED", reason=f"short-circuited after {short_circuit} failed")
+                        continue
+                    failed = [dep for dep in gate.depends_on if results[dep]["status"] != "PASS"]
+                    if gate.requires_pass and failed:
+                        record(gate, "SKIPPED", reason=f"dependency did not pass: {', '.join(failed)}")
+                        continue
+                    running[pool.submit(timed, gate)] = gate
+                if not running:
+                    if pending:
+                        # Only reachable with a dependency cycle.
+                        for gate in pending:
+                            record(gate, "SKIPPED", reason="unsatisfiable dependencies")
+                        pending.clear()
+                    break
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    gate = running.pop(future)
+                    passed, began, error = future.result()
+                    if error:
+                        record(gate, "ERROR", began, reason=error)
+                    else:
+                        record(gate, "PASS" if passed else "FAIL", began)
+                    if not passed and gate.fatal and not short_circuit:
+                        short_circuit = gate.name
+        return {gate.name: results[gate.name] for gate in self.gates}
+
+
+def format_tokens(count: int) -> str:
+    if count >= 1_000_000:
+        return f"{count / 1_000_000:.1f}M"
+    if count >= 1_000:
+        return f"{count / 1_000:.1f}k"
+    return str(count)
+
+
+def format_bytes(size: int) -> str:
+    if size >= 1 << 20:
+        return f"{size / (1 << 20):.1f} MB"
+    if size >= 1 << 10:
+        return f"{size / (1 << 10):.1f} KB"
+    return f"{size} B"
+
+
+def append_usage_index(entry: Dict[str, object]) -> None:
+    """One line per finished run in artifacts/usage/index.jsonl, for cost and rate-limit reporting."""
+    artifact_store().append(USAGE_INDEX_PATH, (json.dumps(entry, sort_keys=True) + "\n").encode("utf-8"))
+
+
 def render_dashboard(
     run_id: str,
     task: str,
@@ -1676,12 +5513,21 @@ def render_dashboard(
     overall: str,
     done: bool,
     tick: int,
+    usage: Optional[Dict[str, object]] = None,
 ) -> str:
     rows = []
     rows.append("Codex Multi-Agent Dashboard")
     rows.append(f"Run ID   : {run_id}")
     rows.append(f"State    : {overall}")
     rows.append(f"Task     : {task}")
+    if usage:
+        total = usage["total"]
+        budget = f" / budget {format_tokens(usage['tokenBudget'])}" if usage.get("tokenBudget") else ""
+        rows.append(
+            f"Tokens   : {format_tokens(total['totalTokens'])}{budget} "
+            f"(in {format_tokens(total['inputTokens'])}, cached {format_tokens(total['cachedInputTokens'])}, "
+            f"out {format_tokens(total['outputTokens'])})"
+        )
     rows.append("")
     rows.append("Planner decomposition:")
     for i, item in enumerate(plan, start=1):
@@ -1691,7 +5537,12 @@ def render_dashboard(
     for a in sorted(agents, key=lambda a: a.name):
         rows.append(
             f"  {a.name:18} status={a.status:7} exit={str(a.exit_code or ''):>4} "
-            f"scope={a.scope or '.':20} files={len(a.changed_files):>3}"
+            f"scope={a.scope or '.':20} files={len(a.changed_files):>3} tok={format_tokens(a.usage.total):>6}"
+            + (f" model={a.model}{'^' if a.escalated else ''}" if a.model else "")
+            + (f" worker={a.worker}" if a.worker else "")
+            + (" cached" if (a.advisory_cache or {}).get("hit") else "")
+            + (f" merge={a.merge_state}" if a.merge_state else "")
+            + (f" queued: {a.queued_reason}" if a.status == "QUEUED" and a.queued_reason else "")
         )
     if not done:
         rows.append(f"\nUpdate #{tick}")
@@ -1702,7 +5553,7 @@ def render_dashboard(
         rows.append("")
         for a in sorted(agents, key=lambda a: a.name):
             if a.blocker_reason:
-                rows.append(f"  {a.name}: BLOCKED ({a.blocker_reason})")
+                rows.append(f"  {a.name}: {a.status} ({a.blocker_reason})")
             else:
                 rows.append(f"  {a.name}: {a.status} ({len(a.changed_files)} files)")
     return "\n" + "\n".join(rows)
@@ -1744,13 +5595,16 @@ def inspect_run(run_id: str) -> int:
             blocker_reason = agent.get("blockerReason")
             if blocker_reason:
                 print(f"      blockerReason: {blocker_reason}")
+            advisory_cache = agent.get("advisoryCache") or {}
+            if advisory_cache.get("hit"):
+                print(f"      advisoryCache: guidance from {advisory_cache.get('sourceRunId')}")
             blocker_doc = load_json_or_none(COORD_BASE / run_id / name / "blocker.json")
             if blocker_doc:
                 last_message = blocker_doc.get("lastMessage")
                 if isinstance(last_message, str) and last_message.strip():
                     print(f"      lastMessage: {last_message.splitlines()[0]}")
-                print(f"      blockerEvidence: artifacts/coordination/{run_id}/{name}/blocker.json")
-            elif state == "BLOCKED":
+                print(f"      blockerEvidence: {artifact_store().location(COORD_BASE / run_id / name / 'blocker.json')}")
+            elif state in ("BLOCKED", "CANCELLED"):
                 print(f"      blockerEvidence: missing artifacts/coordination/{run_id}/{name}/blocker.json")
 
     merge = impact.get("mergeability", {})
@@ -1765,42 +5619,277 @@ def inspect_run(run_id: str) -> int:
                 agent_name = detail.get("agent", "unknown")
                 print(f"    - {agent_name}: checkCode={detail.get('checkCode', 'n/a')}")
                 if detail.get("checkStderr"):
-                    stderr = str(detail.get("checkStderr")).strip()
+                    stderr = resolve_blob(PACKET_BASE / run_id, detail.get("checkStderr")).strip()
                     if stderr:
                         print(f"      stderr: {stderr[:240]}")
                 if detail.get("checkStdout"):
-                    stdout = str(detail.get("checkStdout")).strip()
+                    stdout = resolve_blob(PACKET_BASE / run_id, detail.get("checkStdout")).strip()
                     if stdout:
                         print(f"      stdout: {stdout[:240]}")
                 if detail.get("patch"):
                     print(f"      patch: {detail.get('patch')}")
 
-    contract = load_json_or_none(PACKET_BASE / run_id / "contract-check.json")
-    if contract:
-        status = contract.get("status", "UNKNOWN")
-        print(f"  Contract check: {status}")
-        if "expectedHash" in contract:
-            print(f"    expectedHash : {contract.get('expectedHash')}")
-        if "generatedHash" in contract:
-            print(f"    generatedHash: {contract.get('generatedHash')}")
-        if "command" in contract:
-            print(f"    command      : {contract.get('command')}")
-        if "exitCode" in contract:
-            print(f"    exitCode     : {contract.get('exitCode')}")
-        if contract.get("diffPath"):
-            print(f"    diffPath     : {contract.get('diffPath')}")
-    else:
-        print(f"  Contract check: missing artifacts/pr-packets/{run_id}/contract-check.json")
+    contract = load_json_or_none(PACKET_BASE / run_id / "contract-check.json")
+    if contract:
+        status = contract.get("status", "UNKNOWN")
+        print(f"  Contract check: {status}")
+        if "expectedHash" in contract:
+            print(f"    expectedHash : {contract.get('expectedHash')}")
+        if "generatedHash" in contract:
+            print(f"    generatedHash: {contract.get('generatedHash')}")
+        if "command" in contract:
+            print(f"    command      : {contract.get('command')}")
+        if "exitCode" in contract:
+            print(f"    exitCode     : {contract.get('exitCode')}")
+        if contract.get("diffPath"):
+            print(f"    diffPath     : {contract.get('diffPath')}")
+    else:
+        print(f"  Contract check: missing artifacts/pr-packets/{run_id}/contract-check.json")
+
+    if impact.get("state") != "DONE":
+        print("  Evidence:")
+        for path in (
+            PACKET_BASE / run_id / "summary.md",
+            PACKET_BASE / run_id / "contract-check.json",
+            PACKET_BASE / run_id / "contract-check.diff.txt",
+            PACKET_BASE / run_id / "impact-report.json",
+            COORD_BASE / run_id / "planner" / "intent.json",
+        ):
+            print(f"    - {artifact_store().location(path)}")
+
+    return 0 if impact.get("state") == "DONE" else 1
+
+
+def iso_span_ms(start: Any, end: Any) -> Optional[int]:
+    try:
+        began = datetime.fromisoformat(str(start))
+        ended = datetime.fromisoformat(str(end))
+    except ValueError:
+        return None
+    return max(0, int((ended - began).total_seconds() * 1000))
+
+
+def run_active_ms(run_intent: Dict[str, Any], live: Dict[str, Any]) -> Optional[int]:
+    """Summed wall time of every session of a run, leaving out the downtime before each resume."""
+    starts = [run_intent.get("createdAt"), *(run_intent.get("resumes") or [])]
+    stops = list(run_intent.get("stoppedAt") or [])
+    if len(stops) != len(starts) - 1:
+        # Resumed before stop times were recorded: only the last session can be measured.
+        return iso_span_ms(starts[-1], live.get("updatedAt"))
+    last = iso_span_ms(starts[-1], live.get("updatedAt"))
+    if last is None:
+        return None
+    return last + sum(iso_span_ms(start, stop) or 0 for start, stop in zip(starts, stops))
+
+
+def load_run_profile(run_id: str) -> Optional[Dict[str, Any]]:
+    """Timings and counters of one finished run, read from its coordination and packet artifacts."""
+    impact = load_json_or_none(PACKET_BASE / run_id / "impact-report.json")
+    if not impact:
+        return None
+    coord_run = COORD_BASE / run_id
+    run_intent = load_json_or_none(coord_run / "intent.json") or {}
+    live = load_json_or_none(coord_run / "live-state.json") or {}
+    planner_intent = load_json_or_none(coord_run / "planner" / "intent.json") or {}
+    usage = impact.get("usage") or {}
+    merge = impact.get("mergeability") if isinstance(impact.get("mergeability"), dict) else {}
+
+    agents: List[Dict[str, Any]] = []
+    for item in impact.get("agents") or []:
+        name = str(item.get("name") or "")
+        if not name:
+            continue
+        status = load_json_or_none(coord_run / name / "status.json") or {}
+        intent = load_json_or_none(coord_run / name / "intent.json") or {}
+        attempts = int(status.get("attempts") or 0)
+        changed = item.get("changedFiles")
+        agents.append(
+            {
+                "name": name,
+                "scope": item.get("scope") or status.get("scope") or "",
+                "state": item.get("state"),
+                "durationMs": status.get("durationMs"),
+                "checkoutMs": (intent.get("checkout") or {}).get("durationMs"),
+                "attempts": attempts,
+                "retries": max(0, attempts - 1),
+                "totalTokens": int((item.get("usage") or {}).get("totalTokens") or 0),
+                "changedFiles": len(changed) if isinstance(changed, list) else 0,
+                "model": item.get("model"),
+                "escalated": bool(item.get("escalated")),
+                "cached": bool((item.get("advisoryCache") or {}).get("hit")),
+            }
+        )
+
+    return {
+        "runId": run_id,
+        "task": impact.get("task"),
+        "taskMode": impact.get("taskMode"),
+        "state": impact.get("state"),
+        "run": {
+            "wallMs": run_active_ms(run_intent, live),
+            "plannerParseAttempts": planner_intent.get("plannerParseAttempts"),
+            "plannerFallback": planner_intent.get("fallbackUsed"),
+            "plannerTokens": int((usage.get("planner") or {}).get("totalTokens") or 0),
+            "totalTokens": int((usage.get("total") or {}).get("totalTokens") or 0),
+            "agents": len(agents),
+            "retries": sum(a["retries"] for a in agents),
+            "changedFiles": sum(a["changedFiles"] for a in agents),
+            "gatesMs": impact.get("gatesMs"),
+            "mergeFinalizeMs": merge.get("finalizeMs"),
+        },
+        "gates": {
+            str(name): gate.get("durationMs")
+            for name, gate in (impact.get("gates") or {}).items()
+            if isinstance(gate, dict)
+        },
+        "agents": agents,
+    }
+
 
-    if impact.get("state") != "DONE":
-        print("  Evidence:")
-        print(f"    - artifacts/pr-packets/{run_id}/summary.md")
-        print(f"    - artifacts/pr-packets/{run_id}/contract-check.json")
-        print(f"    - artifacts/pr-packets/{run_id}/contract-check.diff.txt")
-        print(f"    - artifacts/pr-packets/{run_id}/impact-report.json")
-        print(f"    - artifacts/coordination/{run_id}/planner/intent.json")
+def align_agents(
+    agents_a: List[Dict[str, Any]], agents_b: List[Dict[str, Any]]
+) -> List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[str]]]:
+    """Pair agents of two runs by name, then the remaining ones by scope."""
+    pairs: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[str]]] = []
+    rest_b = list(agents_b)
+    unmatched_a: List[Dict[str, Any]] = []
+    for agent in agents_a:
+        match = next((b for b in rest_b if b["name"] == agent["name"]), None)
+        if match is None:
+            unmatched_a.append(agent)
+            continue
+        rest_b.remove(match)
+        pairs.append((agent, match, "name"))
+    for agent in unmatched_a:
+        match = next((b for b in rest_b if agent["scope"] and b["scope"] == agent["scope"]), None)
+        if match is not None:
+            rest_b.remove(match)
+        pairs.append((agent, match, "scope" if match is not None else None))
+    pairs.extend((None, agent, None) for agent in rest_b)
+    return pairs
+
+
+def diff_metric(name: str, a: Any, b: Any) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"a": a, "b": b}
+    numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (a, b))
+    if numeric:
+        entry["delta"] = b - a
+        entry["pct"] = round((b - a) * 100 / a, 1) if a else None
+        if name.endswith("Ms"):
+            entry["regression"] = b - a >= COMPARE_REGRESSION_MIN_MS and b >= a * COMPARE_REGRESSION_RATIO
+    return entry
+
+
+def compare_profiles(profile_a: Dict[str, Any], profile_b: Dict[str, Any]) -> Dict[str, Any]:
+    run = {
+        name: diff_metric(name, profile_a["run"].get(name), profile_b["run"].get(name)) for name in profile_a["run"]
+    }
+    gate_names = list(profile_a["gates"]) + [name for name in profile_b["gates"] if name not in profile_a["gates"]]
+    gates = {
+        name: diff_metric("durationMs", profile_a["gates"].get(name), profile_b["gates"].get(name))
+        for name in gate_names
+    }
+    agent_metrics = ("durationMs", "checkoutMs", "attempts", "retries", "totalTokens", "changedFiles")
+    agents = []
+    for agent_a, agent_b, matched_by in align_agents(profile_a["agents"], profile_b["agents"]):
+        agents.append(
+            {
+                "name": (agent_b or agent_a or {}).get("name"),
+                "matchedBy": matched_by,
+                "a": agent_a,
+                "b": agent_b,
+                "metrics": {
+                    name: diff_metric(name, (agent_a or {}).get(name), (agent_b or {}).get(name))
+                    for name in agent_metrics
+                },
+            }
+        )
+
+    regressions = [f"run.{name}" for name, entry in run.items() if entry.get("regression")]
+    regressions += [f"gates.{name}" for name, entry in gates.items() if entry.get("regression")]
+    for agent in agents:
+        regressions += [
+            f"agents.{agent['name']}.{name}" for name, entry in agent["metrics"].items() if entry.get("regression")
+        ]
+    return {
+        "runA": profile_a["runId"],
+        "runB": profile_b["runId"],
+        "comparedAt": now_iso(),
+        "states": {"a": profile_a["state"], "b": profile_b["state"]},
+        "tasks": {"a": profile_a["task"], "b": profile_b["task"]},
+        "run": run,
+        "gates": gates,
+        "agents": agents,
+        "regressions": regressions,
+    }
 
-    return 0 if impact.get("state") == "DONE" else 1
+
+def format_compare_value(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    return str(value)
+
+
+def format_compare_row(label: str, entry: Dict[str, Any]) -> str:
+    delta = ""
+    if "delta" in entry:
+        delta = f"{entry['delta']:+g}"
+        if entry.get("pct") is not None:
+            delta += f" ({entry['pct']:+g}%)"
+    flag = "  !" if entry.get("regression") else ""
+    return (
+        f"  {label:<28} {format_compare_value(entry.get('a')):>12} {format_compare_value(entry.get('b')):>12}"
+        f"  {delta}{flag}"
+    )
+
+
+def compare_runs(run_a: str, run_b: str, as_json: bool = False) -> int:
+    profiles = []
+    for run_id in (run_a, run_b):
+        profile = load_run_profile(run_id)
+        if profile is None:
+            print(f"Could not load artifacts/pr-packets/{run_id}/impact-report.json")
+            return 1
+        profiles.append(profile)
+    report = compare_profiles(profiles[0], profiles[1])
+    report_path = COMPARE_DIR / f"{run_a}--{run_b}.json"
+    dump_json(report_path, report)
+    artifact_store().flush()
+    if as_json:
+        print(json.dumps(report, indent=2, sort_keys=False))
+        return 0
+
+    print(f"Compare: A={run_a} ({report['states']['a']})  B={run_b} ({report['states']['b']})")
+    if report["tasks"]["a"] != report["tasks"]["b"]:
+        print("  note: the runs have different tasks")
+    header = f"  {'metric':<28} {'A':>12} {'B':>12}  delta"
+    print(header)
+    print("  " + "-" * (len(header) + 8))
+    for name, entry in report["run"].items():
+        print(format_compare_row(name, entry))
+    for name, entry in report["gates"].items():
+        print(format_compare_row(f"gate {name} ms", entry))
+    for agent in report["agents"]:
+        if agent["a"] is None or agent["b"] is None:
+            side = "A" if agent["b"] is None else "B"
+            print(f"  agent {agent['name']}: only in run {side}")
+            continue
+        match = "" if agent["matchedBy"] == "name" else f" (matched by scope with {agent['a']['name']})"
+        states = f"{agent['a']['state']} -> {agent['b']['state']}"
+        print(f"  agent {agent['name']}{match}: {states}")
+        for name, entry in agent["metrics"].items():
+            print(format_compare_row(f"  {name}", entry))
+    if report["regressions"]:
+        print(
+            f"Regressions (>= {COMPARE_REGRESSION_RATIO:g}x and +{COMPARE_REGRESSION_MIN_MS}ms): "
+            + ", ".join(report["regressions"])
+        )
+    else:
+        print("Regressions: none")
+    print(f"JSON: {report_path.relative_to(PROJECT_ROOT)}")
+    return 0
 
 
 def run_ticket(
@@ -1815,6 +5904,23 @@ def run_ticket(
     bypass_approvals_and_sandbox: bool = False,
     model: Optional[str] = None,
     model_provider: Optional[str] = None,
+    fail_fast: bool = False,
+    agent_timeout: Optional[float] = None,
+    agent_idle_timeout: Optional[float] = None,
+    sparse_worktrees: bool = False,
+    sparse_always: Optional[List[str]] = None,
+    admission: Optional[AdmissionController] = None,
+    workers: Optional[WorkerRegistry] = None,
+    wait_for_workers: int = 0,
+    token_budget: Optional[int] = None,
+    agent_token_budget: Optional[int] = None,
+    planner_model: Optional[str] = None,
+    worker_model: Optional[str] = None,
+    escalation_model: Optional[str] = None,
+    model_rules: Optional[List[ModelRule]] = None,
+    planner_schema: str = _DEFAULT_PLANNER_SCHEMA,
+    batch: Optional["TicketBatch"] = None,
+    resume: bool = False,
 ) -> int:
     task_mode = infer_task_mode(task, task_mode)
     require_file_changes = task_mode == "code"
@@ -1826,6 +5932,41 @@ def run_ticket(
     coord_run.mkdir(parents=True, exist_ok=True)
     packet_dir.mkdir(parents=True, exist_ok=True)
 
+    # Everything `resume` needs to pick the run up again after the orchestrator dies.
+    run_intent_path = coord_run / "intent.json"
+    run_intent = (load_json_or_none(run_intent_path) or {}) if resume else {}
+    if resume:
+        # The last live-state update before the orchestrator died ends the previous session.
+        stopped = (load_json_or_none(state_file) or {}).get("updatedAt")
+        run_intent.setdefault("stoppedAt", []).append(stopped)
+        run_intent.setdefault("resumes", []).append(now_iso())
+    else:
+        run_intent = {
+            "runId": run_id,
+            "task": task,
+            "taskMode": task_mode,
+            "options": {
+                "agentSandbox": agent_sandbox_mode,
+                "bypassApprovalsAndSandbox": bypass_approvals_and_sandbox,
+                "model": model,
+                "modelProvider": model_provider,
+                "failFast": fail_fast,
+                "agentTimeout": agent_timeout,
+                "agentIdleTimeout": agent_idle_timeout,
+                "sparseWorktrees": sparse_worktrees,
+                "sparseAlways": sparse_always,
+                "tokenBudget": token_budget,
+                "agentTokenBudget": agent_token_budget,
+                "plannerModel": planner_model,
+                "workerModel": worker_model,
+                "escalationModel": escalation_model,
+                "modelRules": [rule.spec for rule in model_rules or []],
+                "plannerSchema": planner_schema,
+            },
+            "createdAt": now_iso(),
+        }
+    dump_json(run_intent_path, run_intent)
+
     server: Optional[http.server.HTTPServer] = None
     if ui_mode == "web":
         try:
@@ -1850,26 +5991,120 @@ def run_ticket(
             },
         )
 
-    planner_sandbox_mode = agent_sandbox_mode if require_file_changes else "read-only"
-    worker_sandbox_mode = agent_sandbox_mode if require_file_changes else "read-only"
-    plan, planner_result = run_planner(
-        task,
-        codex_cmd,
-        run_id,
-        task_mode=task_mode,
-        sandbox_mode=planner_sandbox_mode,
-        bypass_approvals_and_sandbox=bypass_approvals_and_sandbox,
+    control = RunControl(
+        fail_fast=fail_fast,
+        agent_budget=resolve_agent_budget(task_mode, agent_timeout, agent_idle_timeout),
+        admission=admission,
+        workers=workers,
+        token_budget=token_budget or None,
+        agent_token_budget=agent_token_budget or None,
+    )
+    if batch:
+        batch.register(control)
+    router = ModelRouter(
         model=model,
-        model_provider=model_provider,
+        provider=model_provider,
+        planner_model=planner_model,
+        worker_model=worker_model,
+        escalation_model=escalation_model,
+        rules=list(model_rules or []),
     )
+    planner_route = router.planner_route()
+    planner_sandbox_mode = agent_sandbox_mode if require_file_changes else "read-only"
+    worker_sandbox_mode = agent_sandbox_mode if require_file_changes else "read-only"
+    checkpoint = load_planner_checkpoint(run_id, control) if resume else None
+    if checkpoint:
+        plan, planner_result = checkpoint
+    else:
+        plan, planner_result = run_planner(
+            task,
+            codex_cmd,
+            run_id,
+            task_mode=task_mode,
+            sandbox_mode=planner_sandbox_mode,
+            bypass_approvals_and_sandbox=bypass_approvals_and_sandbox,
+            model=planner_route.model,
+            model_provider=model_provider,
+            budget=control.agent_budget,
+            control=control,
+            route=planner_route,
+            planner_schema=planner_schema,
+            plan_cache=batch.plan_cache if batch else None,
+        )
+    scope_checks: Dict[str, ScopeCheck] = {}
+    path_index = tracked_path_index() if require_file_changes else None
+    if require_file_changes:
+        plan, scope_checks = validate_plan_scopes(plan, path_index)
     scope_ok, scope_errors = validate_scope_rules(plan)
 
-    lock = threading.Lock()
+    # Pin every agent, local or remote, and the merge gate to the same commit.
+    base_commit = run_intent.get("baseCommit") or run_simple(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT).stdout.strip() or "HEAD"
+    if run_intent.get("baseCommit") != base_commit:
+        run_intent["baseCommit"] = base_commit
+        dump_json(run_intent_path, run_intent)
+    merge_gate = MergeGate(run_id, control, base=base_commit) if require_file_changes else None
     agents: List[AgentState] = []
+    routes: Dict[str, ModelRoute] = {}
+    rejected: Dict[str, str] = {}
+    kept: set = set()
+    resume_threads: Dict[str, str] = {}
+    # Advisory answers depend only on the question, the commit and the model, so repeats are served from disk.
+    advisory_limits = advisory_cache_limits() if task_mode == "advisory" else None
+    cached: Dict[str, dict] = {}
     for item in plan:
         coord_dir = coord_run / item.name
         workspace = WORKTREE_ROOT / run_id / item.name
-        create_worktree(workspace)
+        scope_check = scope_checks.get(item.name)
+        if scope_check and scope_check.status == "rejected":
+            rejected[item.name] = scope_check.reason or f"Scope not found: {item.scope}"
+        sparse_paths = None
+        if sparse_worktrees and require_file_changes:
+            sparse_paths = sparse_checkout_paths(item.scope, sparse_always, path_index)
+        # Tokens an agent spent before the restart still count toward its budgets.
+        previous = (load_json_or_none(coord_dir / "status.json") or {}) if resume else {}
+        previous_usage = TokenUsage.from_dict(previous.get("usage"))
+        if resume and item.name not in rejected:
+            state = AgentState(
+                name=item.name,
+                scope=item.scope,
+                objective=item.objective,
+                workspace=workspace,
+                coord_dir=coord_dir,
+                status_path=coord_dir / "status.json",
+                intent_path=coord_dir / "intent.json",
+                impact_path=coord_dir / "impact-report.json",
+                blocker_path=coord_dir / "blocker.json",
+                sparse_paths=sparse_paths,
+            )
+            if restore_finished_agent(state, base_commit):
+                if previous_usage.total:
+                    control.record_usage(state.usage, previous_usage, state.name, agent_budget=False)
+                routes[state.name] = router.worker_route(item.scope, task_mode, path_index)
+                kept.add(state.name)
+                agents.append(state)
+                append_log(state, "kept from the interrupted run", state.lock, run_id)
+                continue
+            # A thread is only worth resuming together with the worktree it was editing.
+            if previous.get("threadId") and workspace.exists():
+                resume_threads[state.name] = str(previous["threadId"])
+        route = router.worker_route(item.scope, task_mode, path_index)
+        cache_key = None
+        if advisory_limits and item.name not in rejected:
+            cache_key = advisory_cache_key(item.objective, item.scope, base_commit, route.model, model_provider)
+            entry = lookup_advisory_result(cache_key, advisory_limits[0])
+            if entry:
+                cached[item.name] = entry
+        checkout_started = time.time()
+        # An agent whose scope does not exist is blocked before it gets a worktree; a cached one never needs one.
+        if item.name not in rejected and item.name not in resume_threads and item.name not in cached:
+            if batch:
+                workspace = batch.pool.acquire(base_commit, sparse_paths)
+            elif resume and is_worktree_root(workspace):
+                # Agents still queued when the run stopped have a worktree but no thread to resume.
+                recycle_worktree(workspace, base_commit, sparse_paths)
+            else:
+                create_worktree(workspace, base=base_commit, sparse_paths=sparse_paths)
+        checkout_ms = int((time.time() - checkout_started) * 1000)
         state = AgentState(
             name=item.name,
             scope=item.scope,
@@ -1880,7 +6115,16 @@ def run_ticket(
             intent_path=coord_dir / "intent.json",
             impact_path=coord_dir / "impact-report.json",
             blocker_path=coord_dir / "blocker.json",
+            sparse_paths=sparse_paths,
         )
+        routes[state.name] = route
+        state.model = route.model
+        state.thread_usage = load_thread_usage(previous)
+        if state.name in resume_threads:
+            # codex continues the thread's running total, which already includes the usage charged below.
+            state.thread_usage.setdefault(resume_threads[state.name], TokenUsage.from_dict(previous.get("usage")))
+        if cache_key:
+            state.advisory_cache = {"enabled": True, "key": cache_key, "headCommit": base_commit, "hit": False}
         dump_json(
             state.intent_path,
             {
@@ -1888,109 +6132,245 @@ def run_ticket(
                 "runId": run_id,
                 "scope": state.scope,
                 "objective": state.objective,
+                "routing": route.to_dict(),
+                "scopeCheck": scope_check.to_dict() if scope_check else None,
+                "checkout": {
+                    "mode": "sparse" if sparse_paths else "full",
+                    "paths": sparse_paths or [],
+                    "durationMs": checkout_ms,
+                    "pooled": bool(batch),
+                },
+                "resumedThread": resume_threads.get(state.name),
+                "dependsOn": list(item.depends_on),
                 "createdAt": now_iso(),
             },
         )
+        if previous_usage.total:
+            control.record_usage(state.usage, previous_usage, state.name, agent_budget=False)
         state.started_at = now_iso()
         write_status(state, run_id)
         agents.append(state)
+        if scope_check and scope_check.status == "repaired":
+            append_log(state, f"scope repaired: {scope_check.reason}", state.lock, run_id)
+        if item.name in rejected:
+            finish_agent(
+                state,
+                state.lock,
+                run_id,
+                rejected[item.name],
+                exit_code=None,
+                thread_id=None,
+                duration_ms=0,
+                last_message="",
+                control=control,
+            )
+        elif item.name in cached:
+            serve_cached_advisory(state, cached[item.name], state.lock, run_id, control)
+
+    if workers and wait_for_workers > 0:
+        print(f"Waiting up to {WORKER_WAIT_TIMEOUT_SECONDS:g}s for {wait_for_workers} remote worker(s)...")
+        live = workers.wait_for_workers(wait_for_workers, WORKER_WAIT_TIMEOUT_SECONDS, control.cancelled)
+        print(f"{live} remote worker(s) registered.")
 
     threads = []
+    by_name = {state.name: state for state in agents}
+    depends_on = {item.name: item.depends_on for item in plan}
     for state in agents:
-        thread = threading.Thread(
-            target=run_agent,
-            args=(
+        if state.name in rejected or state.name in kept or state.name in cached:
+            continue
+        remote_payload = {
+            "runId": run_id,
+            "agent": state.name,
+            "scope": state.scope,
+            "objective": state.objective,
+            "baseCommit": base_commit,
+            "taskMode": task_mode,
+            "requireFileChanges": require_file_changes,
+            "sandboxMode": worker_sandbox_mode,
+            "bypass": bypass_approvals_and_sandbox,
+            "model": routes[state.name].model,
+            "modelProvider": model_provider,
+            "escalationModel": routes[state.name].escalation_model,
+            "routing": routes[state.name].to_dict(),
+            "sparsePaths": state.sparse_paths,
+            "budget": {
+                "wallSeconds": control.agent_budget.wall_seconds,
+                "idleSeconds": control.agent_budget.idle_seconds,
+            },
+            "agentTokenBudget": control.agent_token_budget,
+        }
+        launch = functools.partial(
+            run_agent_when_admitted,
+            state,
+            state.lock,
+            run_id,
+            control,
+            functools.partial(
+                run_agent,
                 state,
                 codex_cmd,
-                lock,
+                state.lock,
                 run_id,
                 task_mode,
                 require_file_changes,
                 worker_sandbox_mode,
                 bypass_approvals_and_sandbox,
-                model,
+                routes[state.name].model,
                 model_provider,
+                control,
+                merge_gate,
+                escalation_model=routes[state.name].escalation_model,
+                resume_thread_id=resume_threads.get(state.name),
             ),
+            functools.partial(run_remote_agent, state, state.lock, run_id, control, remote_payload, merge_gate),
+        )
+        dependencies = [by_name[name] for name in depends_on.get(state.name, ()) if name in by_name]
+        thread = threading.Thread(
+            target=run_agent_after_dependencies,
+            args=(state, dependencies, run_id, control, launch),
             daemon=True,
         )
         thread.start()
         threads.append(thread)
 
     tick = 0
-    while any(t.is_alive() for t in threads):
-        tick += 1
-        with lock:
+    try:
+        while any(t.is_alive() for t in threads):
+            tick += 1
             snapshot = build_dashboard_payload(run_id, task, plan, agents, "RUNNING", tick)
-        write_state_snapshot(state_file, snapshot)
-        if ui_mode == "tui":
-            print("\x1b[2J\x1b[H", end="")
-            print(render_dashboard(run_id, task, plan, agents, "RUNNING", False, tick))
-        time.sleep(WEB_REFRESH if ui_mode == "web" else DASH_REFRESH)
+            snapshot["usage"] = control.usage_summary()
+            snapshot["locks"] = lock_wait_summary(agents, control)
+            if workers:
+                snapshot["workers"] = workers.snapshot()
+            write_state_snapshot(state_file, snapshot)
+            if ui_mode == "tui":
+                print("\x1b[2J\x1b[H", end="")
+                print(render_dashboard(run_id, task, plan, agents, "RUNNING", False, tick, snapshot["usage"]))
+            time.sleep(WEB_REFRESH if ui_mode == "web" else DASH_REFRESH)
+    except KeyboardInterrupt:
+        # Agents run in their own process groups, so Ctrl-C no longer reaches
+        # them directly; take them down before exiting.
+        control.cancel("orchestrator interrupted")
+        if merge_gate:
+            merge_gate.close()
+        raise
 
     for t in threads:
         t.join()
-
-    overall = "DONE"
-    if planner_result.exit_code != 0:
-        overall = "BLOCKED"
-    if not scope_ok:
-        overall = "BLOCKED"
-
-    artifact_errors = validate_required_artifacts(run_id, agents)
-    if require_file_changes and overall == "DONE" and not any(agent.changed_files for agent in agents):
-        overall = "BLOCKED"
-        artifact_errors.append("No agent produced any file changes.")
-    if artifact_errors:
-        overall = "BLOCKED"
-
-    if require_file_changes:
-        merge_result = check_mergeability(agents, run_id)
-        if not merge_result.get("passed"):
-            overall = "BLOCKED"
-
-        if needs_contract_check(agents):
-            contract = run_contract_check(run_id, packet_dir)
-            ensure_final_contract_files(packet_dir, contract)
-            if contract.get("status") != "PASS":
-                overall = "BLOCKED"
-        else:
-            contract = {
-                "runId": run_id,
-                "status": "SKIPPED",
-                "command": "skipped (no protocol-sensitive files changed)",
-                "exitCode": 0,
-                "timestamp": now_iso(),
-                "stdout": "",
-                "stderr": "",
-            }
-            ensure_final_contract_files(packet_dir, contract)
-    else:
-        merge_result = {
-            "passed": True,
-            "details": [{"mode": "advisory", "note": "Mergeability skipped for advisory guidance tasks."}],
-            "mergedDiff": "",
-            "patches": [],
-        }
-        contract = {
+    if advisory_limits:
+        for state in agents:
+            store_advisory_result(state, run_id, advisory_limits)
+
+    artifact_errors: List[str] = []
+    contract_needed = require_file_changes and needs_contract_check(agents)
+    gate_outputs: Dict[str, Dict[str, object]] = {
+        "merge": {"passed": False, "details": [], "mergedDiff": "", "patches": []},
+        "contract": {
             "runId": run_id,
-            "status": "PASS",
-            "command": "skipped (advisory task mode)",
+            "status": "SKIPPED",
+            "command": "skipped (gate did not run)",
             "exitCode": 0,
             "timestamp": now_iso(),
             "stdout": "",
             "stderr": "",
-        }
-        ensure_final_contract_files(packet_dir, contract)
+        },
+    }
+
+    def preflight_gate() -> bool:
+        if control.cancelled.is_set():
+            artifact_errors.append(f"{control.cancel_policy}: run cancelled after {control.cancel_reason}")
+            return False
+        return True
+
+    def artifacts_gate() -> bool:
+        errors = validate_required_artifacts(run_id, agents)
+        if (
+            require_file_changes
+            and not errors
+            and planner_result.exit_code == 0
+            and scope_ok
+            and not any(agent.changed_files for agent in agents)
+        ):
+            errors.append("No agent produced any file changes.")
+        artifact_errors.extend(errors)
+        return not errors
+
+    def merge_gate_check() -> bool:
+        if not require_file_changes:
+            gate_outputs["merge"] = {
+                "passed": True,
+                "details": [{"mode": "advisory", "note": "Mergeability skipped for advisory guidance tasks."}],
+                "mergedDiff": "",
+                "patches": [],
+            }
+            return True
+        gate_outputs["merge"] = merge_gate.finalize(agents, keep_tree=contract_needed)
+        return bool(gate_outputs["merge"].get("passed"))
 
-    with open(packet_dir / "diff.patch", "w", encoding="utf-8") as fp:
-        if require_file_changes and merge_result.get("passed") and merge_result.get("mergedDiff"):
-            fp.write(str(merge_result.get("mergedDiff")))
+    def contract_gate() -> bool:
+        if not require_file_changes:
+            gate_outputs["contract"] = dict(gate_outputs["contract"], status="PASS", command="skipped (advisory task mode)")
+            return True
+        if not contract_needed:
+            gate_outputs["contract"] = dict(
+                gate_outputs["contract"], command="skipped (no protocol-sensitive files changed)"
+            )
+            return True
+        try:
+            gate_outputs["contract"] = run_contract_check(
+                run_id,
+                packet_dir,
+                source_root=merge_gate.merge_tree,
+                inputs=merge_gate.contract_inputs(),
+            )
+        finally:
+            merge_gate.close()
+        return gate_outputs["contract"].get("status") == "PASS"
+
+    def diff_gate() -> bool:
+        merged = gate_outputs["merge"]
+        parts: List[str] = []
+        if require_file_changes and merged.get("passed") and merged.get("mergedDiff"):
+            parts.append(str(merged.get("mergedDiff")))
         elif require_file_changes:
             for agent in agents:
-                fp.write(f"\n# {agent.name}\n")
-                fp.write(collect_diff(agent.workspace))
+                if not agent.workspace.exists():
+                    continue
+                parts.append(f"\n# {agent.name}\n")
+                parts.append(collect_diff(agent.workspace))
         else:
-            fp.write("# Advisory task mode: no code diff generated.\n")
+            parts.append("# Advisory task mode: no code diff generated.\n")
+        dump_text(packet_dir / "diff.patch", "".join(parts))
+        return True
+
+    # Artifact validation and the merge run side by side; the contract check
+    # (slow cargo build) and diff packet generation both only wait for the merge.
+    gates_started = time.time()
+    gate_results = GatePipeline(
+        [
+            Gate("preflight", preflight_gate, fatal=True),
+            Gate("artifacts", artifacts_gate, depends_on=("preflight",), always=True),
+            Gate("merge", merge_gate_check, depends_on=("preflight",)),
+            Gate("contract", contract_gate, depends_on=("merge",), requires_pass=contract_needed),
+            Gate("diff", diff_gate, depends_on=("merge",), always=True),
+        ]
+    ).run()
+    gates_ms = int((time.time() - gates_started) * 1000)
+    if merge_gate:
+        merge_gate.close()
+    merge_result = gate_outputs["merge"]
+    if gate_results["merge"]["status"] == "SKIPPED":
+        merge_result["details"].append({"mode": "skip", "reason": gate_results["merge"].get("reason")})
+    contract = gate_outputs["contract"]
+    if gate_results["contract"]["status"] == "SKIPPED":
+        contract["command"] = f"skipped ({gate_results['contract'].get('reason')})"
+    ensure_final_contract_files(packet_dir, contract)
+
+    overall = "DONE"
+    if planner_result.exit_code != 0 or not scope_ok or artifact_errors:
+        overall = "BLOCKED"
+    if any(result["status"] != "PASS" for result in gate_results.values()):
+        overall = "BLOCKED"
 
     test_lines = [
         f"run_id: {run_id}",
@@ -2000,10 +6380,22 @@ def run_ticket(
     ]
     if scope_errors:
         test_lines.extend([f"scope_issue: {line}" for line in scope_errors])
+    test_lines.extend(
+        f"scope_check: {check.agent} {check.status} {check.scope}" + (f" ({check.reason})" if check.reason else "")
+        for check in scope_checks.values()
+        if check.status != "ok"
+    )
     test_lines.append(f"mergeable: {merge_result.get('passed')}")
     test_lines.append(f"contract_status: {contract.get('status')}")
     if artifact_errors:
         test_lines.extend([f"artifact_missing: {line}" for line in artifact_errors])
+    for name, result in gate_results.items():
+        timing = f" ({result['durationMs']}ms)" if "durationMs" in result else ""
+        reason = f": {result['reason']}" if result.get("reason") else ""
+        test_lines.append(f"gate_{name}: {result['status']}{timing}{reason}")
+    test_lines.append(f"gates_total_ms: {gates_ms}")
+    locks = lock_wait_summary(agents, control)
+    test_lines.append(f"agent_lock_wait_ms: {locks['agentWaitMs']} (max {locks['agentMaxWaitMs']}, contended {locks['agentContended']})")
     dump_text(packet_dir / "test-logs.txt", "\n".join(test_lines) + "\n")
 
     impact = {
@@ -2013,8 +6405,14 @@ def run_ticket(
         "state": overall,
         "scopeRulesOk": scope_ok,
         "scopeIssues": scope_errors,
+        "scopeChecks": {name: check.to_dict() for name, check in scope_checks.items()},
         "artifactErrors": artifact_errors,
         "mergeability": merge_result,
+        "usage": control.usage_summary(),
+        "gates": gate_results,
+        "gatesMs": gates_ms,
+        "artifactStore": artifact_store().stats(),
+        "locks": locks,
         "contract": {
             "status": contract.get("status"),
             "command": contract.get("command"),
@@ -2029,11 +6427,29 @@ def run_ticket(
                 "changedFiles": a.changed_files,
                 "blockerReason": a.blocker_reason,
                 "lastMessage": a.last_message,
+                "worker": a.worker,
+                "usage": a.usage.to_dict(),
+                "stream": a.stream.to_dict(),
+                "model": a.model,
+                "escalated": a.escalated,
+                "advisoryCache": a.advisory_cache,
             }
             for a in agents
         ],
     }
-    dump_json(packet_dir / "impact-report.json", impact)
+    dump_json(packet_dir / "impact-report.json", externalize_blobs(impact, packet_dir))
+    append_usage_index(
+        {
+            "runId": run_id,
+            "finishedAt": now_iso(),
+            "state": overall,
+            "taskMode": task_mode,
+            "model": model,
+            "modelProvider": model_provider,
+            **impact["usage"],
+            "agents": {a.name: a.usage.to_dict() for a in agents},
+        }
+    )
 
     summary = [
         "# PR Packet Summary",
@@ -2055,13 +6471,15 @@ def run_ticket(
             summary.extend(["", "## Agent guidance"])
             for agent in agents:
                 if agent.last_message:
-                    summary.append(f"- {agent.name}: {agent.last_message.strip()[:600]}")
+                    cache = agent.advisory_cache or {}
+                    cached_note = f" (cached from {cache.get('sourceRunId')})" if cache.get("hit") else ""
+                    summary.append(f"- {agent.name}{cached_note}: {agent.last_message.strip()[:600]}")
     else:
         blocked_reasons: List[str] = []
         for agent in agents:
-            if agent.status == "BLOCKED":
+            if agent.status in ("BLOCKED", "CANCELLED"):
                 reason = agent.blocker_reason or "UNKNOWN"
-                blocked_reasons.append(f"{agent.name} BLOCKED: {reason}")
+                blocked_reasons.append(f"{agent.name} {agent.status}: {reason}")
                 blocked_reasons.append(
                     f"Evidence: artifacts/coordination/{run_id}/{agent.name}/blocker.json"
                 )
@@ -2095,25 +6513,339 @@ def run_ticket(
                 summary.append(f"- contract exitCode: {contract.get('exitCode')}")
     dump_text(packet_dir / "summary.md", "\n".join(summary) + "\n")
 
+    # The merge gate set merge states after the agents finished; republish their views first.
+    for agent in agents:
+        publish_agent_view(agent)
     final_payload = build_dashboard_payload(run_id, task, plan, agents, overall, tick)
     final_payload["taskMode"] = task_mode
+    final_payload["usage"] = impact["usage"]
     if ui_mode == "web":
         final_payload["overallState"] = overall
         final_payload["finished"] = True
     write_state_snapshot(state_file, final_payload)
+    # The packet is complete; make it durable before reporting it.
+    artifact_store().flush()
 
     if ui_mode == "tui":
         print("\x1b[2J\x1b[H", end="")
-        print(render_dashboard(run_id, task, plan, agents, overall, True, tick))
+        print(render_dashboard(run_id, task, plan, agents, overall, True, tick, impact["usage"]))
 
-    print(f"\nEvidence: artifacts/pr-packets/{run_id}")
+    if ui_mode != "quiet":
+        print(f"\nEvidence: {artifact_store().location(packet_dir)}")
     if server:
         server.shutdown()
         server.server_close()
+    if batch:
+        # Evidence is in the packet now; the worktrees go back for the next ticket.
+        for agent in agents:
+            batch.pool.release(agent.workspace, agent.sparse_paths)
 
     return 0 if overall != "BLOCKED" else 1
 
 
+def resume_run(
+    run_id: str,
+    ui_mode: str = "tui",
+    web_port: int = DEFAULT_WEB_PORT,
+    admission: Optional[AdmissionController] = None,
+) -> int:
+    """Continue an interrupted run with the task, mode and options recorded in its run intent.
+
+    The plan comes from `planner/intent.json`, DONE agents whose worktree and impact report are
+    intact are kept, and the others are relaunched (on their codex thread when it can be resumed)
+    before the usual gates run.
+    """
+    run_intent = load_json_or_none(COORD_BASE / run_id / "intent.json")
+    if not run_intent or not run_intent.get("task"):
+        print(f"ERROR: artifacts/coordination/{run_id}/intent.json is missing; this run cannot be resumed.")
+        return 1
+    options = run_intent.get("options") if isinstance(run_intent.get("options"), dict) else {}
+    try:
+        model_rules = [ModelRule.parse(spec) for spec in options.get("modelRules") or []]
+    except ValueError as exc:
+        print(f"ERROR: {exc}")
+        return 1
+    print(f"Resuming {run_id}")
+    return run_ticket(
+        str(run_intent["task"]),
+        run_id,
+        ui_mode=ui_mode,
+        web_port=web_port,
+        agent_sandbox_mode=normalize_sandbox_mode(options.get("agentSandbox") or _DEFAULT_AGENT_SANDBOX_MODE),
+        task_mode=normalize_task_mode(str(run_intent.get("taskMode") or _DEFAULT_TASK_MODE)),
+        bypass_approvals_and_sandbox=bool(options.get("bypassApprovalsAndSandbox")),
+        model=options.get("model"),
+        model_provider=options.get("modelProvider"),
+        fail_fast=bool(options.get("failFast")),
+        agent_timeout=options.get("agentTimeout"),
+        agent_idle_timeout=options.get("agentIdleTimeout"),
+        sparse_worktrees=bool(options.get("sparseWorktrees")),
+        sparse_always=options.get("sparseAlways"),
+        admission=admission,
+        token_budget=options.get("tokenBudget"),
+        agent_token_budget=options.get("agentTokenBudget"),
+        planner_model=options.get("plannerModel"),
+        worker_model=options.get("workerModel"),
+        escalation_model=options.get("escalationModel"),
+        model_rules=model_rules,
+        planner_schema=options.get("plannerSchema") or _DEFAULT_PLANNER_SCHEMA,
+        resume=True,
+    )
+
+
+class TicketBatch:
+    """What the tickets of one `batch` share: the worktree pool, the plan cache and their run controls."""
+
+    def __init__(self, batch_id: str) -> None:
+        self.batch_id = batch_id
+        self.pool = WorktreePool(WORKTREE_ROOT / "pool" / batch_id)
+        self.plan_cache = PlanCache()
+        self.lock = threading.Lock()
+        self.controls: List[RunControl] = []
+        self.cancel_reason: Optional[str] = None
+
+    def register(self, control: RunControl) -> None:
+        with self.lock:
+            self.controls.append(control)
+            reason = self.cancel_reason
+        if reason:
+            control.cancel(reason)
+
+    def cancel(self, reason: str) -> None:
+        with self.lock:
+            self.cancel_reason = reason
+            controls = list(self.controls)
+        for control in controls:
+            control.cancel(reason)
+
+
+@dataclass
+class BatchTicket:
+    line: int
+    task: str
+    run_id: str
+    task_mode: Optional[str] = None
+    model: Optional[str] = None
+
+
+def load_batch_tickets(path: Path, batch_id: str) -> Tuple[List[BatchTicket], List[Dict[str, object]]]:
+    """Tickets of a JSONL file, plus results for lines that cannot run (they do not stop the batch).
+
+    A line is `{"task": ..., "runId": ..., "mode": ..., "model": ...}` with only `task` required,
+    or a bare JSON string; blank lines and `#` comments are skipped.
+    """
+    tickets: List[BatchTicket] = []
+    invalid: List[Dict[str, object]] = []
+    seen = set()
+    for number, raw in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        if not raw.strip() or raw.lstrip().startswith("#"):
+            continue
+
+        def reject(reason: str, run_id: Optional[str] = None) -> None:
+            invalid.append({"line": number, "runId": run_id, "state": "INVALID", "failure": "invalid-ticket", "error": reason})
+
+        try:
+            entry = json.loads(raw)
+        except json.JSONDecodeError as exc:
+            reject(f"invalid JSON: {exc.msg}")
+            continue
+        if isinstance(entry, str):
+            entry = {"task": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("task"), str) or not entry["task"].strip():
+            reject("missing task")
+            continue
+        run_id = str(entry.get("runId") or entry.get("run_id") or f"{batch_id}-{number:03d}")
+        mode = entry.get("mode", entry.get("taskMode"))
+        model = entry.get("model")
+        if not re.fullmatch(r"[A-Za-z0-9][A-Za-z0-9._-]*", run_id):
+            reject(f"invalid run id {run_id!r}", run_id)
+        elif run_id in seen:
+            reject(f"duplicate run id {run_id}", run_id)
+        elif mode is not None and mode not in _ALLOWED_TASK_MODES:
+            reject(f"unknown mode {mode!r}", run_id)
+        elif model is not None and not isinstance(model, str):
+            reject("model must be a string", run_id)
+        else:
+            seen.add(run_id)
+            tickets.append(BatchTicket(number, entry["task"].strip(), run_id, mode, model or None))
+    return tickets, invalid
+
+
+def percentile(values: List[int], pct: int) -> Optional[int]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, (pct * len(ordered) + 99) // 100)
+    return ordered[rank - 1]
+
+
+def classify_ticket_failure(run_id: str, impact: Dict[str, object]) -> str:
+    """The first stage that stopped a ticket, from its planner and packet impact reports."""
+    planner = load_json_or_none(COORD_BASE / run_id / "planner" / "impact-report.json") or {}
+    if planner.get("exitCode") not in (None, 0):
+        return "planner"
+    gates = impact.get("gates") if isinstance(impact.get("gates"), dict) else {}
+    agents = impact.get("agents") if isinstance(impact.get("agents"), list) else []
+    if (gates.get("preflight") or {}).get("status") == "FAIL" or any(a.get("state") == "CANCELLED" for a in agents):
+        return "cancelled"
+    if impact.get("scopeRulesOk") is False:
+        return "scope"
+    if any(a.get("state") == "BLOCKED" for a in agents):
+        return "agent"
+    for name in ("artifacts", "merge", "contract", "diff"):
+        if (gates.get(name) or {}).get("status") not in (None, "PASS"):
+            return name
+    return "blocked"
+
+
+def format_duration(ms: Optional[int]) -> str:
+    if ms is None:
+        return "n/a"
+    seconds = ms / 1000
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(seconds), 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m"
+
+
+def run_batch(
+    tickets_path: Path,
+    batch_id: str,
+    ticket_concurrency: int,
+    launch: Callable[..., int],
+    task_mode: str = _DEFAULT_TASK_MODE,
+    model: Optional[str] = None,
+) -> int:
+    """Runs every ticket of a JSONL file, `ticket_concurrency` at a time, and writes a batch summary.
+
+    `launch` is `run_ticket` with the batch's options bound, built by the caller so the options are
+    type-checked against its signature. Tickets share the admission controller bound in it (so
+    `--max-agents` caps agents across the whole batch), a worktree pool and a plan cache; each
+    still gets its own PR packet. A ticket's `mode` and `model` override `task_mode` and `model`.
+    """
+    tickets, invalid = load_batch_tickets(tickets_path, batch_id)
+    batch = TicketBatch(batch_id)
+    started = time.time()
+    started_at = now_iso()
+    note = f", {len(invalid)} invalid line(s) skipped" if invalid else ""
+    print(f"Batch {batch_id}: {len(tickets)} ticket(s), {ticket_concurrency} at a time{note}")
+
+    def run_one(ticket: BatchTicket) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "line": ticket.line,
+            "runId": ticket.run_id,
+            "task": ticket.task[:200],
+            "taskMode": ticket.task_mode or task_mode,
+            "model": ticket.model or model,
+            "queuedMs": int((time.time() - started) * 1000),
+        }
+        if batch.cancel_reason:
+            result.update(state="CANCELLED", failure="not-started", error=batch.cancel_reason)
+            return result
+        ticket_started = time.time()
+        error: Optional[str] = None
+        try:
+            code = launch(
+                ticket.task,
+                ticket.run_id,
+                ui_mode="quiet",
+                start_web_server=False,
+                batch=batch,
+                task_mode=result["taskMode"],
+                model=result["model"],
+            )
+        except Exception as exc:
+            code = 1
+            error = f"{type(exc).__name__}: {exc}"
+        impact = load_json_or_none(PACKET_BASE / ticket.run_id / "impact-report.json") or {}
+        usage: Dict[str, Any] = impact["usage"] if isinstance(impact.get("usage"), dict) else {}
+        result.update(
+            state="ERROR" if error else impact.get("state") or ("DONE" if code == 0 else "BLOCKED"),
+            latencyMs=int((time.time() - ticket_started) * 1000),
+            failure=None if code == 0 and not error else "error" if error else classify_ticket_failure(ticket.run_id, impact),
+            error=error,
+            blockedAgents=sum(1 for a in impact.get("agents") or [] if a.get("state") in ("BLOCKED", "CANCELLED")),
+            totalTokens=(usage.get("total") or {}).get("totalTokens", 0),
+            packet=f"artifacts/pr-packets/{ticket.run_id}",
+        )
+        failure = f" ({result['failure']})" if result["failure"] else ""
+        print(f"[{ticket.run_id}] {result['state']} in {format_duration(result['latencyMs'])}{failure}", flush=True)
+        return result
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, ticket_concurrency)) as executor:
+        futures = [executor.submit(run_one, ticket) for ticket in tickets]
+        try:
+            while not all(future.done() for future in futures):
+                concurrent.futures.wait(futures, timeout=DASH_REFRESH)
+        except KeyboardInterrupt:
+            print("Batch interrupted: cancelling running tickets and skipping queued ones.", flush=True)
+            batch.cancel("batch interrupted")
+            concurrent.futures.wait(futures)
+    results = [future.result() for future in futures]
+    pool_stats = batch.pool.stats()
+    batch.pool.close()
+
+    duration_ms = int((time.time() - started) * 1000)
+    finished = [r for r in results if "latencyMs" in r]
+    latencies = [int(r["latencyMs"]) for r in finished]
+    failures: Dict[str, int] = {}
+    for r in results + invalid:
+        if r.get("failure"):
+            failures[str(r["failure"])] = failures.get(str(r["failure"]), 0) + 1
+    done = sum(1 for r in results if not r.get("failure"))
+    hours = max(duration_ms, 1) / 3_600_000
+    summary: Dict[str, Any] = {
+        "batchId": batch_id,
+        "tickets": str(tickets_path),
+        "startedAt": started_at,
+        "finishedAt": now_iso(),
+        "durationMs": duration_ms,
+        "ticketConcurrency": ticket_concurrency,
+        "ticketCount": len(tickets) + len(invalid),
+        "done": done,
+        "failed": len(results) + len(invalid) - done,
+        "throughput": {
+            "ticketsPerHour": round(len(finished) / hours, 2),
+            "donePerHour": round(done / hours, 2),
+        },
+        "latencyMs": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": max(latencies) if latencies else None,
+        },
+        "failures": failures,
+        "worktreePool": pool_stats,
+        "planCache": batch.plan_cache.stats(),
+        "artifactStore": artifact_store().stats(),
+        "totalTokens": sum(int(r.get("totalTokens") or 0) for r in results),
+        "results": sorted(results + invalid, key=lambda r: int(r["line"])),
+    }
+    summary_path = ARTIFACTS_ROOT / "batches" / batch_id / "summary.json"
+    dump_json(summary_path, summary)
+    artifact_store().flush()
+
+    print(
+        f"\nBatch {batch_id}: {done}/{summary['ticketCount']} done in {format_duration(duration_ms)}, "
+        f"{summary['throughput']['ticketsPerHour']:g} tickets/h"
+    )
+    print(
+        f"latency p50 {format_duration(summary['latencyMs']['p50'])}, p95 {format_duration(summary['latencyMs']['p95'])}"
+    )
+    if failures:
+        print("failures: " + ", ".join(f"{name}={count}" for name, count in sorted(failures.items())))
+    pool = summary["worktreePool"]
+    print(
+        f"worktrees: {pool['created']} created, {pool['reused']} reused; "
+        f"plan cache: {summary['planCache']['hits']} hit(s)"
+    )
+    print(f"Summary: {summary_path.relative_to(PROJECT_ROOT)}")
+    return 0 if summary["failed"] == 0 else 1
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Codex multi-agent runtime orchestrator")
     sub = parser.add_subparsers(dest="command")
@@ -2122,6 +6854,201 @@ def main() -> int:
     bypass_default = env_flag_enabled(os.environ.get(_BYPASS_SANDBOX_ENV))
     model_default = os.environ.get(_MODEL_ENV)
     model_provider_default = os.environ.get(_MODEL_PROVIDER_ENV)
+    planner_model_default = os.environ.get(_PLANNER_MODEL_ENV)
+    worker_model_default = os.environ.get(_WORKER_MODEL_ENV)
+    escalation_model_default = os.environ.get(_ESCALATION_MODEL_ENV)
+    planner_schema_default = os.environ.get(_PLANNER_SCHEMA_ENV, _DEFAULT_PLANNER_SCHEMA).strip().lower()
+    if planner_schema_default not in _ALLOWED_PLANNER_SCHEMAS:
+        planner_schema_default = _DEFAULT_PLANNER_SCHEMA
+    fail_fast_default = env_flag_enabled(os.environ.get(_FAIL_FAST_ENV))
+    sparse_default = env_flag_enabled(os.environ.get(_SPARSE_WORKTREES_ENV))
+    max_agents_default = int(_non_negative_float(os.environ.get(_MAX_AGENTS_ENV)) or 0)
+    max_load_default = _non_negative_float(os.environ.get(_ADMISSION_MAX_LOAD_ENV))
+    min_memory_default = _non_negative_float(os.environ.get(_ADMISSION_MIN_MEMORY_ENV))
+    max_pressure_default = _non_negative_float(os.environ.get(_ADMISSION_MAX_PRESSURE_ENV))
+    worker_port_env = _non_negative_float(os.environ.get(_WORKER_PORT_ENV))
+    worker_port_default = int(worker_port_env) if worker_port_env is not None else None
+    worker_host_default = os.environ.get(_WORKER_HOST_ENV, "127.0.0.1")
+    worker_token_default = os.environ.get(_WORKER_TOKEN_ENV)
+    token_budget_default = int(_non_negative_float(os.environ.get(_TOKEN_BUDGET_ENV)) or 0)
+    agent_token_budget_default = int(_non_negative_float(os.environ.get(_AGENT_TOKEN_BUDGET_ENV)) or 0)
+    ticket_concurrency_default = int(_non_negative_float(os.environ.get(_TICKET_CONCURRENCY_ENV)) or DEFAULT_TICKET_CONCURRENCY)
+    sparse_always_env = os.environ.get(_SPARSE_ALWAYS_ENV)
+    sparse_always_default = (
+        [item.strip() for item in sparse_always_env.split(",") if item.strip()] if sparse_always_env is not None else None
+    )
+
+    def add_agent_options(cmd: argparse.ArgumentParser, sandbox_help: str) -> None:
+        """Agent, model, budget and worker options shared by `run`, `demo` and `batch`."""
+        cmd.add_argument(
+            "--agent-sandbox",
+            default=sandbox_default,
+            choices=_ALLOWED_SANDBOX_MODES,
+            help=sandbox_help,
+        )
+        cmd.add_argument(
+            "--task-mode",
+            default=task_mode_default,
+            choices=_ALLOWED_TASK_MODES,
+            help="task execution mode: auto, code, or advisory",
+        )
+        cmd.add_argument(
+            "--bypass-approvals-and-sandbox",
+            action="store_true",
+            default=bypass_default,
+            help=(
+                "pass --dangerously-bypass-approvals-and-sandbox to Codex (unsafe, trusted environments only). "
+                f"Can also be enabled via {_BYPASS_SANDBOX_ENV}=1."
+            ),
+        )
+        cmd.add_argument(
+            "--model",
+            default=model_default,
+            help=f"optional model override passed to codex exec (env: {_MODEL_ENV})",
+        )
+        cmd.add_argument(
+            "--model-provider",
+            default=model_provider_default,
+            help=f"optional model provider key via config override (env: {_MODEL_PROVIDER_ENV})",
+        )
+        cmd.add_argument(
+            "--planner-model",
+            default=planner_model_default,
+            help=f"model for the planner, defaults to --model (env: {_PLANNER_MODEL_ENV})",
+        )
+        cmd.add_argument(
+            "--worker-model",
+            default=worker_model_default,
+            help=f"model for worker agents without a matching --model-rule, defaults to --model (env: {_WORKER_MODEL_ENV})",
+        )
+        cmd.add_argument(
+            "--model-rule",
+            action="append",
+            default=None,
+            metavar="CONDITION=MODEL",
+            help=(
+                "worker model rule, first match wins; CONDITION is mode:code, mode:advisory, files<=N or files>N "
+                f"(tracked files under the scope); repeatable (env: {_MODEL_RULES_ENV}, comma-separated)"
+            ),
+        )
+        cmd.add_argument(
+            "--planner-schema",
+            default=planner_schema_default,
+            choices=_ALLOWED_PLANNER_SCHEMAS,
+            help=(
+                "JSON schema passed to the planner via codex exec --output-schema: plan, dag (subtasks with dependsOn) "
+                f"or off (env: {_PLANNER_SCHEMA_ENV})"
+            ),
+        )
+        cmd.add_argument(
+            "--escalation-model",
+            default=escalation_model_default,
+            help=f"retry an agent that failed with a non-transient blocker once on this stronger model (env: {_ESCALATION_MODEL_ENV})",
+        )
+        cmd.add_argument(
+            "--fail-fast",
+            action="store_true",
+            default=fail_fast_default,
+            help=(
+                "cancel remaining agents (whole codex process group) once any agent records a fatal blocker "
+                f"(env: {_FAIL_FAST_ENV}=1)"
+            ),
+        )
+        cmd.add_argument(
+            "--agent-timeout",
+            type=float,
+            default=None,
+            help=(
+                "wall-clock budget in seconds per codex process, 0 disables "
+                f"(env: {_AGENT_TIMEOUT_ENV}[_CODE|_ADVISORY]; default depends on task mode)"
+            ),
+        )
+        cmd.add_argument(
+            "--agent-idle-timeout",
+            type=float,
+            default=None,
+            help=(
+                "maximum seconds without a codex event before the agent is killed, 0 disables "
+                f"(env: {_AGENT_IDLE_TIMEOUT_ENV}[_CODE|_ADVISORY]; default depends on task mode)"
+            ),
+        )
+        cmd.add_argument(
+            "--sparse-worktrees",
+            action="store_true",
+            default=sparse_default,
+            help=f"code mode: cone-mode sparse agent worktrees limited to scope plus shared paths (env: {_SPARSE_WORKTREES_ENV}=1)",
+        )
+        cmd.add_argument(
+            "--sparse-always",
+            action="append",
+            default=None,
+            metavar="DIR",
+            help=(
+                "directory every sparse worktree includes; repeatable, replaces the default "
+                f"{', '.join(DEFAULT_SPARSE_ALWAYS_PATHS)} (env: {_SPARSE_ALWAYS_ENV}, comma-separated)"
+            ),
+        )
+        cmd.add_argument(
+            "--max-agents",
+            type=int,
+            default=max_agents_default,
+            help=f"maximum concurrently running agents, 0 for unlimited (env: {_MAX_AGENTS_ENV})",
+        )
+        cmd.add_argument(
+            "--admission-max-load",
+            type=float,
+            default=max_load_default,
+            help=f"hold new agents while 1-minute load average per CPU exceeds this (env: {_ADMISSION_MAX_LOAD_ENV})",
+        )
+        cmd.add_argument(
+            "--admission-min-memory-mb",
+            type=float,
+            default=min_memory_default,
+            help=f"hold new agents while MemAvailable is below this many MB (env: {_ADMISSION_MIN_MEMORY_ENV})",
+        )
+        cmd.add_argument(
+            "--admission-max-pressure",
+            type=float,
+            default=max_pressure_default,
+            help=(
+                "hold new agents while cgroup/system PSI 'some avg10' for memory, cpu or io exceeds this percentage "
+                f"(env: {_ADMISSION_MAX_PRESSURE_ENV})"
+            ),
+        )
+        cmd.add_argument(
+            "--token-budget",
+            type=int,
+            default=token_budget_default,
+            help=f"stop the run once planner and agents used more than this many input+output tokens, 0 for unlimited (env: {_TOKEN_BUDGET_ENV})",
+        )
+        cmd.add_argument(
+            "--agent-token-budget",
+            type=int,
+            default=agent_token_budget_default,
+            help=f"block an agent once it used more than this many input+output tokens, 0 for unlimited (env: {_AGENT_TOKEN_BUDGET_ENV})",
+        )
+        cmd.add_argument(
+            "--worker-port",
+            type=int,
+            default=worker_port_default,
+            help=f"serve the remote worker registry on this port, 0 picks a free one (env: {_WORKER_PORT_ENV})",
+        )
+        cmd.add_argument(
+            "--worker-host",
+            default=worker_host_default,
+            help=f"interface for the worker registry; anything but loopback requires --worker-token (env: {_WORKER_HOST_ENV})",
+        )
+        cmd.add_argument(
+            "--worker-token",
+            default=worker_token_default,
+            help=f"shared secret remote workers must present (env: {_WORKER_TOKEN_ENV})",
+        )
+        cmd.add_argument(
+            "--wait-for-workers",
+            type=int,
+            default=0,
+            help=f"before launching agents, wait up to {WORKER_WAIT_TIMEOUT_SECONDS:g}s for this many workers to register",
+        )
 
     run = sub.add_parser("run")
     run.add_argument("task", nargs="?", help="raw user task")
@@ -2132,84 +7059,129 @@ def main() -> int:
     )
     run.add_argument("--run-id", help="optional run identifier")
     run.add_argument("--ui", choices=["tui", "web"], default="tui", help="dashboard UI: tui or web")
-    run.add_argument(
-        "--agent-sandbox",
-        default=sandbox_default,
-        choices=_ALLOWED_SANDBOX_MODES,
-        help=(
-            "Codex sandbox mode for worker agents. "
-            "Use 'danger-full-access' only in trusted, isolated environments."
-        ),
-    )
-    run.add_argument(
-        "--task-mode",
-        default=task_mode_default,
-        choices=_ALLOWED_TASK_MODES,
-        help="task execution mode: auto, code, or advisory",
-    )
-    run.add_argument(
-        "--bypass-approvals-and-sandbox",
-        action="store_true",
-        default=bypass_default,
-        help=(
-            "pass --dangerously-bypass-approvals-and-sandbox to Codex (unsafe, trusted environments only). "
-            f"Can also be enabled via {_BYPASS_SANDBOX_ENV}=1."
-        ),
-    )
-    run.add_argument(
-        "--model",
-        default=model_default,
-        help=f"optional model override passed to codex exec (env: {_MODEL_ENV})",
-    )
-    run.add_argument(
-        "--model-provider",
-        default=model_provider_default,
-        help=f"optional model provider key via config override (env: {_MODEL_PROVIDER_ENV})",
+    add_agent_options(
+        run,
+        "Codex sandbox mode for worker agents. Use 'danger-full-access' only in trusted, isolated environments.",
     )
     run.add_argument("--port", type=int, default=DEFAULT_WEB_PORT, help="dashboard port for web mode")
 
     demo = sub.add_parser("demo", help="run the built-in demo task")
     demo.add_argument("--ui", choices=["tui", "web"], default="tui", help="dashboard UI: tui or web")
-    demo.add_argument(
-        "--agent-sandbox",
-        default=sandbox_default,
-        choices=_ALLOWED_SANDBOX_MODES,
-        help="Codex sandbox mode for worker agents",
-    )
-    demo.add_argument(
-        "--task-mode",
-        default=task_mode_default,
-        choices=_ALLOWED_TASK_MODES,
-        help="task execution mode: auto, code, or advisory",
-    )
-    demo.add_argument(
-        "--bypass-approvals-and-sandbox",
-        action="store_true",
-        default=bypass_default,
-        help=(
-            "pass --dangerously-bypass-approvals-and-sandbox to Codex (unsafe, trusted environments only). "
-            f"Can also be enabled via {_BYPASS_SANDBOX_ENV}=1."
-        ),
-    )
-    demo.add_argument(
-        "--model",
-        default=model_default,
-        help=f"optional model override passed to codex exec (env: {_MODEL_ENV})",
+    add_agent_options(demo, "Codex sandbox mode for worker agents")
+    demo.add_argument("--port", type=int, default=DEFAULT_WEB_PORT, help="dashboard port for web mode")
+
+    batch = sub.add_parser("batch", help="run every ticket of a JSONL file with shared agent concurrency")
+    batch.add_argument("tickets", help='JSONL file, one {"task": ..., "runId": ..., "mode": ..., "model": ...} per line')
+    batch.add_argument("--batch-id", help="optional batch identifier (prefix of generated run ids)")
+    batch.add_argument(
+        "--ticket-concurrency",
+        type=int,
+        default=ticket_concurrency_default,
+        help=f"tickets run at once; agents are capped across all of them by --max-agents (env: {_TICKET_CONCURRENCY_ENV})",
     )
-    demo.add_argument(
-        "--model-provider",
-        default=model_provider_default,
-        help=f"optional model provider key via config override (env: {_MODEL_PROVIDER_ENV})",
+    add_agent_options(batch, "Codex sandbox mode for worker agents")
+
+    resume = sub.add_parser("resume", help="continue an interrupted run from its checkpoints")
+    resume.add_argument("run_id", help="run-id under artifacts/coordination/")
+    resume.add_argument("--ui", choices=["tui", "web"], default="tui", help="dashboard UI: tui or web")
+    resume.add_argument("--port", type=int, default=DEFAULT_WEB_PORT, help="dashboard port for web mode")
+    resume.add_argument(
+        "--max-agents",
+        type=int,
+        default=max_agents_default,
+        help=f"maximum concurrently running agents, 0 for unlimited (env: {_MAX_AGENTS_ENV})",
     )
-    demo.add_argument("--port", type=int, default=DEFAULT_WEB_PORT, help="dashboard port for web mode")
 
     inspect = sub.add_parser("inspect", help="print root-cause summary for a completed run")
     inspect.add_argument("run_id", help="run-id under artifacts/")
 
+    compare = sub.add_parser("compare", help="diff timings, retries and token usage of two completed runs")
+    compare.add_argument("run_a", help="baseline run-id under artifacts/")
+    compare.add_argument("run_b", help="run-id to compare against the baseline")
+    compare.add_argument("--json", action="store_true", help="print the comparison as JSON instead of a table")
+
+    worker = sub.add_parser("worker", help="execute agents assigned by a remote orchestrator")
+    worker.add_argument(
+        "--orchestrator",
+        default=os.environ.get(_ORCHESTRATOR_URL_ENV),
+        help=f"orchestrator worker registry URL, e.g. http://host:port (env: {_ORCHESTRATOR_URL_ENV})",
+    )
+    worker.add_argument("--capacity", type=int, default=1, help="agents this worker runs at once")
+    worker.add_argument("--worker-id", help="stable worker name (default: hostname-pid)")
+    worker.add_argument(
+        "--worker-token",
+        default=worker_token_default,
+        help=f"shared secret expected by the orchestrator (env: {_WORKER_TOKEN_ENV})",
+    )
+    worker.add_argument(
+        "--allow-bypass-approvals-and-sandbox",
+        action="store_true",
+        help="accept assignments that request --dangerously-bypass-approvals-and-sandbox or danger-full-access",
+    )
+
     args = parser.parse_args()
     if not args.command:
         parser.print_help()
         return 0
+    if args.command == "worker":
+        if not args.orchestrator:
+            parser.error(f"--orchestrator (or {_ORCHESTRATOR_URL_ENV}) is required for worker mode.")
+        return run_worker(
+            args.orchestrator,
+            capacity=args.capacity,
+            worker_id=args.worker_id,
+            token=args.worker_token,
+            allow_bypass=args.allow_bypass_approvals_and_sandbox,
+        )
+    admission = None
+    workers = None
+    worker_server: Optional[http.server.HTTPServer] = None
+    if args.command in ("run", "demo", "batch"):
+        admission = AdmissionController(
+            max_agents=args.max_agents,
+            max_load_per_cpu=args.admission_max_load,
+            min_available_mb=args.admission_min_memory_mb,
+            max_pressure=args.admission_max_pressure,
+        )
+        if args.worker_port is not None:
+            workers = WorkerRegistry(token=args.worker_token)
+            try:
+                worker_server, worker_port = start_worker_registry_server(workers, args.worker_host, args.worker_port)
+            except RuntimeError as exc:
+                print(f"ERROR: {exc}")
+                return 1
+            print(f"Worker registry: http://{args.worker_host}:{worker_port}/ (codex-multi worker --orchestrator ...)")
+    elif args.command == "resume":
+        admission = AdmissionController(
+            max_agents=args.max_agents,
+            max_load_per_cpu=max_load_default,
+            min_available_mb=min_memory_default,
+            max_pressure=max_pressure_default,
+        )
+    try:
+        return _run_command(args, parser, admission, workers, sparse_always_default)
+    finally:
+        if worker_server:
+            worker_server.shutdown()
+            worker_server.server_close()
+
+
+def _run_command(
+    args: argparse.Namespace,
+    parser: argparse.ArgumentParser,
+    admission: Optional[AdmissionController],
+    workers: Optional[WorkerRegistry],
+    sparse_always_default: Optional[List[str]],
+) -> int:
+    model_rules: List[ModelRule] = []
+    if args.command in ("run", "demo", "batch"):
+        rule_specs = args.model_rule
+        if rule_specs is None:
+            rule_specs = [item for item in os.environ.get(_MODEL_RULES_ENV, "").split(",") if item.strip()]
+        try:
+            model_rules = [ModelRule.parse(spec) for spec in rule_specs]
+        except ValueError as exc:
+            parser.error(str(exc))
     if args.command == "demo":
         task = (
             "Generate an implementation plan for adding a small task management interface. "
@@ -2220,6 +7192,46 @@ def main() -> int:
         port = args.port
     elif args.command == "inspect":
         return inspect_run(args.run_id)
+    elif args.command == "compare":
+        return compare_runs(args.run_a, args.run_b, as_json=args.json)
+    elif args.command == "resume":
+        return resume_run(args.run_id, ui_mode=args.ui, web_port=args.port, admission=admission)
+    elif args.command == "batch":
+        tickets_path = Path(args.tickets)
+        if not tickets_path.is_file():
+            parser.error(f"tickets file not found: {args.tickets}")
+        if args.ticket_concurrency < 1:
+            parser.error("--ticket-concurrency must be at least 1.")
+        # Bound here so every option is checked against run_ticket's signature before a ticket runs.
+        launch = functools.partial(
+            run_ticket,
+            agent_sandbox_mode=args.agent_sandbox,
+            bypass_approvals_and_sandbox=args.bypass_approvals_and_sandbox,
+            model_provider=args.model_provider,
+            fail_fast=args.fail_fast,
+            agent_timeout=args.agent_timeout,
+            agent_idle_timeout=args.agent_idle_timeout,
+            sparse_worktrees=args.sparse_worktrees,
+            sparse_always=args.sparse_always if args.sparse_always is not None else sparse_always_default,
+            admission=admission,
+            workers=workers,
+            wait_for_workers=args.wait_for_workers,
+            token_budget=args.token_budget,
+            agent_token_budget=args.agent_token_budget,
+            planner_model=args.planner_model,
+            worker_model=args.worker_model,
+            escalation_model=args.escalation_model,
+            model_rules=model_rules,
+            planner_schema=args.planner_schema,
+        )
+        return run_batch(
+            tickets_path,
+            args.batch_id or generate_run_id().replace("run-", "batch-", 1),
+            args.ticket_concurrency,
+            launch,
+            task_mode=args.task_mode,
+            model=args.model,
+        )
     else:
         task = args.task or args.prompt
         run_id = args.run_id or generate_run_id()
@@ -2236,6 +7248,21 @@ def main() -> int:
                 bypass_approvals_and_sandbox=args.bypass_approvals_and_sandbox,
                 model=args.model,
                 model_provider=args.model_provider,
+                fail_fast=args.fail_fast,
+                agent_timeout=args.agent_timeout,
+                agent_idle_timeout=args.agent_idle_timeout,
+                sparse_worktrees=args.sparse_worktrees,
+                sparse_always=args.sparse_always if args.sparse_always is not None else sparse_always_default,
+                admission=admission,
+                workers=workers,
+                wait_for_workers=args.wait_for_workers,
+                token_budget=args.token_budget,
+                agent_token_budget=args.agent_token_budget,
+                planner_model=args.planner_model,
+                worker_model=args.worker_model,
+                escalation_model=args.escalation_model,
+                model_rules=model_rules,
+                planner_schema=args.planner_schema,
             )
 
     return run_ticket(
@@ -2248,6 +7275,21 @@ def main() -> int:
         bypass_approvals_and_sandbox=args.bypass_approvals_and_sandbox,
         model=args.model,
         model_provider=args.model_provider,
+        fail_fast=args.fail_fast,
+        agent_timeout=args.agent_timeout,
+        agent_idle_timeout=args.agent_idle_timeout,
+        sparse_worktrees=args.sparse_worktrees,
+        sparse_always=args.sparse_always if args.sparse_always is not None else sparse_always_default,
+        admission=admission,
+        workers=workers,
+        wait_for_workers=args.wait_for_workers,
+        token_budget=args.token_budget,
+        agent_token_budget=args.agent_token_budget,
+        planner_model=args.planner_model,
+        worker_model=args.worker_model,
+        escalation_model=args.escalation_model,
+        model_rules=model_rules,
+        planner_schema=args.planner_schema,
     )
 
 
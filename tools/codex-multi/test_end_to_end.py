@@ -0,0 +1,340 @@
+"""End-to-end runs of the orchestrator against fake_codex.py in a scratch git repository."""
+
+import json
+import os
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+TURN_TOKENS = 1100  # fake_codex.py: 1000 input plus 100 output tokens per turn
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="uses POSIX process groups")
+
+# Two `codex-multi worker`s on this host, as threads of one process sharing the scratch project.
+TWO_WORKERS = """
+import sys
+import threading
+
+sys.path.insert(0, "tools/codex-multi")
+import orchestrator
+
+url, token = sys.argv[1], sys.argv[2]
+threads = [
+    threading.Thread(
+        target=orchestrator.run_worker, args=(url,), kwargs={"worker_id": name, "token": token}, daemon=True
+    )
+    for name in ("worker-1", "worker-2")
+]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+"""
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    ignore = shutil.ignore_patterns("__pycache__", ".pytest_cache", "test_*.py", "conftest.py")
+    shutil.copytree(HERE, root / "tools" / "codex-multi", ignore=ignore)
+    for crate in ("core", "tui"):
+        src = root / "codex-rs" / crate / "src"
+        src.mkdir(parents=True)
+        (src / "lib.rs").write_text("pub fn f() {}\n", encoding="utf-8")
+    (root / ".gitignore").write_text("artifacts/\ncodex-worktrees/\n", encoding="utf-8")
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    subprocess.run(["git", "add", "-A"], cwd=root, check=True)
+    subprocess.run(git + ["commit", "-qm", "init"], cwd=root, check=True)
+    return root
+
+
+def cli_env(project: Path, plan: list, **steps: str) -> dict:
+    tool_dir = project / "tools" / "codex-multi"
+    env = {key: value for key, value in os.environ.items() if not key.startswith(("CODEX_MULTI_", "FAKE_CODEX_"))}
+    env.update(
+        {
+            "CODEX_MULTI_CODEX_COMMAND": shlex.join([sys.executable, str(tool_dir / "fake_codex.py")]),
+            "FAKE_CODEX_STATE_DIR": str(project.parent),
+            "FAKE_CODEX_PLAN": json.dumps({"subtasks": plan}),
+        }
+    )
+    env.update({f"FAKE_CODEX_{name.upper()}": value for name, value in steps.items()})
+    return env
+
+
+def cli(project: Path, *args: str, env: dict, timeout: float = 120) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, str(project / "tools" / "codex-multi" / "orchestrator.py"), *args],
+        cwd=project,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+
+
+def read_json(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def wait_for(predicate, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for the run")
+        time.sleep(0.2)
+
+
+def crash_run(project: Path, args: list, env: dict, ready) -> None:
+    """Start a run, wait until `ready()`, then kill the orchestrator and every fake codex like a crash."""
+    proc = subprocess.Popen(
+        [sys.executable, str(project / "tools" / "codex-multi" / "orchestrator.py"), *args],
+        cwd=project,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        wait_for(ready)
+    finally:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+        for pid_file in (project.parent / "fake-codex").glob("*.pid"):
+            try:
+                os.killpg(int(pid_file.stem), signal.SIGKILL)
+            except OSError:
+                pass
+
+
+def test_code_run_merges_every_agent(project):
+    plan = [
+        {"name": "agent-core", "scope": "codex-rs/core", "objective": "core"},
+        {"name": "agent-tui", "scope": "codex-rs/tui", "objective": "tui"},
+    ]
+    env = cli_env(project, plan)
+    result = cli(project, "run", "touch both crates", "--run-id", "e2e-1", "--task-mode", "code", env=env)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    impact = read_json(project / "artifacts" / "pr-packets" / "e2e-1" / "impact-report.json")
+    assert impact["state"] == "DONE"
+    assert sorted(a["name"] for a in impact["agents"]) == ["agent-core", "agent-tui"]
+    assert impact["mergeability"]["passed"] is True
+    diff = (project / "artifacts" / "pr-packets" / "e2e-1" / "diff.patch").read_text(encoding="utf-8")
+    assert "codex-rs/core/agent-core.txt" in diff and "codex-rs/tui/agent-tui.txt" in diff
+    assert impact["usage"]["total"]["totalTokens"] == 3 * TURN_TOKENS
+
+
+def test_transient_retry_counts_resumed_thread_once(project):
+    plan = [{"name": "agent-core", "scope": "codex-rs/core", "objective": "core"}]
+    env = cli_env(project, plan, agent_core="usage,transient")
+    result = cli(project, "run", "touch core", "--run-id", "e2e-retry", "--task-mode", "code", env=env)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    status = read_json(project / "artifacts" / "coordination" / "e2e-retry" / "agent-core" / "status.json")
+    assert status["attempts"] == 2
+    # Two turns on one thread: codex's running total for it is two turns' worth.
+    assert status["usage"]["totalTokens"] == 2 * TURN_TOKENS
+
+
+def test_resume_counts_resumed_thread_once(project):
+    plan = [{"name": "agent-core", "scope": "codex-rs/core", "objective": "core"}]
+    env = cli_env(project, plan, agent_core="usage,hang")
+    status_path = project / "artifacts" / "coordination" / "e2e-resume" / "agent-core" / "status.json"
+
+    def thread_checkpointed() -> bool:
+        status = read_json(status_path)
+        return bool(status.get("threadId")) and (status.get("usage") or {}).get("totalTokens") == TURN_TOKENS
+
+    crash_run(project, ["run", "touch core", "--run-id", "e2e-resume", "--task-mode", "code"], env, thread_checkpointed)
+    result = cli(project, "resume", "e2e-resume", env=env)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    status = read_json(status_path)
+    assert status["state"] == "DONE"
+    assert status["usage"]["totalTokens"] == 2 * TURN_TOKENS
+    impact = read_json(project / "artifacts" / "pr-packets" / "e2e-resume" / "impact-report.json")
+    assert impact["usage"]["total"]["totalTokens"] == 3 * TURN_TOKENS
+
+
+def test_resume_relaunches_agent_queued_at_crash(project):
+    plan = [
+        {"name": "agent-core", "scope": "codex-rs/core", "objective": "core"},
+        {"name": "agent-tui", "scope": "codex-rs/tui", "objective": "tui"},
+    ]
+    env = cli_env(project, plan, agent_core="usage,hang")
+    coord = project / "artifacts" / "coordination" / "e2e-queued"
+
+    def first_agent_running() -> bool:
+        return bool(read_json(coord / "agent-core" / "status.json").get("threadId")) and (
+            read_json(coord / "agent-tui" / "status.json").get("state") == "QUEUED"
+        )
+
+    args = ["run", "touch both crates", "--run-id", "e2e-queued", "--task-mode", "code", "--max-agents", "1"]
+    crash_run(project, args, env, first_agent_running)
+    # agent-tui has a registered worktree but no thread: resume has to check it out again.
+    assert (project / "codex-worktrees" / "e2e-queued" / "agent-tui").is_dir()
+    result = cli(project, "resume", "e2e-queued", env=env)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    impact = read_json(project / "artifacts" / "pr-packets" / "e2e-queued" / "impact-report.json")
+    assert [a["state"] for a in impact["agents"]] == ["DONE", "DONE"]
+
+
+def test_agents_run_on_two_local_workers(project):
+    plan = [
+        {"name": "agent-core", "scope": "codex-rs/core", "objective": "core"},
+        {"name": "agent-tui", "scope": "codex-rs/tui", "objective": "tui"},
+    ]
+    env = cli_env(project, plan, agent_core="sleep:1,write", agent_tui="sleep:1,write")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    workers = subprocess.Popen(
+        [sys.executable, "-c", TWO_WORKERS, f"http://127.0.0.1:{port}", "s3cret"],
+        cwd=project,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        args = ["--worker-port", str(port), "--worker-token", "s3cret", "--wait-for-workers", "2"]
+        args += ["--run-id", "e2e-workers", "--task-mode", "code"]
+        result = cli(project, "run", "touch both crates", *args, env=env)
+    finally:
+        os.killpg(workers.pid, signal.SIGKILL)
+        workers.wait()
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "2 remote worker(s) registered." in result.stdout
+
+    impact = read_json(project / "artifacts" / "pr-packets" / "e2e-workers" / "impact-report.json")
+    assert impact["state"] == "DONE"
+    assert sorted(a["worker"] for a in impact["agents"]) == ["worker-1", "worker-2"]
+    # The workers' patches were applied locally and merged.
+    diff = (project / "artifacts" / "pr-packets" / "e2e-workers" / "diff.patch").read_text(encoding="utf-8")
+    assert "codex-rs/core/agent-core.txt" in diff and "codex-rs/tui/agent-tui.txt" in diff
+
+
+def test_dag_plan_launches_dependents_after_their_dependencies(project):
+    plan = [
+        {"name": "agent-core", "scope": "codex-rs/core", "objective": "core", "dependsOn": []},
+        {"name": "agent-tui", "scope": "codex-rs/tui", "objective": "tui", "dependsOn": ["agent-core"]},
+        {"name": "agent-docs", "scope": "docs", "objective": "docs", "dependsOn": ["agent-broken"]},
+        {"name": "agent-broken", "scope": "codex-rs/broken", "objective": "x", "dependsOn": []},
+    ]
+    env = cli_env(project, plan, agent_core="sleep:1,write", agent_broken="fail")
+    args = ["--run-id", "e2e-dag", "--task-mode", "code", "--planner-schema", "dag"]
+    cli(project, "run", "touch crates", *args, env=env)
+
+    coord = project / "artifacts" / "coordination" / "e2e-dag"
+    core = read_json(coord / "agent-core" / "impact-report.json")
+    tui = read_json(coord / "agent-tui" / "status.json")
+    assert tui["state"] == "DONE" and core["state"] == "DONE"
+    assert tui["startedAt"] >= core["finishedAt"]
+    docs = read_json(coord / "agent-docs" / "status.json")
+    assert docs["state"] == "BLOCKED"
+    assert docs["blockerReason"] == "Dependency agent-broken ended BLOCKED"
+    planner = read_json(coord / "planner" / "intent.json")
+    assert [s["dependsOn"] for s in planner["normalizedPlan"]["subtasks"]] == [[], ["agent-core"], ["agent-broken"], []]
+
+
+def test_sqlite_store_runs_are_inspectable(project):
+    plan = [
+        {"name": "agent-core", "scope": "codex-rs/core", "objective": "core"},
+        {"name": "agent-tui", "scope": "codex-rs/tui", "objective": "tui"},
+    ]
+    env = cli_env(project, plan, agent_tui="fail")
+    env["CODEX_MULTI_ARTIFACT_STORE"] = "sqlite"
+    result = cli(project, "run", "touch both crates", "--run-id", "e2e-sqlite", "--task-mode", "code", env=env)
+    assert not (project / "artifacts" / "pr-packets" / "e2e-sqlite" / "impact-report.json").exists()
+    assert "Evidence: artifacts/pr-packets/e2e-sqlite (in artifacts/store/e2e-sqlite.sqlite)" in result.stdout
+
+    standalone = subprocess.run(
+        [sys.executable, str(project / "tools" / "codex-multi" / "inspect_run.py"), "e2e-sqlite"],
+        cwd=project,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert "Overall state: DONE" in standalone.stdout, standalone.stdout
+    assert "- agent-tui: BLOCKED" in standalone.stdout
+    inspected = cli(project, "inspect", "e2e-sqlite", env=env)
+    assert "agent-core: DONE" in inspected.stdout and "agent-tui: BLOCKED" in inspected.stdout
+
+
+def test_compare_pairs_renamed_agents_and_leaves_out_resume_downtime(project):
+    plan_a = [
+        {"name": "agent-core", "scope": "codex-rs/core", "objective": "core"},
+        {"name": "agent-tui", "scope": "codex-rs/tui", "objective": "tui"},
+    ]
+    env = cli_env(project, plan_a)
+    assert cli(project, "run", "touch both crates", "--run-id", "e2e-a", "--task-mode", "code", env=env).returncode == 0
+
+    plan_b = [dict(plan_a[0]), {"name": "agent-ui", "scope": "codex-rs/tui", "objective": "tui"}]
+    env = cli_env(project, plan_b, agent_core="usage,hang")
+    coord = project / "artifacts" / "coordination" / "e2e-b"
+    args = ["run", "touch both crates", "--run-id", "e2e-b", "--task-mode", "code"]
+    crash_run(project, args, env, lambda: bool(read_json(coord / "agent-core" / "status.json").get("threadId")))
+    downtime = 3
+    time.sleep(downtime)
+    env["FAKE_CODEX_RESUME"] = "write"
+    assert cli(project, "resume", "e2e-b", env=env).returncode == 0
+
+    result = cli(project, "compare", "e2e-a", "e2e-b", "--json", env=env)
+    assert result.returncode == 0, result.stdout + result.stderr
+    report = json.loads(result.stdout)
+    assert [(a["name"], a["matchedBy"]) for a in report["agents"]] == [("agent-core", "name"), ("agent-ui", "scope")]
+    intent = read_json(coord / "intent.json")
+    assert len(intent["resumes"]) == len(intent["stoppedAt"]) == 1
+    live = read_json(coord / "live-state.json")
+    created = datetime.fromisoformat(intent["createdAt"])
+    span_ms = (datetime.fromisoformat(live["updatedAt"]) - created).total_seconds() * 1000
+    assert report["run"]["wallMs"]["b"] <= span_ms - downtime * 1000
+
+
+def test_idle_timeout_ignores_stderr_noise(project):
+    plan = [{"name": "agent-core", "scope": "codex-rs/core", "objective": "core"}]
+    env = cli_env(project, plan, agent_core="noisy")
+    args = ["--run-id", "e2e-idle", "--task-mode", "code", "--agent-idle-timeout", "2", "--agent-timeout", "60"]
+    started = time.monotonic()
+    cli(project, "run", "touch core", *args, env=env)
+    assert time.monotonic() - started < 45
+    status = read_json(project / "artifacts" / "coordination" / "e2e-idle" / "agent-core" / "status.json")
+    assert status["state"] == "BLOCKED"
+    assert status["blockerReason"].startswith("TIMEOUT: no events for 2s")
+
+
+def test_batch_runs_tickets_with_shared_options_and_per_ticket_overrides(project):
+    plan = [{"name": "agent-core", "scope": "codex-rs/core", "objective": "core"}]
+    env = cli_env(project, plan)
+    tickets = project / "tickets.jsonl"
+    tickets.write_text(
+        '{"task": "touch core", "runId": "e2e-t1"}\n'
+        '{"task": "touch core again", "runId": "e2e-t2", "model": "small-model"}\n',
+        encoding="utf-8",
+    )
+    args = ["batch", str(tickets), "--batch-id", "e2e-batch", "--task-mode", "code", "--model", "big-model"]
+    result = cli(project, *args, "--ticket-concurrency", "2", "--agent-timeout", "60", env=env)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    summary = read_json(project / "artifacts" / "batches" / "e2e-batch" / "summary.json")
+    assert [(r["runId"], r["state"], r["taskMode"], r["model"]) for r in summary["results"]] == [
+        ("e2e-t1", "DONE", "code", "big-model"),
+        ("e2e-t2", "DONE", "code", "small-model"),
+    ]
+    options = read_json(project / "artifacts" / "coordination" / "e2e-t2" / "intent.json")["options"]
+    assert (options["model"], options["agentTimeout"]) == ("small-model", 60)
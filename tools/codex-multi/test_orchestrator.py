@@ -0,0 +1,477 @@
+"""Unit tests for the helpers of orchestrator.py (no codex process involved).
+
+Run with `python -m pytest tools/codex-multi` from the repository root.
+"""
+
+import io
+import json
+import subprocess
+import threading
+
+import pytest
+
+import orchestrator as o
+
+
+class FakeProc:
+    def __init__(self, events):
+        self.stdout = io.BytesIO("".join(json.dumps(event) + "\n" for event in events).encode("utf-8"))
+
+    def wait(self):
+        return 0
+
+
+def consume(events, tmp_path, thread_usage):
+    turns = []
+    proc = FakeProc(events)
+    reader = o.CodexEventReader(proc.stdout, o.StreamStats(), tmp_path)
+    result = o._consume_codex_events(proc, reader, lambda line: None, turns.append, None, thread_usage)
+    return result, turns
+
+
+def turn_completed(input_tokens, cached, output_tokens):
+    return {
+        "type": "turn.completed",
+        "usage": {"input_tokens": input_tokens, "cached_input_tokens": cached, "output_tokens": output_tokens},
+    }
+
+
+def test_resumed_thread_counts_only_new_usage(tmp_path):
+    thread_usage = {}
+    first = [{"type": "thread.started", "thread_id": "t-1"}, turn_completed(1000, 400, 100)]
+    failed = {"type": "turn.failed", "error": {"message": "stream disconnected"}}
+    (_, thread_id, _, _), turns = consume(first + [failed], tmp_path, thread_usage)
+    assert thread_id == "t-1"
+    # `codex exec resume t-1` reports the session total, which starts from the first run's.
+    resumed = [{"type": "thread.started", "thread_id": "t-1"}, turn_completed(2000, 800, 200)]
+    _, resumed_turns = consume(resumed, tmp_path, thread_usage)
+
+    total = o.TokenUsage()
+    for turn in turns + resumed_turns:
+        total.add(turn)
+    assert total.to_dict() == {
+        "inputTokens": 2000,
+        "cachedInputTokens": 800,
+        "outputTokens": 200,
+        "totalTokens": 2200,
+        "turns": 2,
+    }
+    assert thread_usage["t-1"].total == 2200
+
+
+def test_new_thread_starts_from_zero(tmp_path):
+    thread_usage = {"t-1": o.TokenUsage(1000, 0, 100, 1)}
+    events = [{"type": "thread.started", "thread_id": "t-2"}, turn_completed(300, 0, 30)]
+    _, turns = consume(events, tmp_path, thread_usage)
+    assert [turn.total for turn in turns] == [330]
+
+
+def test_worker_registry_needs_token_off_loopback():
+    assert o.is_loopback_host("127.0.0.1") and o.is_loopback_host("localhost") and o.is_loopback_host("[::1]")
+    assert not o.is_loopback_host("0.0.0.0") and not o.is_loopback_host("")
+    with pytest.raises(RuntimeError, match="without a worker token"):
+        o.start_worker_registry_server(o.WorkerRegistry(), "0.0.0.0", 0)
+    server, port = o.start_worker_registry_server(o.WorkerRegistry(token="secret"), "127.0.0.1", 0)
+    try:
+        assert port > 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_parse_plan_keeps_dependencies_between_plan_agents():
+    plan = o.parse_plan(
+        "task",
+        {
+            "subtasks": [
+                {"name": "core", "scope": "codex-rs/core", "objective": "a", "dependsOn": ["tui"]},
+                {"name": "tui", "scope": "codex-rs/tui", "objective": "b", "dependsOn": ["core", "ghost", "tui"]},
+                {"name": "core", "scope": "docs", "objective": "c", "dependsOn": ["Core", "tui"]},
+            ]
+        },
+    )
+    by_name = {item.name: item.depends_on for item in plan}
+    # tui -> core would close a cycle with core -> tui; unknown and self dependencies are dropped.
+    assert by_name == {"core": ("tui",), "tui": (), "core-2": ("core", "tui")}
+
+
+def test_scope_repairs_keep_dependencies():
+    tasks = [o.AgentTask("a", "", "x"), o.AgentTask("b", "", "y", ("a",))]
+    assert [t.depends_on for t in o.normalize_disjoint_scopes(tasks)] == [(), ("a",)]
+
+
+def test_artifact_store_is_abstract():
+    with pytest.raises(TypeError):
+        o.ArtifactStore()
+
+
+def test_planner_json_prefers_the_final_plan_over_an_echoed_example():
+    example = {"subtasks": [{"name": "example", "scope": "docs", "objective": "x"}]}
+    final = {"subtasks": [{"name": "agent-core", "scope": "codex-rs/core", "objective": "y"}]}
+    text = f"Example: {json.dumps(example)}\nfinal: {json.dumps(final)}"
+    assert o.parse_embedded_json(text) == final
+
+
+def test_planner_json_skips_prose_brackets_and_drafts():
+    plan = {"subtasks": [{"name": "agent-core", "scope": "codex-rs/core", "objective": "y"}]}
+    text = (
+        "See [client.rs] and { note: the budget }.\n"
+        'Draft: {"subtasks": []}\n'
+        f"```json\n{json.dumps(plan)}\n```\n"
+        "fn f() { let s = \"}\"; }"
+    )
+    assert o.parse_embedded_json(text) == plan
+    assert o.parse_embedded_json("no json here [x]") is None
+
+
+def test_run_wall_time_leaves_out_downtime_before_a_resume():
+    intent = {
+        "createdAt": "2026-03-02T10:00:00+00:00",
+        "stoppedAt": ["2026-03-02T10:00:30+00:00"],
+        "resumes": ["2026-03-02T12:00:00+00:00"],
+    }
+    live = {"updatedAt": "2026-03-02T12:00:10+00:00"}
+    assert o.run_active_ms(intent, live) == 40_000
+    assert o.run_active_ms({"createdAt": intent["createdAt"]}, {"updatedAt": intent["stoppedAt"][0]}) == 30_000
+    # Older intents without stop times only measure the last session.
+    assert o.run_active_ms({**intent, "stoppedAt": []}, live) == 10_000
+
+
+def test_compare_pairs_agents_by_name_then_scope():
+    a = [{"name": "core", "scope": "codex-rs/core"}, {"name": "tui", "scope": "codex-rs/tui"}, {"name": "x", "scope": ""}]
+    b = [{"name": "tui-2", "scope": "codex-rs/tui"}, {"name": "core", "scope": "codex-rs/exec"}, {"name": "y", "scope": ""}]
+    pairs = [((p or {}).get("name"), (q or {}).get("name"), how) for p, q, how in o.align_agents(a, b)]
+    assert pairs == [("core", "core", "name"), ("tui", "tui-2", "scope"), ("x", None, None), (None, "y", None)]
+
+
+def test_compare_flags_only_large_slowdowns():
+    assert o.diff_metric("wallMs", 1000, 1400)["regression"] is False
+    assert o.diff_metric("wallMs", 10_000, 11_000)["regression"] is False
+    assert o.diff_metric("wallMs", 1000, 1700) == {"a": 1000, "b": 1700, "delta": 700, "pct": 70.0, "regression": True}
+    assert "regression" not in o.diff_metric("totalTokens", 10, 100)
+    assert o.diff_metric("attempts", None, 2) == {"a": None, "b": 2}
+
+
+def test_scope_covering_the_fallback_root_is_narrowed():
+    tasks = [o.AgentTask("a", "codex-rs", "x"), o.AgentTask("b", "codex-rs/core", "y"), o.AgentTask("c", "codex-rs", "z")]
+    assert [t.scope for t in o.normalize_disjoint_scopes(tasks)] == ["codex-rs/a", "codex-rs/core", "codex-rs/c"]
+    assert [t.scope for t in o.normalize_disjoint_scopes(tasks[:1])] == ["codex-rs"]
+
+
+def test_model_rules_count_files_from_the_run_index(monkeypatch):
+    def no_git():
+        raise AssertionError("the run's index should be used")
+
+    monkeypatch.setattr(o, "tracked_path_index", no_git)
+    index = o.TrackedPathIndex("abc", ["codex-rs/core/src/lib.rs", "codex-rs/core/src/a.rs", "codex-rs/tui/src/lib.rs"])
+    router = o.ModelRouter(worker_model="small", rules=[o.ModelRule.parse("files>1=large")])
+    core = router.worker_route("codex-rs/core", "code", index)
+    tui = router.worker_route("tui", "code", index)
+    assert (core.model, core.scope_files) == ("large", 2)
+    assert (tui.model, tui.scope_files) == ("small", 1)
+
+
+def test_scope_trie_membership_resolves_the_codex_rs_alias():
+    trie = o.ScopeTrie.from_scopes(["core", "codex-rs/tui/src", "docs"])
+    assert trie.owner_of("codex-rs/core/src/lib.rs") == "core"
+    assert trie.owner_of("core/src/lib.rs") == "core"
+    assert trie.owner_of("tui/src/app.rs") == "codex-rs/tui/src"
+    assert trie.owner_of("docs/index.md") == "docs"
+    assert not trie.contains("codex-rs/tui/Cargo.toml")
+    assert not trie.contains("corelib/x.rs")
+    assert o.ScopeTrie.from_scopes(["codex-rs"]).contains("codex-rs/anything/at/all.rs")
+
+
+def test_scope_trie_owner_is_the_deepest_scope():
+    trie = o.ScopeTrie()
+    trie.insert("core", "outer")
+    trie.insert("core/src/tools", "inner")
+    assert trie.owner_of("core/src/tools/mod.rs") == "inner"
+    assert trie.owner_of("core/src/lib.rs") == "outer"
+
+
+def test_scope_trie_overlaps_ancestors_descendants_and_equals_only():
+    trie = o.ScopeTrie.from_scopes(["codex-rs/core/src"])
+    assert trie.overlaps("core") and trie.overlaps("core/src") and trie.overlaps("core/src/tools")
+    assert not trie.overlaps("core/tests") and not trie.overlaps("tui")
+    assert not o.ScopeTrie().overlaps("core")
+
+
+def test_scope_rules_report_every_overlapping_pair_in_plan_order():
+    tasks = [
+        o.AgentTask("a", "codex-rs/core", "x"),
+        o.AgentTask("b", "tui", "x"),
+        o.AgentTask("c", "core/src", "x"),
+        o.AgentTask("d", "codex-rs", "x"),
+    ]
+    ok, issues = o.validate_scope_rules(tasks)
+    assert not ok
+    assert issues == [
+        "scope overlap: a:codex-rs/core and c:core/src",
+        "scope overlap: a:codex-rs/core and d:codex-rs",
+        "scope overlap: b:tui and d:codex-rs",
+        "scope overlap: c:core/src and d:codex-rs",
+    ]
+    assert o.validate_scope_rules(tasks[:2]) == (True, [])
+
+
+def test_porcelain_v2_records_keep_paths_with_spaces_and_skip_rename_sources():
+    output = "\0".join(
+        [
+            "1 .M N... 100644 100644 100644 1111111 1111111 codex-rs/core/src/lib.rs",
+            "2 R. N... 100644 100644 100644 2222222 2222222 R100 docs/new name.md",
+            "docs/old name.md",
+            "u UU N... 100644 100644 100644 100644 3333333 4444444 5555555 tui/src/app.rs",
+            "? notes/todo list.txt",
+            "! target/",
+            "",
+        ]
+    )
+    assert o.parse_porcelain_v2(output) == [
+        ("1", "codex-rs/core/src/lib.rs"),
+        ("2", "docs/new name.md"),
+        ("u", "tui/src/app.rs"),
+        ("?", "notes/todo list.txt"),
+        ("!", "target/"),
+    ]
+    assert o.parse_porcelain_v2("") == []
+
+
+def test_changed_files_from_a_real_status(tmp_path):
+    def git(*args):
+        subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args], cwd=tmp_path, check=True)
+
+    (tmp_path / "core").mkdir()
+    (tmp_path / "core" / "a.rs").write_text("a\n", encoding="utf-8")
+    (tmp_path / "core" / "b.rs").write_text("b\n", encoding="utf-8")
+    git("init", "-q")
+    git("add", "-A")
+    git("commit", "-qm", "init")
+    git("mv", "core/b.rs", "core/c d.rs")
+    (tmp_path / "core" / "a.rs").write_text("a2\n", encoding="utf-8")
+    (tmp_path / "tui").mkdir()
+    (tmp_path / "tui" / "new file.rs").write_text("n\n", encoding="utf-8")
+
+    assert o.collect_changed_files(tmp_path) == ["core/a.rs", "core/c d.rs", "tui/new file.rs"]
+    assert o.collect_changed_files(tmp_path, scope="core") == ["core/a.rs", "core/c d.rs"]
+
+
+class TrickleStream:
+    """A pipe that hands out at most `size` bytes per read, splitting lines and UTF-8 sequences."""
+
+    def __init__(self, data, size):
+        self.data = data
+        self.size = size
+
+    def read(self, n):
+        chunk, self.data = self.data[: min(n, self.size)], self.data[min(n, self.size) :]
+        return chunk
+
+    read1 = read
+
+
+def test_event_reader_joins_lines_and_characters_split_across_reads(tmp_path):
+    data = '{"text": "héllo ✓"}\r\n\n  \n{"n": 2}\n{"tail": true}'.encode("utf-8")
+    stats = o.StreamStats()
+    lines = list(o.CodexEventReader(TrickleStream(data, 3), stats, tmp_path))
+    assert lines == [('{"text": "héllo ✓"}', False), ('{"n": 2}', False), ('{"tail": true}', False)]
+    assert stats.stdout_bytes == len(data)
+    assert stats.oversize == 0 and not list(tmp_path.iterdir())
+
+
+def test_event_reader_spills_an_oversize_line_and_keeps_reading(tmp_path):
+    big = '{"blob": "' + "x" * 50 + '"}'
+    data = f'{{"a": 1}}\n{big}\n{{"b": 2}}\n'.encode("utf-8")
+    stats = o.StreamStats()
+    lines = list(o.CodexEventReader(TrickleStream(data, 7), stats, tmp_path, max_chars=20))
+    assert [lines[0], lines[2]] == [('{"a": 1}', False), ('{"b": 2}', False)]
+    note, oversize = lines[1]
+    assert oversize and f"oversize event ({len(big)} chars) spilled to" in note
+    (spill,) = tmp_path.iterdir()
+    assert spill.read_text(encoding="utf-8") == big
+    assert (stats.oversize, stats.dropped, stats.spilled_chars) == (1, 0, len(big))
+
+
+def test_event_reader_drops_what_exceeds_the_spill_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(o, "STREAM_SPILL_LIMIT_CHARS", 30)
+    data = ("y" * 25 + "\n" + "z" * 25 + "\n").encode("utf-8")
+    stats = o.StreamStats()
+    lines = list(o.CodexEventReader(io.BytesIO(data), stats, tmp_path, max_chars=10))
+    assert "spilled to" in lines[0][0]
+    assert lines[1][0].startswith("[codex-multi] dropped oversize event (25 chars): spill limit reached")
+    assert (stats.oversize, stats.dropped, stats.spilled_chars) == (2, 1, 30)
+
+
+def test_plan_cache_key_covers_task_mode_model_schema_and_tree(monkeypatch):
+    monkeypatch.setattr(o, "head_tree_hash", lambda: "tree-1")
+    key = o.PlanCache.key("fix the bug", "code", None, "flat")
+    assert o.PlanCache.key("  fix the bug\n", "code", None, "flat") == key
+    others = {
+        o.PlanCache.key("fix the bug", "advisory", None, "flat"),
+        o.PlanCache.key("fix the bug", "code", "gpt-5", "flat"),
+        o.PlanCache.key("fix the bug", "code", None, "dag"),
+    }
+    assert key not in others and len(others) == 3
+    monkeypatch.setattr(o, "head_tree_hash", lambda: "tree-2")
+    assert o.PlanCache.key("fix the bug", "code", None, "flat") != key
+    monkeypatch.setattr(o, "head_tree_hash", lambda: None)
+    assert o.PlanCache.key("fix the bug", "code", None, "flat") is None
+
+
+def test_plan_cache_makes_a_second_ticket_wait_for_the_first_plan():
+    cache = o.PlanCache()
+    entry = o.PlanCacheEntry("run-1", [o.AgentTask("a", "core", "x")], {"task": "t"})
+    assert cache.claim("k") is None
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(cache.claim("k")))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive() and not got
+    cache.finish("k", entry)
+    waiter.join(5)
+    assert got == [entry]
+    assert cache.claim("k") is entry
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 1}
+
+
+def test_plan_cache_lets_a_waiter_plan_when_the_first_planner_fails():
+    cache = o.PlanCache()
+    assert cache.claim("k") is None
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(cache.claim("k")))
+    waiter.start()
+    cache.finish("k", None)
+    waiter.join(5)
+    # The waiter claimed the key and now plans itself.
+    assert got == [None] and "k" in cache.planning
+    assert cache.stats() == {"hits": 0, "misses": 2, "entries": 0}
+
+
+@pytest.fixture
+def artifacts_root(tmp_path, monkeypatch):
+    root = tmp_path / "artifacts"
+    monkeypatch.setattr(o, "PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(o, "ARTIFACTS_ROOT", root)
+    return root
+
+
+STORES = {
+    "local": lambda root: o.LocalArtifactStore(fsync="batch"),
+    "sqlite": lambda root: o.SqliteArtifactStore(root=root / "store"),
+    "memory": lambda root: o.MemoryArtifactStore(),
+}
+
+
+@pytest.mark.parametrize("backend", sorted(STORES))
+def test_artifact_store_round_trip(backend, artifacts_root, tmp_path):
+    store = STORES[backend](artifacts_root)
+    run_dir = artifacts_root / "coordination" / "run-1"
+    try:
+        store.write(run_dir / "agent-a" / "status.json", b'{"state": "DONE"}')
+        store.write(run_dir / "intent.json", b"{}")
+        store.append(run_dir / "events.log", b"one\n")
+        store.append(run_dir / "events.log", b"two\n")
+        assert store.read(run_dir / "agent-a" / "status.json") == b'{"state": "DONE"}'
+        assert store.read(run_dir / "events.log") == b"one\ntwo\n"
+        assert store.read(run_dir / "missing.json") is None
+        assert sorted(path.name for path, _ in store.list(run_dir)) == ["events.log", "intent.json"]
+
+        store.delete(run_dir / "intent.json")
+        assert not store.exists(run_dir / "intent.json")
+        assert store.exists(run_dir / "events.log")
+
+        # Paths outside artifacts/ always go to disk.
+        outside = tmp_path / "merge" / "agent-a.patch"
+        store.write(outside, b"diff")
+        assert outside.read_bytes() == b"diff" and store.read(outside) == b"diff"
+        assert store.stats()["writes"] == 3 and store.stats()["appends"] == 2
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_artifact_store_keeps_artifacts_off_the_tree_but_reads_files_on_disk(backend, artifacts_root):
+    store = STORES[backend](artifacts_root)
+    try:
+        store.write(artifacts_root / "pr-packets" / "run-1" / "summary.md", b"# summary")
+        on_disk = [p for p in artifacts_root.rglob("*") if p.is_file() and "store" not in p.parts]
+        assert on_disk == []
+        # Files written by git or codex straight to disk stay readable through the store.
+        log = artifacts_root / "coordination" / "run-1" / "agent-a" / "codex-stderr.log"
+        log.parent.mkdir(parents=True)
+        log.write_bytes(b"warning")
+        assert store.read(log) == b"warning"
+    finally:
+        store.close()
+
+
+def test_sqlite_store_keeps_one_database_per_run(artifacts_root):
+    store = o.SqliteArtifactStore(root=artifacts_root / "store")
+    try:
+        store.write(artifacts_root / "coordination" / "run-1" / "intent.json", b"{}")
+        store.write(artifacts_root / "pr-packets" / "run-1" / "diff.patch", b"")
+        store.write(artifacts_root / "coordination" / "run-2" / "intent.json", b"{}")
+        store.write(artifacts_root / "cache" / "repo-map" / "tree.json", b"{}")
+        assert sorted(p.name for p in (artifacts_root / "store").glob("*.sqlite")) == [
+            "run-1.sqlite",
+            "run-2.sqlite",
+            "shared.sqlite",
+        ]
+        assert store.location(artifacts_root / "pr-packets" / "run-1") == (
+            "artifacts/pr-packets/run-1 (in artifacts/store/run-1.sqlite)"
+        )
+        assert store.location(artifacts_root / "cache" / "repo-map" / "tree.json") == (
+            "artifacts/cache/repo-map/tree.json (in artifacts/store/shared.sqlite)"
+        )
+    finally:
+        store.close()
+    reopened = o.SqliteArtifactStore(root=artifacts_root / "store")
+    try:
+        assert reopened.read(artifacts_root / "coordination" / "run-2" / "intent.json") == b"{}"
+    finally:
+        reopened.close()
+
+
+def test_local_store_lists_finished_files_only(artifacts_root):
+    store = o.LocalArtifactStore()
+    run_dir = artifacts_root / "coordination" / "run-1"
+    store.write(run_dir / "intent.json", b"{}")
+    (run_dir / ".intent.json.tmp").write_bytes(b"{")
+    (run_dir / "agent-a").mkdir()
+    assert [path.name for path, _ in store.list(run_dir)] == ["intent.json"]
+    assert store.location(run_dir / "intent.json") == "artifacts/coordination/run-1/intent.json"
+
+
+def test_sparse_worktree_for_a_single_file_scope_can_be_recycled(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    (repo / "a" / "b").mkdir(parents=True)
+    (repo / "a" / "b" / "f.txt").write_text("f\n", encoding="utf-8")
+    (repo / "a" / "other.txt").write_text("o\n", encoding="utf-8")
+    (repo / "c").mkdir()
+    (repo / "c" / "g.txt").write_text("g\n", encoding="utf-8")
+    git = ["git", "-c", "user.name=t", "-c", "user.email=t@example.com"]
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    subprocess.run(["git", "add", "-A"], cwd=repo, check=True)
+    subprocess.run(git + ["commit", "-qm", "init"], cwd=repo, check=True)
+    monkeypatch.setattr(o, "PROJECT_ROOT", repo)
+
+    paths = o.sparse_checkout_paths("a/b/f.txt", always=[])
+    assert paths == ["a/b", "codex-rs/a/b/f.txt"]
+    workspace = tmp_path / "worktrees" / "slot-1"
+    o.create_worktree(workspace, base="HEAD", sparse_paths=paths)
+    (workspace / "a" / "b" / "f.txt").write_text("changed\n", encoding="utf-8")
+    o.recycle_worktree(workspace, "HEAD", paths)
+    assert (workspace / "a" / "b" / "f.txt").read_text(encoding="utf-8") == "f\n"
+    assert not (workspace / "c").exists()
+
+
+@pytest.mark.parametrize("assignment", [{"bypass": True}, {"sandboxMode": "danger-full-access"}])
+def test_worker_refuses_unsandboxed_assignments_without_opt_in(assignment, monkeypatch):
+    def no_git(*args, **kwargs):
+        raise AssertionError("a refused assignment must not touch the checkout")
+
+    monkeypatch.setattr(o, "run_simple", no_git)
+    assignment = dict(assignment, runId="run-1", agent="agent-a", assignmentId="x-1", scope="core")
+    result = o.execute_remote_assignment(assignment, "http://127.0.0.1:1", "t", "worker-1", ["codex"], o.RunControl())
+    assert result["status"] == "BLOCKED"
+    assert result["blockerReason"].startswith("worker worker-1 does not allow")